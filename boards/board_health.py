@@ -0,0 +1,139 @@
+import logging
+import threading
+import time
+from utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+FAILURE_THRESHOLD = 3  # Consecutive failures before a board is taken out of the hot loops
+BASE_BACKOFF = 1.0  # Seconds before the first re-probe
+MAX_BACKOFF = 60.0  # Longest wait between re-probes
+MONITOR_INTERVAL = 0.5
+
+board_healthy = registry.gauge('hokori_board_healthy', '1 while a board is answering, 0 while its circuit breaker is open', ('board',))
+board_trips = registry.counter('hokori_board_trips_total', 'Times a board was taken offline after repeated failures', ('board',))
+
+
+def probe_address(i2c, address):
+    '''Returns True if a chip acknowledges a one byte read at address'''
+    deadline = time.monotonic() + 0.5
+    while not i2c.try_lock():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.001)
+    try:
+        i2c.readfrom_into(address, bytearray(1))
+        return True
+    except OSError:
+        return False
+    finally:
+        i2c.unlock()
+
+
+class Board_Health:
+    '''Circuit breaker for one board.
+
+    Hot loops check `available` (a plain attribute read) before touching the board and
+    report the outcome. After FAILURE_THRESHOLD consecutive failures the breaker opens,
+    the board is skipped, and the Health_Monitor re-probes it with exponential backoff
+    until it answers again.
+    '''
+    def __init__(self, board_id):
+        self.board_id = board_id
+        self.available = True
+        self.failures = 0
+        self.backoff = BASE_BACKOFF
+        self.next_probe = 0.0
+        self.probe = None
+        self.on_recover = None
+        self.lock = threading.Lock()
+        self.gauge = board_healthy.labels(board_id)
+        self.gauge.set(1)
+
+    def record_success(self):
+        if self.failures:
+            self.failures = 0
+
+    def record_failure(self, error=None):
+        with self.lock:
+            self.failures += 1
+            if self.available and self.failures >= FAILURE_THRESHOLD:
+                self.trip(error)
+
+    def trip(self, error=None):
+        '''Take the board offline and schedule the first re-probe'''
+        self.available = False
+        self.backoff = BASE_BACKOFF
+        self.next_probe = time.monotonic() + self.backoff
+        self.gauge.set(0)
+        board_trips.labels(self.board_id).inc()
+        logger.warning(f"🌟 Board {self.board_id} taken offline after {self.failures} failures: {error}")
+
+    def try_recover(self):
+        '''Runs the probe; closes the breaker on success or doubles the backoff on failure'''
+        try:
+            ok = self.probe() if self.probe is not None else False
+        except Exception:
+            ok = False
+        with self.lock:
+            if not ok:
+                self.backoff = min(self.backoff * 2, MAX_BACKOFF)
+                self.next_probe = time.monotonic() + self.backoff
+                return False
+            self.failures = 0
+            self.available = True
+            self.gauge.set(1)
+        logger.info(f"     🔮 Board {self.board_id} is answering again")
+        if self.on_recover is not None:
+            try:
+                self.on_recover(self.board_id)
+            except Exception as e:
+                logger.error(f"💢 Failed to re-attach board {self.board_id}: {e}")
+        return True
+
+
+class Health_Monitor:
+    '''Keeps a Board_Health per board id and re-probes the offline ones on a background thread'''
+    def __init__(self):
+        self.boards = {}
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def board(self, board_id):
+        health = self.boards.get(board_id)
+        if health is None:
+            with self.lock:
+                health = self.boards.setdefault(board_id, Board_Health(board_id))
+        return health
+
+    def watch(self, board_id, probe, on_recover=None, offline=False):
+        '''Registers how to probe a board; offline=True marks a board that failed to initialise'''
+        health = self.board(board_id)
+        health.probe = probe
+        health.on_recover = on_recover
+        if offline:
+            with health.lock:
+                health.failures = FAILURE_THRESHOLD
+                health.trip('failed to initialise')
+        return health
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while not self.stop_event.wait(MONITOR_INTERVAL):
+            now = time.monotonic()
+            for health in list(self.boards.values()):
+                if not health.available and health.next_probe <= now:
+                    health.try_recover()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=5)
+
+
+# Shared monitor used by the devices
+monitor = Health_Monitor()
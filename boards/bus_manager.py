@@ -0,0 +1,103 @@
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .i2c_recorder import Recording_I2C, Replay_I2C, RECORD_ENV, REPLAY_ENV, STRICT_ENV, capture_path
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUS = 'main'
+
+
+class Bus_Manager:
+    '''Creates and hands out the I2C buses declared in config.json.
+
+    Each entry in the "buses" section is either a Linux i2c-N bus ("type": "i2c",
+    optional "number"; the Pi's default SCL/SDA pins when omitted) or one channel
+    of a TCA9548A multiplexer ("type": "tca9548a", "parent", "address",
+    "channel"). Boards pick a bus with "bus" and default to "main".
+
+    Every physical bus gets a single worker thread. Mux channels share their
+    parent's worker because they share its wires, while separate buses run in
+    parallel.
+
+    Setting HOKORI_I2C_RECORD to a directory logs every transaction on the
+    physical buses into a timestamped session folder there; HOKORI_I2C_REPLAY
+    answers from such a session instead of the wires (see boards/i2c_recorder.py).
+    '''
+    def __init__(self, bus_configs=()):
+        self.configs = {bus_config['id']: bus_config for bus_config in bus_configs}
+        self.configs.setdefault(DEFAULT_BUS, {'id': DEFAULT_BUS, 'type': 'i2c'})
+        self.buses = {}
+        self.muxes = {}
+        self.workers = {}
+        self.recorders = []
+        record_root = os.environ.get(RECORD_ENV)
+        self.record_dir = os.path.join(record_root, time.strftime('%Y%m%d-%H%M%S')) if record_root else None
+        self.replay_dir = os.environ.get(REPLAY_ENV)
+
+    def get(self, bus_id=DEFAULT_BUS):
+        '''Returns the I2C object for a bus, creating it (and its parents) on first use'''
+        bus = self.buses.get(bus_id)
+        if bus is None:
+            bus = self.create(self.configs[bus_id])
+            self.buses[bus_id] = bus
+        return bus
+
+    def create(self, bus_config):
+        bus_type = bus_config.get('type', 'i2c')
+        if bus_type == 'i2c':
+            number = bus_config.get('number')
+            if self.replay_dir:
+                bus = Replay_I2C(capture_path(self.replay_dir, bus_config['id']), strict=os.environ.get(STRICT_ENV) == '1')
+                logger.info(f"     🔮 Replaying I2C bus {bus_config['id']} from {self.replay_dir}")
+                return bus
+            if number is None:
+                import board
+                import busio
+                bus = busio.I2C(board.SCL, board.SDA)
+            else:
+                from adafruit_extended_bus import ExtendedI2C
+                bus = ExtendedI2C(number)
+            logger.info(f"     🔮 Initialized I2C bus {bus_config['id']}" + (f" (i2c-{number})" if number is not None else ''))
+            if self.record_dir:
+                os.makedirs(self.record_dir, exist_ok=True)
+                bus = Recording_I2C(bus, capture_path(self.record_dir, bus_config['id']))
+                self.recorders.append(bus)
+                logger.info(f"     🔮 Recording I2C bus {bus_config['id']} to {self.record_dir}")
+            return bus
+        if bus_type == 'tca9548a':
+            import adafruit_tca9548a
+            parent = bus_config.get('parent', DEFAULT_BUS)
+            address = int(bus_config.get('address', '0x70'), 16)
+            mux = self.muxes.get((parent, address))
+            if mux is None:
+                mux = adafruit_tca9548a.TCA9548A(self.get(parent), address=address)
+                self.muxes[(parent, address)] = mux
+            logger.info(f"     🔮 Initialized mux channel {bus_config['id']} ({hex(address)} channel {bus_config['channel']} on {parent})")
+            return mux[bus_config['channel']]
+        raise ValueError(f"💢 Unknown bus type {bus_type} for bus {bus_config['id']}")
+
+    def root(self, bus_id):
+        '''The physical bus a bus id ends up on, following mux parents'''
+        while self.configs[bus_id].get('type', 'i2c') == 'tca9548a':
+            bus_id = self.configs[bus_id].get('parent', DEFAULT_BUS)
+        return bus_id
+
+    def worker(self, bus_id=DEFAULT_BUS):
+        '''The single-thread executor that serializes traffic on this bus's physical wires'''
+        root = self.root(bus_id)
+        worker = self.workers.get(root)
+        if worker is None:
+            worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f'bus-{root}')
+            self.workers[root] = worker
+        return worker
+
+    def bus_ids(self):
+        return list(self.configs)
+
+    def shutdown(self):
+        for worker in self.workers.values():
+            worker.shutdown(wait=True)
+        for recorder in self.recorders:
+            recorder.close()
@@ -0,0 +1,131 @@
+import json
+import logging
+import os
+import sys
+import time
+from utils.persistence import atomic_write_json
+from .bus_manager import Bus_Manager, DEFAULT_BUS
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONFIG_FILE = os.path.join(BASE_DIR, 'config.json')
+CACHE_FILE = os.path.join(BASE_DIR, 'cache', 'bus_topology.json')
+
+# Address ranges each chip can be strapped to
+ADDRESS_RANGES = {
+    'MCP23017': range(0x20, 0x28),
+    'ADS1115': range(0x48, 0x4C),
+    'PCA9685': range(0x40, 0x80),
+}
+PCA9685_ALL_CALL = 0x70  # Every PCA9685 answers here unless ALLCALL is disabled
+
+
+def read_register(i2c, address, register, length=1):
+    buffer = bytearray(length)
+    i2c.writeto_then_readfrom(address, bytes([register]), buffer)
+    return buffer
+
+
+def identify(i2c, address):
+    '''Guesses the chip at an address from a few register reads that do not change its state'''
+    try:
+        if address in ADDRESS_RANGES['MCP23017']:
+            # IOCON is mirrored at 0x0A and 0x0B
+            if read_register(i2c, address, 0x0A)[0] == read_register(i2c, address, 0x0B)[0]:
+                return 'MCP23017'
+        if address in ADDRESS_RANGES['PCA9685']:
+            # MODE2 bits 7:5 are reserved and read back as 0; on an ADS1115 this is the config register's MSB
+            mode2 = read_register(i2c, address, 0x01)[0]
+            if mode2 & 0xE0 == 0:
+                return 'PCA9685'
+        if address in ADDRESS_RANGES['ADS1115']:
+            return 'ADS1115'
+    except OSError as e:
+        logger.debug("      🚥 🔎 Failed to identify %#x: %s", address, e)
+    return 'unknown'
+
+
+def scan_bus(i2c):
+    '''Scans the bus once and returns {address: chip type}'''
+    while not i2c.try_lock():
+        time.sleep(0.001)
+    try:
+        addresses = i2c.scan()
+        return {address: identify(i2c, address) for address in addresses}
+    finally:
+        i2c.unlock()
+
+
+def reconcile(found, board_configs):
+    '''Compares a scan against the boards section of config.json'''
+    report = {'ok': [], 'missing': [], 'wrong_type': [], 'unexpected': [], 'duplicate': []}
+    claimed = {}
+    for board_config in board_configs:
+        if 'i2c_address' not in board_config:
+            continue
+        address = int(board_config['i2c_address'], 16)
+        claimed.setdefault(address, []).append(board_config['id'])
+        chip = found.get(address)
+        if chip is None:
+            report['missing'].append((board_config['id'], hex(address)))
+        elif chip not in (board_config['type'], 'unknown'):
+            report['wrong_type'].append((board_config['id'], hex(address), board_config['type'], chip))
+        else:
+            report['ok'].append((board_config['id'], hex(address)))
+    for address, ids in claimed.items():
+        if len(ids) > 1:
+            report['duplicate'].append((hex(address), ids))
+    for address, chip in sorted(found.items()):
+        if address not in claimed and not (address == PCA9685_ALL_CALL and 'PCA9685' in found.values()):
+            report['unexpected'].append((hex(address), chip))
+    return report
+
+
+def boards_on_bus(board_configs, bus_id):
+    return [board_config for board_config in board_configs if board_config.get('bus', DEFAULT_BUS) == bus_id]
+
+
+def save_cache(found_by_bus, path=CACHE_FILE):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    buses = {bus_id: {hex(address): chip for address, chip in found.items()} for bus_id, found in found_by_bus.items()}
+    atomic_write_json(path, {'scanned_at': time.time(), 'buses': buses})
+
+
+def load_cache(path=CACHE_FILE):
+    '''Returns the cached {bus id: {address: chip type}} from the last scan, or None'''
+    try:
+        with open(path, 'r') as f:
+            cache = json.load(f)
+        return {bus_id: {int(address, 16): chip for address, chip in found.items()} for bus_id, found in cache['buses'].items()}
+    except (OSError, ValueError, KeyError, AttributeError):
+        return None
+
+
+def print_report(report):
+    for board_id, address in report['ok']:
+        print(f"  ✅ {board_id} at {address}")
+    for board_id, address in report['missing']:
+        print(f"  💢 {board_id} expected at {address} did not answer")
+    for board_id, address, expected, found in report['wrong_type']:
+        print(f"  💢 {board_id} at {address} looks like a {found}, config says {expected}")
+    for address, ids in report['duplicate']:
+        print(f"  💢 {address} is used by more than one board: {', '.join(ids)}")
+    for address, chip in report['unexpected']:
+        print(f"  🌟 {address} answered ({chip}) but is not in config.json")
+
+
+if __name__ == '__main__':
+    with open(CONFIG_FILE, 'r') as config_file:
+        config = json.load(config_file)
+    bus_manager = Bus_Manager(config.get('buses', []))
+    found_by_bus = {}
+    problems = False
+    for bus_id in bus_manager.bus_ids():
+        found_by_bus[bus_id] = scan_bus(bus_manager.get(bus_id))
+        report = reconcile(found_by_bus[bus_id], boards_on_bus(config.get('boards', []), bus_id))
+        print(f"Bus {bus_id}:")
+        print_report(report)
+        problems = problems or bool(report['missing'] or report['wrong_type'] or report['duplicate'])
+    save_cache(found_by_bus)
+    sys.exit(1 if problems else 0)
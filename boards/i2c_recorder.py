@@ -0,0 +1,316 @@
+import errno
+import logging
+import os
+import runpy
+import struct
+import sys
+import threading
+import time
+import _thread
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RECORD_ENV = 'HOKORI_I2C_RECORD'  # Directory; each run records into a timestamped session folder under it
+REPLAY_ENV = 'HOKORI_I2C_REPLAY'  # Session folder to replay instead of opening the real buses
+STRICT_ENV = 'HOKORI_I2C_REPLAY_STRICT'  # Set to 1 to replay in the recorded order across addresses
+CAPTURE_SUFFIX = '.i2c'
+
+# File: MAGIC, then one RECORD per transaction followed by its written and read bytes.
+# Times are monotonic seconds since the capture started; status is 0 or the errno raised.
+MAGIC = b'HKI2C\x01'
+RECORD = struct.Struct('<dBBBHH')  # time, op, address, status, bytes written, bytes read
+WRITE, READ, WRITE_READ, SCAN = 1, 2, 3, 4
+OP_NAMES = {WRITE: 'write', READ: 'read', WRITE_READ: 'write_read', SCAN: 'scan'}
+FLUSH_INTERVAL = 1.0  # Seconds between flushes of the capture file
+LOOKAHEAD = 16  # Recorded transactions searched per address for one of the right kind
+STRICT_WAIT = 1.0  # Seconds a strict replay waits for a transaction's turn before serving it anyway
+
+replayed = []  # Every Replay_I2C created, for the replay runner's report
+capture_exhausted = threading.Event()  # Set once any replayed bus is asked for more than it recorded
+
+
+def capture_path(directory, bus_id):
+    return os.path.join(directory, f"{bus_id}{CAPTURE_SUFFIX}")
+
+
+def read_capture(path):
+    '''Reads a capture file into a list of (time, op, address, status, written, read) tuples'''
+    with open(path, 'rb') as f:
+        data = f.read()
+    if not data.startswith(MAGIC):
+        raise ValueError(f"{path} is not an I2C capture")
+    records = []
+    offset = len(MAGIC)
+    while offset + RECORD.size <= len(data):
+        stamp, op, address, status, out_length, in_length = RECORD.unpack_from(data, offset)
+        offset += RECORD.size
+        end = offset + out_length + in_length
+        if end > len(data):
+            break  # Torn final record from a crash mid-write
+        records.append((stamp, op, address, status, data[offset:offset + out_length], data[offset + out_length:end]))
+        offset = end
+    return records
+
+
+class Recording_I2C:
+    '''Wraps a busio-style I2C bus and logs every transaction to a capture file.
+
+    Each transaction costs one struct.pack and a buffered write; the file is flushed
+    at most once per FLUSH_INTERVAL. Anything not a transaction (locking, frequency,
+    deinit) is passed straight through to the wrapped bus.
+    '''
+    def __init__(self, bus, path):
+        self.bus = bus
+        self.path = path
+        self.file = open(path, 'wb')
+        self.file.write(MAGIC)
+        self.started = time.monotonic()
+        self.flushed = self.started
+        self.lock = threading.Lock()
+
+    def __getattr__(self, name):
+        return getattr(self.bus, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.bus.deinit()
+
+    def log(self, op, address, status, written, read):
+        now = time.monotonic()
+        with self.lock:
+            if self.file.closed:
+                return
+            self.file.write(RECORD.pack(now - self.started, op, address, status, len(written), len(read)))
+            self.file.write(written)
+            self.file.write(read)
+            if now - self.flushed >= FLUSH_INTERVAL:
+                self.file.flush()
+                self.flushed = now
+
+    def writeto(self, address, buffer, *, start=0, end=None):
+        status = 0
+        try:
+            return self.bus.writeto(address, buffer, start=start, end=end)
+        except OSError as e:
+            status = e.errno or errno.EIO
+            raise
+        finally:
+            self.log(WRITE, address, status, bytes(buffer[start:end]), b'')
+
+    def readfrom_into(self, address, buffer, *, start=0, end=None):
+        status = 0
+        try:
+            return self.bus.readfrom_into(address, buffer, start=start, end=end)
+        except OSError as e:
+            status = e.errno or errno.EIO
+            raise
+        finally:
+            self.log(READ, address, status, b'', b'' if status else bytes(buffer[start:end]))
+
+    def writeto_then_readfrom(self, address, buffer_out, buffer_in, *, out_start=0, out_end=None, in_start=0, in_end=None):
+        status = 0
+        try:
+            return self.bus.writeto_then_readfrom(address, buffer_out, buffer_in, out_start=out_start, out_end=out_end,
+                                                  in_start=in_start, in_end=in_end)
+        except OSError as e:
+            status = e.errno or errno.EIO
+            raise
+        finally:
+            self.log(WRITE_READ, address, status, bytes(buffer_out[out_start:out_end]),
+                     b'' if status else bytes(buffer_in[in_start:in_end]))
+
+    def scan(self):
+        found = self.bus.scan()
+        self.log(SCAN, 0, 0, b'', bytes(found))
+        return found
+
+    def close(self):
+        with self.lock:
+            if not self.file.closed:
+                self.file.close()
+
+
+class Replay_I2C:
+    '''A fake bus that answers from a capture instead of the wires.
+
+    By default each address is served its recorded transactions in order, so the
+    readings a driver sees are the production ones even though thread timing differs.
+    With strict set, transactions are also held until it is their turn in the
+    recorded order across all addresses, which reproduces interleavings such as an
+    ADS1115 read landing between two servo writes. Nothing here sleeps, so a session
+    replays as fast as the code consuming it asks for data.
+    '''
+    def __init__(self, path, strict=False):
+        self.path = path
+        self.strict = strict
+        self.records = read_capture(path)
+        self.consumed = [False] * len(self.records)
+        self.by_address = {}
+        for index, record in enumerate(self.records):
+            self.by_address.setdefault(record[2], []).append(index)
+        self.address_position = dict.fromkeys(self.by_address, 0)  # First unserved entry in each address's list
+        self.position = 0  # First record not yet served, for strict ordering
+        self.served = 0
+        self.mismatches = 0
+        self.condition = threading.Condition()
+        replayed.append(self)
+
+    def try_lock(self):
+        return True
+
+    def unlock(self):
+        pass
+
+    def deinit(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def take(self, op, address, written):
+        with self.condition:
+            index = None
+            if self.strict:
+                if self.condition.wait_for(lambda: self.position < len(self.records)
+                                           and self.records[self.position][1:3] == (op, address), STRICT_WAIT):
+                    index = self.position
+            if index is None:
+                indexes = self.by_address.get(address, ())
+                first = self.address_position.get(address, 0)
+                while first < len(indexes) and self.consumed[indexes[first]]:
+                    first += 1
+                if indexes:
+                    self.address_position[address] = first
+                pending = [i for i in indexes[first:first + LOOKAHEAD] if not self.consumed[i]]
+                if pending:
+                    index = next((i for i in pending if self.records[i][1] == op), pending[0])
+            if index is None:
+                capture_exhausted.set()
+                raise OSError(errno.EIO, f"End of capture for address {hex(address)}")
+            self.consumed[index] = True
+            while self.position < len(self.records) and self.consumed[self.position]:
+                self.position += 1
+            self.served += 1
+            self.condition.notify_all()
+        stamp, recorded_op, _, status, recorded_written, read = self.records[index]
+        if recorded_op != op or recorded_written != written:
+            self.mismatches += 1
+            logger.debug("🌑 Replay %s to %#x differs from the capture at %.3f s", OP_NAMES[op], address, stamp)
+        if status:
+            raise OSError(status, os.strerror(status))
+        return read
+
+    @staticmethod
+    def fill(buffer, start, end, read):
+        end = len(buffer) if end is None else end
+        count = min(end - start, len(read))
+        buffer[start:start + count] = read[:count]
+
+    def writeto(self, address, buffer, *, start=0, end=None):
+        self.take(WRITE, address, bytes(buffer[start:end]))
+
+    def readfrom_into(self, address, buffer, *, start=0, end=None):
+        self.fill(buffer, start, end, self.take(READ, address, b''))
+
+    def writeto_then_readfrom(self, address, buffer_out, buffer_in, *, out_start=0, out_end=None, in_start=0, in_end=None):
+        self.fill(buffer_in, in_start, in_end, self.take(WRITE_READ, address, bytes(buffer_out[out_start:out_end])))
+
+    def scan(self):
+        return list(self.take(SCAN, 0, b''))
+
+
+class Scaled_Clock:
+    '''Makes the process's clock run `speed` times faster for replays.
+
+    time.sleep and timed Event waits (which threading.Timer uses too) are shortened,
+    and time.monotonic, perf_counter and time advance `speed` seconds per real second,
+    so the control loops' own pacing shrinks with them.
+    '''
+    def __init__(self, speed):
+        self.speed = float(speed)
+        self.originals = None
+
+    def install(self):
+        originals = (time.sleep, time.monotonic, time.perf_counter, time.time, threading.Event.wait)
+        sleep, monotonic, perf_counter, wall, event_wait = originals
+        speed = self.speed
+        bases = {clock: clock() for clock in (monotonic, perf_counter, wall)}
+
+        def scaled(clock):
+            base = bases[clock]
+            return lambda: base + (clock() - base) * speed
+
+        time.sleep = lambda seconds: sleep(seconds / speed)
+        time.monotonic = scaled(monotonic)
+        time.perf_counter = scaled(perf_counter)
+        time.time = scaled(wall)
+        threading.Event.wait = lambda event, timeout=None: event_wait(event, None if timeout is None else timeout / speed)
+        self.originals = originals
+
+    def uninstall(self):
+        if self.originals is not None:
+            time.sleep, time.monotonic, time.perf_counter, time.time, threading.Event.wait = self.originals
+            self.originals = None
+
+
+def summarize(path):
+    records = read_capture(path)
+    span = records[-1][0] if records else 0.0
+    print(f"{path}: {len(records)} transactions over {span:.1f} s")
+    counts = Counter((record[2], record[1]) for record in records)
+    errors = Counter(record[2] for record in records if record[3])
+    for (address, op), count in sorted(counts.items()):
+        print(f"  {hex(address):>6} {OP_NAMES.get(op, op):<10} {count:>8}")
+    for address, count in sorted(errors.items()):
+        print(f"  {hex(address):>6} errors     {count:>8}")
+
+
+def replay(session, speed=1.0, strict=False):
+    '''Runs main.py against a recorded session and returns when the capture runs out'''
+    import boards.i2c_recorder as recorder  # The instance the Bus_Manager uses, also when run as __main__
+    os.environ[REPLAY_ENV] = session
+    os.environ[STRICT_ENV] = '1' if strict else ''
+    os.environ.pop(RECORD_ENV, None)
+    clock = Scaled_Clock(speed)
+    if speed != 1:
+        clock.install()
+    started = time.perf_counter()
+
+    def watch():
+        recorder.capture_exhausted.wait()
+        _thread.interrupt_main()  # main.py shuts down as it does on Ctrl-C
+
+    threading.Thread(target=watch, daemon=True).start()
+    sys.argv = [os.path.join(BASE_DIR, 'main.py')]
+    try:
+        runpy.run_path(sys.argv[0], run_name='__main__')
+    except KeyboardInterrupt:
+        pass
+    finally:
+        elapsed = time.perf_counter() - started
+        clock.uninstall()
+        for bus in recorder.replayed:
+            span = bus.records[-1][0] if bus.records else 0.0
+            print(f"{bus.path}: served {bus.served}/{len(bus.records)}, {bus.mismatches} mismatches, "
+                  f"{span:.1f} s of capture in {elapsed / speed:.1f} s")
+
+
+if __name__ == '__main__':
+    # python -m boards.i2c_recorder summary <file.i2c>...
+    # python -m boards.i2c_recorder replay <session dir> [speed] [--strict]
+    if len(sys.argv) < 3 or sys.argv[1] not in ('summary', 'replay'):
+        print(f"Usage: {sys.argv[0]} summary <file.i2c>... | replay <session dir> [speed] [--strict]")
+        sys.exit(2)
+    if sys.argv[1] == 'summary':
+        for capture in sys.argv[2:]:
+            summarize(capture)
+    else:
+        arguments = [argument for argument in sys.argv[3:] if argument != '--strict']
+        replay(os.path.abspath(sys.argv[2]), float(arguments[0]) if arguments else 1.0, '--strict' in sys.argv)
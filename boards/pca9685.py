@@ -1,5 +1,6 @@
 from adafruit_pca9685 import PCA9685 as Adafruit_PCA9685
 import logging
+from .servo_calibration import MIN_PULSE, MAX_PULSE, effective_frequency, get_calibration
 
 logger = logging.getLogger(__name__)
 
@@ -7,6 +8,7 @@ class PCA9685:
     def __init__(self, i2c, config):
         self.i2c_address = int(config['i2c_address'], 16)
         self.mode = config.get('purpose', 'LED Control')  # Default to LED Control if not specified
+        self.power_rail = config.get('power_rail', config['id'])  # Boards sharing a servo supply share a rail
 
         # Initialize PCA9685
         self.pca = Adafruit_PCA9685(i2c, address=self.i2c_address)
@@ -28,6 +30,12 @@ class PCA9685:
     def set_frequency(self, frequency):
         """Set the PWM frequency in Hz."""
         self.pca.frequency = frequency
+        # Remember the rounded frequency the chip actually runs at so nothing needs to read the prescale register back
+        self.frequency = effective_frequency(frequency)
+
+    def servo_calibration(self, min_pulse=MIN_PULSE, max_pulse=MAX_PULSE):
+        """Return the shared angle to duty-cycle table for this board's frequency."""
+        return get_calibration(self.frequency, min_pulse, max_pulse)
 
     def set_pwm(self, channel, on, off):
         """Set the PWM on/off values for a specific channel."""
@@ -39,14 +47,4 @@ class PCA9685:
 
     def set_servo_angle(self, channel, angle):
         """Set the servo angle for a specific channel."""
-        min_pulse = 1000  # Minimum pulse width (in microseconds)
-        max_pulse = 2000  # Maximum pulse width (in microseconds)
-        pulse_range = max_pulse - min_pulse
-        angle_range = 180  # Full range of servo angles (typically 0-180 degrees)
-
-        # Calculate duty cycle value for the given angle
-        pulse_width = min_pulse + (pulse_range * angle / angle_range)
-        duty_cycle_value = int((pulse_width * 65535) / (1000000 / self.pca.frequency))
-
-        # Set the duty cycle for the specified channel
-        self.set_pwm_value(channel, duty_cycle_value)
+        self.set_pwm_value(channel, self.servo_calibration().duty_cycle(angle))
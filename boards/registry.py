@@ -0,0 +1,42 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Board type -> factory(bus, board_config). Each factory imports its driver on first use,
+# so a setup without servo boards never loads adafruit_pca9685, and so on.
+BOARD_TYPES = {}
+
+
+def register(board_type):
+    def decorator(factory):
+        BOARD_TYPES[board_type] = factory
+        return factory
+    return decorator
+
+
+@register('MCP23017')
+def mcp23017(bus, board_config):
+    from .mcp23017 import MCP23017
+    return MCP23017(bus, board_config)
+
+
+@register('PCA9685')
+def pca9685(bus, board_config):
+    from .pca9685 import PCA9685
+    return PCA9685(bus, board_config)
+
+
+@register('ADS1115')
+def ads1115(bus, board_config):
+    from adafruit_ads1x15.ads1115 import ADS1115
+    board = ADS1115(bus, address=int(board_config['i2c_address'], 16))
+    logger.info(f"     🔮 Initialized ADS1115 at address {board_config['i2c_address']} and board ID {board_config['id']}")
+    return board
+
+
+def create(board_type, bus, board_config):
+    '''Builds a board driver for a config entry; None for a type nothing is registered for'''
+    factory = BOARD_TYPES.get(board_type)
+    if factory is None:
+        return None
+    return factory(bus, board_config)
@@ -0,0 +1,49 @@
+from functools import lru_cache
+
+MIN_PULSE = 1000  # Minimum pulse width (in microseconds)
+MAX_PULSE = 2000  # Maximum pulse width (in microseconds)
+ANGLE_RANGE = 180  # Full range of servo angles (typically 0-180 degrees)
+SERVO_FREQUENCY = 50  # 50Hz is typical for servo control
+REFERENCE_CLOCK = 25000000  # PCA9685 internal oscillator
+DUTY_MAX = 0xFFFF
+
+
+def effective_frequency(frequency, reference_clock=REFERENCE_CLOCK):
+    """The frequency the PCA9685 actually runs at once the requested one is rounded to a prescale value."""
+    prescale = int(reference_clock / 4096.0 / frequency + 0.5) - 1
+    prescale = min(max(prescale, 3), 255)
+    return reference_clock / 4096.0 / (prescale + 1)
+
+
+class Servo_Calibration:
+    """Angle to 16-bit duty-cycle lookup table for one pulse range at one PWM frequency.
+
+    Tables are built once per (frequency, min_pulse, max_pulse) and shared between
+    every servo with the same settings, so a move is a list index instead of float
+    math plus a prescale register read.
+    """
+    def __init__(self, frequency, min_pulse=MIN_PULSE, max_pulse=MAX_PULSE):
+        self.frequency = frequency
+        self.min_pulse = min_pulse
+        self.max_pulse = max_pulse
+        period = 1000000 / frequency
+        pulse_range = max_pulse - min_pulse
+        self.table = tuple(
+            min(DUTY_MAX, int(((min_pulse + (pulse_range * angle / ANGLE_RANGE)) * 65535) / period))
+            for angle in range(ANGLE_RANGE + 1)
+        )
+
+    def duty_cycle(self, angle):
+        """Duty cycle for the nearest whole degree, clamped to 0-180."""
+        index = int(angle + 0.5)
+        if index < 0:
+            index = 0
+        elif index > ANGLE_RANGE:
+            index = ANGLE_RANGE
+        return self.table[index]
+
+
+@lru_cache(maxsize=None)
+def get_calibration(frequency, min_pulse=MIN_PULSE, max_pulse=MAX_PULSE):
+    """Returns the shared lookup table for these settings, building it on first use."""
+    return Servo_Calibration(frequency, min_pulse, max_pulse)
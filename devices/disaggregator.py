@@ -0,0 +1,252 @@
+import json
+import logging
+import math
+import os
+import threading
+import time
+from adafruit_ads1x15.analog_in import AnalogIn
+from utils.metrics import registry
+from utils.persistence import atomic_write_json
+from boards.board_health import monitor
+from utils.watchdog import watchdog
+from .mains_detector import goertzel_power, MAINS_FREQUENCY
+from .voltage_sensor import ADS_PIN_NUMBERS, ads_in_use, read_burst
+
+try:
+    import numpy
+except ImportError:  # Optional; burst_features falls back to pure Python with the same results
+    numpy = None
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SIGNATURES_FILE = os.path.join(BASE_DIR, 'cache', 'panel_signatures.json')
+
+FEATURE_HARMONICS = (1, 3, 5)  # Motors and switching supplies differ most in their odd harmonics
+BURST_INTERVAL = 0.1
+STEP_THRESHOLD = 0.05  # Change in RMS, as a fraction of full scale, that counts as a load switching
+SETTLE_BURSTS = 3  # Bursts within tolerance of each other before a new steady level is accepted
+MATCH_TOLERANCE = 0.35  # Largest relative distance between a step and a signature that still counts as a match
+LEARN_WINDOW = 3.0  # Seconds after a known tool changes state in which the next step is credited to it
+FULL_SCALE_COUNTS = 32767
+
+panel_steps = registry.counter('hokori_panel_steps_total', 'Load steps seen on an aggregate current sensor', ('panel', 'match'))
+
+
+def burst_features(samples, sample_rate, mains_frequency=MAINS_FREQUENCY):
+    '''Feature vector for one burst: RMS of the AC part, then the magnitude at each feature harmonic'''
+    if numpy is not None:
+        return burst_features_numpy(samples, sample_rate, mains_frequency)
+    mean = sum(samples) / len(samples)
+    rms = math.sqrt(sum((sample - mean) ** 2 for sample in samples) / len(samples))
+    harmonics = [math.sqrt(goertzel_power(samples, mains_frequency * harmonic, sample_rate))
+                 for harmonic in FEATURE_HARMONICS if mains_frequency * harmonic < sample_rate / 2]
+    return [rms] + harmonics
+
+
+def burst_features_numpy(samples, sample_rate, mains_frequency=MAINS_FREQUENCY):
+    '''burst_features with numpy: all harmonics come out of one matrix product instead of a Goertzel loop each'''
+    ac = numpy.asarray(samples, dtype=float)
+    ac -= ac.mean()
+    frequencies = [mains_frequency * harmonic for harmonic in FEATURE_HARMONICS if mains_frequency * harmonic < sample_rate / 2]
+    basis = numpy.exp(-2j * numpy.pi / sample_rate * numpy.outer(frequencies, numpy.arange(len(ac))))
+    harmonics = numpy.abs(basis @ ac) / len(ac)  # Same magnitude as sqrt(goertzel_power)
+    return [float(numpy.sqrt(numpy.mean(ac * ac)))] + harmonics.tolist()
+
+
+def distance(step, signature):
+    '''Distance between a load step and a signature, relative to the signature's size'''
+    size = math.sqrt(sum(value * value for value in signature)) or 1.0
+    return math.sqrt(sum((a - b) ** 2 for a, b in zip(step, signature))) / size
+
+
+class Panel_Monitor:
+    '''Infers which tools are running from one aggregate current sensor.
+
+    Each burst is reduced to a small feature vector (RMS plus a few mains harmonics).
+    When the steady level steps, the change in features is matched against learned
+    per-tool signatures: a rise matches a tool that is off, a fall a tool that is on.
+    Signatures are learned from tools that have their own button or sensor: the
+    first step after such a tool changes state is averaged into its signature.
+    Tools with only a "panel" entry are then driven from the panel alone.
+
+    A tool only gets a signature while it has inputs of its own, so to drive a tool
+    from the panel alone, give it a button or sensor, run it a few times, then remove
+    them from its config. `python -m devices.disaggregator` shows what has been learned.
+    '''
+    def __init__(self, panel_config, ads):
+        self.id = panel_config['id']
+        self.label = panel_config.get('label', self.id)
+        self.board_name = panel_config['connection']['board']
+        self.ads = ads
+        self.pin_number = int(ADS_PIN_NUMBERS[panel_config['connection']['pins'][0]])
+        self.mains_frequency = float(panel_config.get('mains_frequency', MAINS_FREQUENCY))
+        self.step_threshold = float(panel_config.get('step_threshold', STEP_THRESHOLD)) * FULL_SCALE_COUNTS
+        self.health = monitor.board(self.board_name)
+        self.chan = AnalogIn(self.ads, self.pin_number)
+        ads_in_use.add(id(self.ads))
+        self.signatures = self.load_signatures()
+        self.inferred = {}  # tool id -> Tool driven from this panel
+        self.running = set()  # Ids of inferred tools currently on
+        self.teaching = None  # (tool id, 'on'/'off', deadline) waiting for its step
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.heartbeat = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.matched = panel_steps.labels(self.id, 'matched')
+        self.learned = panel_steps.labels(self.id, 'learned')
+        self.unknown = panel_steps.labels(self.id, 'unknown')
+
+    # Signatures
+
+    def load_signatures(self):
+        try:
+            with open(SIGNATURES_FILE, 'r') as f:
+                return json.load(f).get(self.id, {})
+        except (OSError, ValueError):
+            return {}
+
+    def save_signatures(self):
+        try:
+            with open(SIGNATURES_FILE, 'r') as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            stored = {}
+        stored[self.id] = self.signatures
+        try:
+            os.makedirs(os.path.dirname(SIGNATURES_FILE), exist_ok=True)
+            atomic_write_json(SIGNATURES_FILE, stored)
+        except OSError as e:
+            logger.error(f"💢 ⚡︎ Failed to save panel signatures: {e}")
+
+    def learn(self, tool_id, step, inrush):
+        entry = self.signatures.get(tool_id)
+        if entry is None:
+            entry = self.signatures[tool_id] = {'features': step, 'inrush': inrush, 'samples': 0}
+        count = entry['samples']
+        entry['features'] = [(old * count + new) / (count + 1) for old, new in zip(entry['features'], step)]
+        entry['inrush'] = (entry['inrush'] * count + inrush) / (count + 1)
+        entry['samples'] = count + 1
+        self.learned.inc()
+        logger.info(f"     🔮 ⚡︎ Learned {tool_id} on {self.label} ({entry['samples']} samples)")
+        self.save_signatures()
+
+    # Tools
+
+    def attach_teacher(self, tool):
+        '''A tool with its own button or sensor; its state changes teach this panel its signature'''
+        tool.add_status_listener(self.teacher_changed)
+
+    def attach_inferred(self, tool):
+        '''A tool with no sensor of its own; its status is set from what this panel sees'''
+        self.inferred[tool.id] = tool
+
+    def teacher_changed(self, tool, status):
+        if status in ('on', 'override'):
+            direction = 'on'
+        elif status in ('spindown', 'off'):
+            direction = 'off'
+        else:
+            return
+        with self.lock:
+            self.teaching = (tool.id, direction, time.monotonic() + LEARN_WINDOW)
+
+    # Sampling
+
+    def get_burst(self):
+        if not self.health.available:
+            return None, None
+        try:
+            samples, rate = read_burst(self.ads, self.chan)
+            self.health.record_success()
+            return samples, rate
+        except OSError as e:
+            self.health.record_failure(e)
+            return None, None
+
+    def start(self):
+        for tool_id in self.inferred:
+            if tool_id not in self.signatures:
+                logger.warning(f"🌟 ⚡︎ {tool_id} has no learned signature on {self.label} and will stay off; "
+                               f"teach it with a button or sensor first")
+        self.heartbeat = watchdog.loop(f"panel {self.label}")
+        self.thread.start()
+
+    def run(self):
+        steady = None
+        candidate = []  # Recent burst features while the level is moving
+        peak = 0.0
+        while not self.stop_event.wait(BURST_INTERVAL):
+            self.heartbeat.beat()
+            samples, rate = self.get_burst()
+            if samples is None:
+                continue
+            features = burst_features(samples, rate, self.mains_frequency)
+            if steady is None:
+                steady = features
+                continue
+            if not candidate and abs(features[0] - steady[0]) < self.step_threshold:
+                steady = [old * 0.9 + new * 0.1 for old, new in zip(steady, features)]  # Follow slow drift
+                continue
+            # The level is moving; wait for it to settle, remembering the inrush peak
+            peak = max(peak, features[0])
+            candidate = (candidate + [features])[-SETTLE_BURSTS:]
+            recent = candidate
+            if len(recent) < SETTLE_BURSTS or max(f[0] for f in recent) - min(f[0] for f in recent) > self.step_threshold / 2:
+                continue
+            settled = [sum(f[i] for f in recent) / SETTLE_BURSTS for i in range(len(features))]
+            step = [new - old for new, old in zip(settled, steady)]
+            inrush = max(0.0, peak - settled[0])
+            steady, candidate, peak = settled, [], 0.0
+            if abs(step[0]) >= self.step_threshold:
+                self.step_detected(step, inrush)
+
+    def step_detected(self, step, inrush):
+        with self.lock:
+            teaching = self.teaching if self.teaching and self.teaching[2] > time.monotonic() else None
+            self.teaching = None
+        rising = step[0] > 0
+        if teaching is not None and (teaching[1] == 'on') == rising:
+            self.learn(teaching[0], step if rising else [-value for value in step], inrush)
+            return
+
+        # Rises can only be tools that are off; falls only tools that are running
+        candidates = [tool_id for tool_id in self.inferred if (tool_id in self.running) != rising and tool_id in self.signatures]
+        if rising:  # Starts also carry an inrush; stops do not
+            target = step + [inrush]
+            reference = lambda tool_id: self.signatures[tool_id]['features'] + [self.signatures[tool_id]['inrush']]
+        else:
+            target = [-value for value in step]
+            reference = lambda tool_id: self.signatures[tool_id]['features']
+        best = min(candidates, key=lambda tool_id: distance(target, reference(tool_id)), default=None)
+        if best is None or distance(target, reference(best)) > MATCH_TOLERANCE:
+            self.unknown.inc()
+            logger.debug("      🚥 ⚡︎ Unmatched %s of %.0f on %s", 'rise' if rising else 'fall', step[0], self.label)
+            return
+        self.matched.inc()
+        if rising:
+            self.running.add(best)
+        else:
+            self.running.discard(best)
+        self.inferred[best].update_status_from_voltage('on' if rising else 'off')
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join(timeout=5)
+        if self.heartbeat is not None:
+            self.heartbeat.close()
+
+
+if __name__ == '__main__':
+    # python -m devices.disaggregator: show what has been learned so far
+    try:
+        with open(SIGNATURES_FILE, 'r') as signatures_file:
+            panels = json.load(signatures_file)
+    except (OSError, ValueError) as e:
+        print(f"No signatures learned yet: {e}")
+        raise SystemExit(1)
+    for panel_id, signatures in panels.items():
+        print(f"Panel {panel_id}:")
+        for tool_id, entry in sorted(signatures.items()):
+            features = ', '.join(f"{value:.0f}" for value in entry['features'])
+            print(f"  {tool_id}: [{features}] inrush {entry['inrush']:.0f} from {entry['samples']} steps")
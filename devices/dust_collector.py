@@ -2,17 +2,37 @@ import logging
 import RPi.GPIO as GPIO  # Import the RPi.GPIO module
 import threading
 import time
+from utils.metrics import registry
+from utils.watchdog import watchdog
 
 logger = logging.getLogger(__name__)
 
+collector_on = registry.gauge('hokori_collector_on', '1 while the dust collector relay is closed', ('collector',))
+collector_starts = registry.counter('hokori_collector_starts_total', 'Dust collector relay activations', ('collector',))
+collector_runtime = registry.counter('hokori_collector_runtime_seconds_total', 'Accumulated dust collector run time', ('collector',))
+
 class Dust_Collector:
+    '''Runs the collector relay while any of its tools wants air.
+
+    There is no collector-level spin down: each tool holds 'spindown' for its own
+    preferences.spin_down_time (DEFAULT_SPIN_DOWN_TIME, the collector's old 30 s, when
+    unset) and the collector simply follows the tools.
+    '''
     def __init__(self, collector_config, tools):
+        self.config = collector_config
         self.label = collector_config.get('label', 'unknown')
+        self.id = collector_config.get('id', self.label)
         self.status = 'off'
         self.gpio_pin = None
         self.tools = tools  # List of tools to monitor
         self.stop_event = threading.Event()  # Event to stop the thread
-        self.spin_down_time = collector_config.get('preferences', {}).get('spin_down_time', 30)  # Default to 30 seconds
+        self.wake_event = threading.Event()  # Set to re-check the tools straight away
+        self.status_listeners = []  # Callables notified with (collector, status) on every real status change
+        self.turned_on_at = None
+        self.manual_on = False  # Run from a GUI whatever the tools want, until cleared
+        self.on_gauge = collector_on.labels(self.label)
+        self.starts = collector_starts.labels(self.label)
+        self.runtime = collector_runtime.labels(self.label)
 
         try:
             self.setup_relay(collector_config)
@@ -20,24 +40,37 @@ class Dust_Collector:
             logger.error(f"💢  💨 Error in Dust_Collector setup: Missing key {e}")
             raise  # Re-raise the exception to be caught in main.py
 
+        self.heartbeat = watchdog.loop(f"collector {self.label}")
         self.thread = threading.Thread(target=self.run, daemon=True)
         self.thread.start()
 
     def setup_relay(self, collector_config):
         relay_conn = collector_config.get('relay', {}).get('connection', {})
-        logger.debug(f"      🚥 💨 Setting up relay for {self.label} with config: {relay_conn}")
+        logger.debug("      🚥 💨 Setting up relay for %s with config: %s", self.label, relay_conn)
         self.gpio_pin = relay_conn.get('pins', [40])[0]  # Assuming 'pins' is a list; take the first pin
         if not self.gpio_pin:
             raise KeyError("pin")
 
         GPIO.setmode(GPIO.BCM)
         GPIO.setup(self.gpio_pin, GPIO.OUT, initial=GPIO.LOW)
-        logger.debug(f"      🚥 💨 GPIO pin {self.gpio_pin} set up for dust collector {self.label}")
+        logger.debug("      🚥 💨 GPIO pin %s set up for dust collector %s", self.gpio_pin, self.label)
+
+    def apply_config(self, collector_config):
+        """Apply edited preferences in place. Returns False if the relay wiring changed and a rebuild is needed."""
+        if collector_config.get('relay') != self.config.get('relay'):
+            return False
+        self.config = collector_config
+        logger.info(f"     🔮 💨 Dust collector {self.label} settings reloaded")
+        return True
 
     def turn_on(self):
         if self.status != 'on':
             self.status = 'on'
+            self.turned_on_at = time.monotonic()
+            self.on_gauge.set(1)
+            self.starts.inc()
             logger.info(f"     🔮 💨 Dust collector {self.label} turned on 💫")
+            self.notify_status_listeners()
             if self.gpio_pin is not None:
                 GPIO.output(self.gpio_pin, GPIO.HIGH)
                 #logger.debug(f"      🚥 💨 GPIO pin {self.gpio_pin} activated for dust collector {self.label}")
@@ -45,37 +78,58 @@ class Dust_Collector:
     def turn_off(self):
         if self.status != 'off':
             self.status = 'off'
+            if self.turned_on_at is not None:
+                self.runtime.inc(time.monotonic() - self.turned_on_at)
+                self.turned_on_at = None
+            self.on_gauge.set(0)
             logger.info(f"     🔮 💨 Dust collector {self.label} turned off 💤")
+            self.notify_status_listeners()
             if self.gpio_pin is not None:
                 GPIO.output(self.gpio_pin, GPIO.LOW)
                 #logger.debug(f"      🚥 💨 GPIO pin {self.gpio_pin} deactivated for dust collector {self.label}")
 
+    def add_status_listener(self, callback):
+        """Register a callable to be notified with (collector, status) when the relay changes."""
+        self.status_listeners.append(callback)
+
+    def notify_status_listeners(self):
+        for callback in self.status_listeners:
+            try:
+                callback(self, self.status)
+            except Exception as e:
+                logger.error(f"💢  💨 Status listener failed for dust collector {self.label}: {e}")
+
     def run(self):
         """Main loop to manage the dust collector based on tool statuses."""
         while not self.stop_event.is_set():
+            self.heartbeat.beat()
             self.manage_collector()
-            time.sleep(1)  # Adjust sleep time as needed
+            self.wake_event.wait(1)  # Re-check every second, or as soon as someone calls wake()
+            self.wake_event.clear()
 
-    def manage_collector(self):
-        any_tool_on = False
-        max_spin_down_time = 0
+    def set_manual(self, on):
+        """Hold the collector on by hand (on=True), or hand it back to the tools (on=False)."""
+        self.manual_on = on
+        logger.info(f"     🔮 💨 Dust collector {self.label} {'held on by hand' if on else 'back under tool control'}")
+        self.wake()
 
-        for tool in self.tools:
-            if tool.status == 'on' and tool.preferences.get('use_collector', False):
-                any_tool_on = True
-                max_spin_down_time = max(max_spin_down_time, tool.preferences.get('spin_down_time', self.spin_down_time))
+    def wake(self):
+        """Re-check the tools now instead of at the next one second poll."""
+        self.wake_event.set()
 
-        if any_tool_on:
+    def manage_collector(self):
+        # Tools hold 'spindown' for their own spin_down_time, so the collector can follow them directly
+        if self.manual_on or any(tool.wants_air() and tool.preferences.get('use_collector', False) for tool in self.tools):
             self.turn_on()
         elif self.status == 'on':
-            logger.info(f"     🔮 💨 Dust collector {self.label} will spin down in {max_spin_down_time} seconds.")
-            time.sleep(max_spin_down_time)
             self.turn_off()
 
     def cleanup(self):
         logger.info(f"Stopping dust collector {self.label}")
         self.stop_event.set()  # Signal the thread to stop
+        self.wake_event.set()
         self.thread.join(timeout=5)  # Wait for the thread to finish with a timeout
+        self.heartbeat.close()
         logger.info(f"Dust collector {self.label} thread stopped")
 
         if self.gpio_pin is not None:
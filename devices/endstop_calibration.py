@@ -0,0 +1,131 @@
+import logging
+import statistics
+import threading
+import time
+from adafruit_ads1x15.analog_in import AnalogIn
+from .voltage_sensor import ADS_PIN_NUMBERS, ads_locks
+from .motion_planner import DEFAULT_RAIL_BUDGET
+
+logger = logging.getLogger(__name__)
+
+# Defaults used when config.json's "motion" section does not override them
+STEP_DEGREES = 1  # Sweep resolution
+STEP_TIME = 0.03  # Seconds per step; slow enough that the horn keeps up with the PWM
+STALL_CURRENT = 0.5  # Amps above the running draw of the sweep that count as pushing on a stop
+STALL_STEPS = 3  # Consecutive steps over the stall level before the stop is believed
+BACKOFF_DEGREES = 3  # Margin left between the found stop and the saved angle, so the servo never buzzes
+SENSE_SAMPLES = 8  # ADS1115 conversions averaged per reading
+SETTLE_TIME = 0.5  # Seconds given to reach the sweep's starting angle, and to zero the sensor
+RUNNING_WINDOW = 10  # Recent non-stalled readings the running draw is the median of
+
+
+class Current_Sense:
+    '''Supply current of one servo rail, from a hall-effect sensor (ACS712 style) on an ADS1115 channel.
+
+    Only changes matter here, so the zero point is measured with the rail's servos
+    released instead of trusting the sensor's nominal mid-supply offset.
+    '''
+    def __init__(self, ads, pin, volts_per_amp):
+        self.ads = ads
+        self.chan = AnalogIn(ads, ADS_PIN_NUMBERS[int(pin)])
+        self.volts_per_amp = float(volts_per_amp)
+        self.zero = 0.0
+
+    def voltage(self):
+        with ads_locks.setdefault(id(self.ads), threading.Lock()):
+            return sum(self.chan.voltage for _ in range(SENSE_SAMPLES)) / SENSE_SAMPLES
+
+    def zero_now(self):
+        self.zero = self.voltage()
+
+    def amps(self):
+        return abs(self.voltage() - self.zero) / self.volts_per_amp
+
+
+class Endstop_Calibrator:
+    '''Finds each gate's mechanical endstops by sweeping its servo and watching for stall current.
+
+    A servo sweeping freely draws a modest, steady current; once the blade meets its
+    stop the servo stalls and the draw jumps. Each rail has a single current sensor, so
+    gates on one rail are swept one at a time while rails sweep in parallel. A reading
+    at the rail's budget counts as a stall on the spot, which keeps a sweep from
+    browning out the rail's other servos.
+    '''
+    def __init__(self, sensors, motion_config=None):
+        motion_config = motion_config or {}
+        self.sensors = sensors  # rail -> Current_Sense
+        self.default_budget = float(motion_config.get('default_rail_budget', DEFAULT_RAIL_BUDGET))
+        self.rail_budgets = {rail: float(budget) for rail, budget in motion_config.get('rails', {}).items()}
+        self.stall_current = float(motion_config.get('stall_current', STALL_CURRENT))
+        self.step_time = float(motion_config.get('calibration_step_time', STEP_TIME))
+        self.results = {}  # gate name -> (stop towards 0, stop towards 180); None where no stop was found
+        self.lock = threading.Lock()
+
+    def sweep(self, gate, sense, budget, start, end):
+        '''Steps from start towards end; returns the angle just short of the stop, or None if there was none'''
+        channel = gate.board.channels[gate.pin]
+        step = STEP_DEGREES if end > start else -STEP_DEGREES
+        running = []
+        stalled = 0
+        angle = start
+        while angle != end:
+            angle = max(min(angle + step, 180), 0) if abs(end - angle) >= STEP_DEGREES else end
+            channel.duty_cycle = gate.angle_to_pwm(angle)
+            time.sleep(self.step_time)
+            amps = sense.amps()
+            typical = statistics.median(running) if running else 0.0
+            if amps >= budget or amps - typical > self.stall_current:
+                stalled += 1
+                if stalled >= STALL_STEPS or amps >= budget:
+                    stop = angle - step * (stalled - 1)  # First step that met the stop
+                    backed_off = max(min(stop - step * BACKOFF_DEGREES, 180), 0)
+                    channel.duty_cycle = gate.angle_to_pwm(backed_off)  # Stop pushing straight away
+                    return backed_off
+            else:
+                stalled = 0
+                running = (running + [amps])[-RUNNING_WINDOW:]
+        return None
+
+    def calibrate_gate(self, gate, sense, budget):
+        channel = gate.board.channels[gate.pin]
+        channel.duty_cycle = 0
+        time.sleep(SETTLE_TIME)
+        sense.zero_now()
+        middle = (gate.min_angle + gate.max_angle) // 2
+        found = []
+        for end in (0, 180):
+            channel.duty_cycle = gate.angle_to_pwm(middle)
+            time.sleep(SETTLE_TIME)
+            found.append(self.sweep(gate, sense, budget, middle, end))
+        channel.duty_cycle = gate.angle_to_pwm(middle)
+        time.sleep(SETTLE_TIME)
+        channel.duty_cycle = 0
+        return tuple(found)
+
+    def calibrate_rail(self, rail, gates):
+        sense = self.sensors[rail]
+        budget = self.rail_budgets.get(rail, self.default_budget)
+        for gate in gates:
+            try:
+                result = self.calibrate_gate(gate, sense, budget)
+            except OSError as e:
+                logger.error(f"💢 Calibration of gate {gate.name} failed: {e}")
+                gate.board.channels[gate.pin].duty_cycle = 0
+                continue
+            with self.lock:
+                self.results[gate.name] = result
+            logger.info(f"     🔮 Gate {gate.name}: stops at {result[0]} and {result[1]}")
+
+    def run(self, gates_by_rail):
+        '''Calibrates every gate, one thread per rail; returns {gate name: (low stop, high stop)}'''
+        threads = []
+        for rail, gates in gates_by_rail.items():
+            if rail not in self.sensors:
+                logger.warning(f"🌟 No current sensor on rail {rail}; skipping {', '.join(gate.name for gate in gates)}")
+                continue
+            thread = threading.Thread(target=self.calibrate_rail, args=(rail, gates), name=f"calibrate-{rail}")
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+        return self.results
@@ -2,31 +2,29 @@ import json
 import logging
 import os
 import time
-from datetime import datetime
+from utils.metrics import registry
+from utils.persistence import Snapshot_Store, serialize
+from utils.log_manager import Rate_Limiter
+from boards.board_health import monitor
+from boards.servo_calibration import MIN_PULSE, MAX_PULSE, SERVO_FREQUENCY, effective_frequency, get_calibration
+from .motion_planner import Motion_Planner, Move
 
 # Constants for configuration files and backup directory
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DEVICE_FILE = os.path.join(BASE_DIR, 'config.json')
 GATES_FILE = os.path.join(BASE_DIR, 'gates.json')
 BACKUP_DIR = os.path.join(BASE_DIR, '_BU')
-LOGS_DIR = os.path.join(BASE_DIR, 'logs')
-LOG_FILE = os.path.join(LOGS_DIR, 'gate_manager.log')
 
-# Ensure the logs and backup directories exist
-os.makedirs(LOGS_DIR, exist_ok=True)
+# Ensure the backup directory exists
 os.makedirs(BACKUP_DIR, exist_ok=True)
 
-# Set up logging
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s %(levelname)s %(message)s',
-    handlers=[
-        logging.FileHandler(LOG_FILE),
-        logging.StreamHandler()
-    ]
-)
+# Logging is configured once by the entry point (see utils/log_manager.py)
 logger = logging.getLogger(__name__)
 
+gate_actuations = registry.counter('hokori_gate_actuations_total', 'Gate open/close movements, for tracking servo wear', ('gate',))
+set_gates_latency = registry.histogram('hokori_set_gates_seconds', 'Time taken by Gate_Manager.set_gates')
+write_error_limiter = Rate_Limiter(interval=10.0)
+
 class Gate:
     def __init__(self, name, gate_info, boards):
         self.name = name
@@ -38,10 +36,15 @@ class Gate:
             raise ValueError(f"💢 Board with ID {board_id} not found")
 
         self.pin = gate_info['io_location']['pin']
+        self.health = monitor.board(board_id)
         self.min_angle = gate_info['min']
         self.max_angle = gate_info['max']
         self.status = gate_info['status']
         self.previous_status = gate_info['status']
+        self.set_calibration(gate_info)
+        self.angle = None  # Last commanded angle; unknown until the first move
+        self.status_listeners = []  # Callables notified with (gate, status) on every real status change
+        self.actuations = gate_actuations.labels(self.name)
 
         try:
             if hasattr(self.board, 'set_servo_angle'):
@@ -54,24 +57,47 @@ class Gate:
 
     def angle_to_pwm(self, angle):
         """Convert a given angle (0-180) to a PWM value."""
-        min_pulse = 1000  # Minimum pulse width (in microseconds)
-        max_pulse = 2000  # Maximum pulse width (in microseconds)
-        pulse_range = max_pulse - min_pulse
-        angle_range = 180  # Full range of servo angles (typically 0-180 degrees)
+        return self.calibration.duty_cycle(angle)
+
+    def set_calibration(self, gate_info):
+        """Per-servo pulse limits are optional in gates.json; the table is shared with every servo using the same ones."""
+        frequency = getattr(self.board, 'frequency', effective_frequency(SERVO_FREQUENCY))
+        self.calibration = get_calibration(frequency, gate_info.get('min_pulse', MIN_PULSE), gate_info.get('max_pulse', MAX_PULSE))
+
+    def apply_config(self, gate_info):
+        """Update angles and pulse limits in place; the next set_gates moves the servo to the new position."""
+        self.min_angle = gate_info['min']
+        self.max_angle = gate_info['max']
+        self.set_calibration(gate_info)
+        self.angle = None
 
-        pulse_width = min_pulse + (pulse_range * angle / angle_range)
-        return int((pulse_width * 65535) / (1000000 / self.board.pca.frequency))
+    def target_angle(self, status):
+        return self.max_angle if status == 'open' else self.min_angle
+
+    def move_to(self, angle):
+        """Write the PWM for the given angle without changing the gate status."""
+        try:
+            self.board.set_pwm_value(self.pin, self.angle_to_pwm(angle))
+            self.health.record_success()
+            self.angle = angle
+        except OSError as e:
+            self.health.record_failure(e)
+            self.angle = None  # Position unknown, move it again next time
+            write_error_limiter.log(logger, logging.ERROR, self.name, "💢 Failed to move gate %s: %s", self.name, e)
 
     def stop_servo(self):
         """Stop sending PWM signal to the servo, effectively turning it off."""
-        self.board.set_pwm_value(self.pin, 0)
-        logger.debug(f"🔌 Servo on pin {self.pin} has been turned off.")
+        try:
+            self.board.set_pwm_value(self.pin, 0)
+        except OSError as e:
+            self.health.record_failure(e)
+            return
+        logger.debug("🔌 Servo on pin %s has been turned off.", self.pin)
 
     def open(self):
 
         try:
-            pwm_value = self.angle_to_pwm(self.max_angle)
-            self.board.set_pwm_value(self.pin, pwm_value)
+            self.move_to(self.max_angle)
             self.update_status("open")
         except ValueError as e:
             logger.error(f"💢 Failed to open gate {self.name}: {e}")
@@ -79,18 +105,27 @@ class Gate:
     def close(self):
 
         try:
-            logger.debug(f'      🚥 ⛩️  Closing {self.name}')
-            pwm_value = self.angle_to_pwm(self.min_angle)
-            self.board.set_pwm_value(self.pin, pwm_value)
+            logger.debug('      🚥 ⛩️  Closing %s', self.name)
+            self.move_to(self.min_angle)
             self.update_status("closed")
         except ValueError as e:
             logger.error(f"💢 Failed to close gate {self.name}: {e}")
 
+    def add_status_listener(self, callback):
+        """Register a callable to be notified with (gate, status) when the status changes."""
+        self.status_listeners.append(callback)
+
     def update_status(self, new_status):
         if self.previous_status != new_status:
             self.previous_status = new_status
             self.status = new_status
-            logger.info(f"     🔮 Gate {self.name} {new_status}.")
+            self.actuations.inc()
+            logger.info("     🔮 Gate %s %s.", self.name, new_status)
+            for callback in self.status_listeners:
+                try:
+                    callback(self, new_status)
+                except Exception as e:
+                    logger.error(f"💢 Status listener failed for gate {self.name}: {e}")
 
     def identify(self):
         if hasattr(self.board, 'set_pwm_value'):
@@ -108,14 +143,17 @@ class Gate:
 
 
 class Gate_Manager:
-    def __init__(self, boards, gates_file=GATES_FILE, backup_dir=BACKUP_DIR):
+    def __init__(self, boards, gates_file=GATES_FILE, backup_dir=BACKUP_DIR, motion_config=None):
         self.boards = boards  # Store the boards dictionary
+        self.planner = Motion_Planner(motion_config)
+        self.move_listeners = []  # Callables notified with (gate, status, elapsed) as each move settles
         self.gates_file = gates_file
         self.backup_dir = backup_dir
+        self.snapshots = Snapshot_Store(backup_dir, 'gates')
         self.gates = {}
         self.gates_dict = self.load_gates()
         if self.gates_dict:
-            logger.debug(f'      🚥 ⛩️ Building gates') 
+            logger.debug('      🚥 ⛩️ Building gates')
             self.build_gates()
             # logger.debug(f'      🚥 ⛩️  Setting all gates')
             # self.set_gates()  # Set all gates to their initial positions
@@ -123,7 +161,7 @@ class Gate_Manager:
     def load_gates(self):
         '''Loads gates from a JSON file'''
         if os.path.exists(self.gates_file):
-            logger.debug(f"      🚥 Loading gates from {self.gates_file}")
+            logger.debug("      🚥 Loading gates from %s", self.gates_file)
             with open(self.gates_file, 'r') as f:
                 try:
                     gates_dict = json.load(f)
@@ -146,18 +184,77 @@ class Gate_Manager:
             try:
                 gate = Gate(name, gate_info, self.boards)  # Pass the boards dictionary to the Gate
                 self.gates[name] = gate
-                logger.debug(f'      🚥 ⛩️  Gate {name} created with board {gate_info["io_location"]["board"]} and pin {gate_info["io_location"]["pin"]}')
+                logger.debug('      🚥 ⛩️  Gate %s created with board %s and pin %s', name, gate_info["io_location"]["board"], gate_info["io_location"]["pin"])
             except ValueError as e:
                 logger.error(f"💢 Failed to build gate {name}: {e}")
 
+    def attach_board(self, board_id, board):
+        '''Builds the gates that live on a board that has just come online and drives them back to
+        the state they were last in; returns their names'''
+        self.boards[board_id] = board
+        attached = []
+        if not self.gates_dict:
+            return attached
+        for name, gate_info in self.gates_dict['gates'].items():
+            if gate_info['io_location']['board'] == board_id:
+                try:
+                    gate = Gate(name, gate_info, self.boards)
+                except ValueError as e:
+                    logger.error(f"💢 Failed to build gate {name}: {e}")
+                    continue
+                old_gate = self.gates.get(name)
+                if old_gate is not None:  # Keep the UI and metrics listeners, and the state the gate should be in
+                    gate.status_listeners = old_gate.status_listeners
+                    gate.status = gate.previous_status = old_gate.status
+                self.gates[name] = gate
+                attached.append(name)
+        moves = [Move(self.gates[name], self.gates[name].target_angle(self.gates[name].status), self.gates[name].status) for name in attached]
+        self.planner.execute(moves, on_complete=self.move_completed)
+        return attached
+
+    def reload_gates(self):
+        '''Re-reads the gates file and applies only what changed; returns the names of affected gates'''
+        gates_dict = self.load_gates()
+        if gates_dict is None:
+            return []
+        old_gates = self.gates_dict['gates'] if self.gates_dict else {}
+        new_gates = gates_dict['gates']
+        changed = []
+        for name, gate_info in new_gates.items():
+            old_info = old_gates.get(name)
+            if old_info == gate_info:
+                continue
+            changed.append(name)
+            gate = self.gates.get(name)
+            try:
+                if gate is not None and old_info is not None and old_info.get('io_location') == gate_info.get('io_location'):
+                    gate.apply_config(gate_info)
+                    logger.info(f"     🔮 Gate {name} settings reloaded")
+                    continue
+                new_gate = Gate(name, gate_info, self.boards)
+            except (KeyError, TypeError, ValueError) as e:  # A hand-edited entry missing a field, or with the wrong shape
+                logger.error(f"💢 Failed to build gate {name}: {e!r}")
+                self.gates.pop(name, None)
+                continue
+            if gate is not None:
+                new_gate.status_listeners = gate.status_listeners
+            self.gates[name] = new_gate
+            logger.info(f"     🔮 Gate {name} rebuilt")
+        for name in set(old_gates) - set(new_gates):
+            changed.append(name)
+            gate = self.gates.pop(name, None)
+            if gate is not None:
+                gate.stop_servo()
+                logger.info(f"     🔮 Gate {name} removed")
+        self.gates_dict = gates_dict
+        return changed
+
     def backup_gates(self):
-        '''Backs up the gates configuration to a timestamped file in the backup directory'''
-        timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-        backup_file = os.path.join(self.backup_dir, f'gates_backup_{timestamp}.json')
+        '''Backs up the gates configuration unless an identical snapshot is already kept'''
         try:
-            with open(backup_file, 'w') as f:
-                json.dump(self.gates_dict, f, indent=4)
-            logger.info(f"     🔮 Gates configuration backed up to {backup_file}")
+            backup_file = self.snapshots.save(serialize(self.gates_dict))
+            if backup_file:
+                logger.info(f"     🔮 Gates configuration backed up to {backup_file}")
         except Exception as e:
             logger.error(f"💢 Failed to backup gates configuration: {e}")
 
@@ -178,7 +275,7 @@ class Gate_Manager:
     def close_all_gates(self):
         '''Close all gates'''
         for gate in self.gates.values():
-            logger.debug(f'      🚥 ⛩️ Sending request to close {gate.name}')
+            logger.debug('      🚥 ⛩️ Sending request to close %s', gate.name)
             self.close_gate(gate.name)
 
     def open_gate(self, name):
@@ -186,29 +283,28 @@ class Gate_Manager:
         if name in self.gates:
             self.gates[name].open()
         else:
-            logger.debug(f"      🚥 ⛩️  Gate {name} not found.")
+            logger.debug("      🚥 ⛩️  Gate %s not found.", name)
 
     def close_gate(self, name):
         '''Close a single gate by name'''
         if name in self.gates:
-            logger.debug(f'      🚥 ⛩️  Gate manager send a request to gate {name} to close')
+            logger.debug('      🚥 ⛩️  Gate manager send a request to gate %s to close', name)
             self.gates[name].close()
         else:
-            logger.debug(f"      🚥 ⛩️  Gate {name} not found.")
+            logger.debug("      🚥 ⛩️  Gate %s not found.", name)
 
     def view_gates(self):
         '''Prints a list of all gates'''
         for gate_key, gate_info in self.gates_dict['gates'].items():
-            logger.debug(f"      🚥 ⛩️  Gate: {gate_key}, Physical Location: {gate_info['physical_location']}, Status: {gate_info['status']}, "
-                         f"IO Location Board: {gate_info['io_location']['board']}, IO Location Pin: {gate_info['io_location']['pin']}, "
-                         f"Min: {gate_info['min']}, Max: {gate_info['max']}")
+            logger.debug("      🚥 ⛩️  Gate: %s, Physical Location: %s, Status: %s, IO Location Board: %s, IO Location Pin: %s, Min: %s, Max: %s",
+                         gate_key, gate_info['physical_location'], gate_info['status'], gate_info['io_location']['board'],
+                         gate_info['io_location']['pin'], gate_info['min'], gate_info['max'])
 
     def get_gate_settings(self, tools):
         '''Get gate settings based on the tool status'''
         open_gates = []
         for current_tool in tools:
-
-            if current_tool.status != 'off':
+            if current_tool.wants_air():  # Starting, running or spinning down
                 for gate_pref in current_tool.gate_prefs:
                     if gate_pref in self.gates and gate_pref not in open_gates:
                         open_gates.append(gate_pref)
@@ -216,14 +312,34 @@ class Gate_Manager:
     
     def set_gates(self, tools):
         '''Set gates based on tool preferences'''
+        with set_gates_latency.time():
+            self._set_gates(tools)
+
+    def _set_gates(self, tools):
         open_gates = self.get_gate_settings(tools)
-        print(open_gates)
+        logger.debug("      🚥 ⛩️  Opening gates %s", open_gates)
+        moves = []
         for gate_name, gate in self.gates.items():
-            if gate_name in open_gates:
-                gate.open()
-            else:
-                gate.close()
+            if not gate.health.available:  # Board offline; it will be moved once it is re-attached
+                gate.angle = None
+                continue
+            status = 'open' if gate_name in open_gates else 'closed'
+            angle = gate.target_angle(status)
+            if gate.angle != angle:  # Skip servos that are already where they need to be
+                moves.append(Move(gate, angle, status))
+
+        # Staggered within each power rail's current budget; servos are released as they settle
+        self.planner.execute(moves, on_complete=self.move_completed)
 
-        time.sleep(0.5)
-        for gate_name, gate in self.gates.items():  # pause before shutting off al servos
-            gate.stop_servo()
+    def add_move_listener(self, callback):
+        '''Register a callable to be notified with (gate, status, elapsed) when a move completes'''
+        self.move_listeners.append(callback)
+
+    def move_completed(self, move, elapsed):
+        move.gate.update_status(move.status)
+        logger.debug("      🚥 ⛩️  Gate %s %s after %.2fs", move.gate.name, move.status, elapsed)
+        for callback in self.move_listeners:
+            try:
+                callback(move.gate, move.status, elapsed)
+            except Exception as e:
+                logger.error(f"💢 Move listener failed for gate {move.gate.name}: {e}")
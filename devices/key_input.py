@@ -0,0 +1,174 @@
+import errno
+import fcntl
+import glob
+import logging
+import os
+import select
+import struct
+import threading
+import time
+from utils.metrics import registry
+from utils.watchdog import watchdog
+
+logger = logging.getLogger(__name__)
+
+# struct input_event from <linux/input.h>: timeval, type, code, value
+INPUT_EVENT = struct.Struct('llHHi')
+EV_KEY = 0x01
+KEY_PRESS = 1  # 0 is release, 2 autorepeat
+EVIOCGRAB = 0x40044590  # _IOW('E', 0x90, int)
+
+DEFAULT_DEVICES = ()  # Opt-in; USB keypads, remotes and most foot pedals match '/dev/input/by-id/*-event-kbd'
+RESCAN_INTERVAL = 5.0  # Seconds between looks for newly plugged devices
+POLL_TIMEOUT = 0.5  # Longest epoll wait, so stop() is noticed
+DEBOUNCE_TIME = 0.25  # Presses of the same key closer together than this are contact bounce
+
+key_presses = registry.counter('hokori_key_presses_total', 'Key presses that toggled a tool', ('key',))
+
+
+def key_code(value):
+    '''A config "keyboard_key" as an evdev key code: an int, or a name like "KEY_F1" when python-evdev is installed'''
+    if value is None:
+        return None
+    if isinstance(value, int) or (isinstance(value, str) and value.isdigit()):
+        return int(value) or None  # 0 (KEY_RESERVED) means no key
+    try:
+        from evdev import ecodes
+    except ImportError:
+        logger.warning(f"🌟 ⌨️ Key name {value} needs python-evdev; use the numeric key code instead")
+        return None
+    return ecodes.ecodes.get(value)
+
+
+class Key_Input:
+    '''Toggles tools from Linux input devices (USB keypads, foot pedals, wireless remotes).
+
+    Every matching /dev/input/event* node is opened non-blocking and registered with
+    one epoll, so a single thread sleeps until any of them has events and a key press
+    reaches the tool within a millisecond or so. A press goes through
+    Tool.toggle_button(), the same path an MCP23017 button takes. Nothing is read until
+    config.json's "inputs" lists device patterns; with "grab" set, devices are grabbed so
+    key presses do not also land on the console. Unplugged devices are dropped and picked
+    up again when they come back.
+    '''
+    def __init__(self, input_config=None):
+        input_config = input_config or {}
+        self.patterns = input_config.get('devices', DEFAULT_DEVICES)
+        self.grab = input_config.get('grab', False)
+        self.tools_by_key = {}
+        self.last_press = {}  # key code -> monotonic time of the last accepted press
+        self.devices = {}  # fd -> path
+        self.unopenable = set()  # Paths already reported as failing to open, so rescans stay quiet
+        self.epoll = None
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.heartbeat = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def set_tools(self, tools):
+        '''Maps each tool's "keyboard_key" to the tool; called again whenever the tools change'''
+        tools_by_key = {}
+        for tool in tools:
+            code = key_code(getattr(tool, 'keyboard_key', 0))
+            if code is not None:
+                tools_by_key.setdefault(code, []).append(tool)
+        with self.lock:
+            self.tools_by_key = tools_by_key
+
+    def start(self):
+        self.heartbeat = watchdog.loop('keys')
+        self.epoll = select.epoll()
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join(timeout=5)
+        if self.heartbeat is not None:
+            self.heartbeat.close()
+
+    # Devices
+
+    def scan(self):
+        known = set(self.devices.values())
+        for pattern in self.patterns:
+            for path in glob.glob(pattern):
+                path = os.path.realpath(path)
+                if path not in known:
+                    self.open_device(path)
+                    known.add(path)
+
+    def open_device(self, path):
+        try:
+            fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK | os.O_CLOEXEC)
+        except OSError as e:
+            if path not in self.unopenable:
+                self.unopenable.add(path)
+                logger.error(f"💢 ⌨️ Failed to open input device {path}: {e}")
+            return
+        self.unopenable.discard(path)
+        if self.grab:
+            try:
+                fcntl.ioctl(fd, EVIOCGRAB, 1)
+            except OSError as e:
+                logger.debug("      🚥 ⌨️ Could not grab %s: %s", path, e)
+        self.devices[fd] = path
+        self.epoll.register(fd, select.EPOLLIN)
+        logger.info(f"     🔮 ⌨️ Listening for keys on {path}")
+
+    def close_device(self, fd):
+        path = self.devices.pop(fd, None)
+        try:
+            self.epoll.unregister(fd)
+        except (OSError, ValueError):
+            pass
+        os.close(fd)
+        logger.info(f"     🔮 ⌨️ Input device {path} went away")
+
+    # Events
+
+    def run(self):
+        next_scan = 0.0
+        try:
+            while not self.stop_event.is_set():
+                self.heartbeat.beat()
+                now = time.monotonic()
+                if now >= next_scan:
+                    self.scan()
+                    next_scan = now + RESCAN_INTERVAL
+                for fd, mask in self.epoll.poll(POLL_TIMEOUT):
+                    if mask & (select.EPOLLERR | select.EPOLLHUP):
+                        self.close_device(fd)
+                    else:
+                        self.read_device(fd)
+        finally:
+            for fd in list(self.devices):
+                self.close_device(fd)
+            self.epoll.close()
+
+    def read_device(self, fd):
+        try:
+            data = os.read(fd, INPUT_EVENT.size * 64)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            if e.errno == errno.ENODEV:  # Unplugged
+                self.close_device(fd)
+            else:
+                logger.error(f"💢 ⌨️ Failed to read {self.devices.get(fd)}: {e}")
+            return
+        for offset in range(0, len(data) - INPUT_EVENT.size + 1, INPUT_EVENT.size):
+            _, _, event_type, code, value = INPUT_EVENT.unpack_from(data, offset)
+            if event_type == EV_KEY and value == KEY_PRESS:
+                self.key_pressed(code)
+
+    def key_pressed(self, code):
+        now = time.monotonic()
+        with self.lock:
+            tools = self.tools_by_key.get(code, ())
+            if not tools or now - self.last_press.get(code, 0.0) < DEBOUNCE_TIME:
+                return
+            self.last_press[code] = now
+        key_presses.labels(str(code)).inc()
+        for tool in tools:
+            logger.debug("      🚥 ⌨️ Key %s toggles %s", code, tool.label)
+            tool.toggle_button()
@@ -0,0 +1,60 @@
+import math
+
+MAINS_FREQUENCY = 60  # Hz; 50 outside North America
+HARMONICS = (1, 2, 3)  # Multiples of the mains frequency summed into the energy (motors are rich in the 3rd)
+DATA_RATE = 860  # Fastest ADS1115 rate; 14 samples per 60 Hz cycle, Nyquist at 430 Hz
+BURST_SAMPLES = 86  # About 100 ms at 860 SPS: six whole 60 Hz cycles (five at 50 Hz)
+ON_RATIO = 4.0  # Burst energy over the off baseline that counts as running
+OFF_RATIO = 2.0  # ...and the lower level it has to fall under to count as stopped
+ON_BURSTS = 2  # Consecutive bursts needed to switch on
+OFF_BURSTS = 3  # Consecutive bursts needed to switch off
+
+
+def goertzel_power(samples, frequency, sample_rate):
+    '''Power of a single frequency in a block of evenly spaced samples, with the DC offset removed.
+
+    The Goertzel recurrence costs one multiply and two adds per sample, so checking a
+    handful of frequencies is far cheaper than a full DFT of the burst.
+    '''
+    mean = sum(samples) / len(samples)
+    coefficient = 2 * math.cos(2 * math.pi * frequency / sample_rate)
+    s_prev = s_prev2 = 0.0
+    for sample in samples:
+        s = sample - mean + coefficient * s_prev - s_prev2
+        s_prev2 = s_prev
+        s_prev = s
+    power = s_prev2 * s_prev2 + s_prev * s_prev - coefficient * s_prev * s_prev2
+    return power / (len(samples) * len(samples))
+
+
+def mains_energy(samples, sample_rate, mains_frequency=MAINS_FREQUENCY, harmonics=HARMONICS):
+    '''Summed power at the mains frequency and its harmonics below Nyquist'''
+    return sum(goertzel_power(samples, mains_frequency * harmonic, sample_rate)
+               for harmonic in harmonics if mains_frequency * harmonic < sample_rate / 2)
+
+
+class Mains_Detector:
+    '''On/off decision over a stream of burst energies, with hysteresis in level and time'''
+    def __init__(self, off_energy, on_ratio=ON_RATIO, off_ratio=OFF_RATIO, on_bursts=ON_BURSTS, off_bursts=OFF_BURSTS):
+        self.off_energy = max(off_energy, 1e-12)
+        self.on_ratio = on_ratio
+        self.off_ratio = off_ratio
+        self.on_bursts = on_bursts
+        self.off_bursts = off_bursts
+        self.status = 'off'
+        self.count = 0
+
+    def is_high(self, energy):
+        return energy > self.off_energy * self.on_ratio
+
+    def update(self, energy):
+        '''Feeds one burst's energy in and returns the (possibly new) status'''
+        if self.status == 'off':
+            self.count = self.count + 1 if self.is_high(energy) else 0
+            if self.count >= self.on_bursts:
+                self.status, self.count = 'on', 0
+        else:
+            self.count = self.count + 1 if energy < self.off_energy * self.off_ratio else 0
+            if self.count >= self.off_bursts:
+                self.status, self.count = 'off', 0
+        return self.status
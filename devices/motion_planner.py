@@ -0,0 +1,114 @@
+import logging
+import math
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Defaults used when config.json has no "motion" section
+SERVO_START_CURRENT = 0.8  # Amps a hobby servo pulls while accelerating from rest
+DEFAULT_RAIL_BUDGET = 2.5  # Amps each servo power rail can deliver without browning out
+INRUSH_TIME = 0.15  # Seconds a servo draws start current before dropping to running current
+RAMP_TIME = 0.0  # Seconds to ramp the PWM from the old to the new angle (0 jumps straight there)
+SETTLE_TIME = 0.5  # Seconds to hold the final PWM before cutting the signal
+TICK = 0.02  # Scheduler resolution; one 50 Hz servo frame
+
+PROFILES = {
+    'linear': lambda f: f,
+    'ease': lambda f: 0.5 - 0.5 * math.cos(math.pi * f),  # Slow start and stop, lowest peak current
+}
+
+
+class Move:
+    def __init__(self, gate, angle, status):
+        self.gate = gate
+        self.start_angle = gate.angle
+        self.angle = angle
+        self.status = status
+        self.rail = getattr(gate.board, 'power_rail', None)
+        self.started = None
+        self.ramped = False
+
+
+class Motion_Planner:
+    '''Schedules servo moves so each power rail stays within its current budget.
+
+    Moves are queued per rail. A rail only lets as many servos start at once as
+    its budget allows for their inrush current; once a servo is past its inrush
+    window the next one on that rail may start. Rails are independent, so boards
+    on separate supplies move in parallel.
+    '''
+    def __init__(self, motion_config=None):
+        motion_config = motion_config or {}
+        self.start_current = float(motion_config.get('servo_start_current', SERVO_START_CURRENT))
+        self.default_budget = float(motion_config.get('default_rail_budget', DEFAULT_RAIL_BUDGET))
+        self.rail_budgets = {rail: float(budget) for rail, budget in motion_config.get('rails', {}).items()}
+        self.inrush_time = float(motion_config.get('inrush_time', INRUSH_TIME))
+        self.ramp_time = float(motion_config.get('ramp_time', RAMP_TIME))
+        self.settle_time = float(motion_config.get('settle_time', SETTLE_TIME))
+        self.profile = PROFILES.get(motion_config.get('profile', 'ease'), PROFILES['ease'])
+
+    def slots(self, rail):
+        '''How many servos may be in their inrush window on this rail at the same time'''
+        budget = self.rail_budgets.get(rail, self.default_budget)
+        return max(1, int(budget // self.start_current))
+
+    def execute(self, moves, on_complete=None):
+        '''Runs the moves to completion, calling on_complete(move, elapsed) as each one settles'''
+        queues = {}
+        for move in moves:
+            queues.setdefault(move.rail, deque()).append(move)
+        active = []
+        began = time.monotonic()
+
+        while queues or active:
+            now = time.monotonic()
+            self.writes = []
+
+            for rail in list(queues):
+                queue = queues[rail]
+                in_inrush = sum(1 for move in active if move.rail == rail and now - move.started < self.inrush_time)
+                while queue and in_inrush < self.slots(rail):
+                    move = queue.popleft()
+                    move.started = now
+                    self.dispatch(move, self.step, move, 0.0)
+                    active.append(move)
+                    in_inrush += 1
+                if not queue:
+                    del queues[rail]
+
+            for move in list(active):
+                elapsed = now - move.started
+                if elapsed >= self.ramp_time + self.settle_time:
+                    if not move.ramped:
+                        self.dispatch(move, move.gate.move_to, move.angle)
+                    self.dispatch(move, move.gate.stop_servo)
+                    active.remove(move)
+                    if on_complete is not None:
+                        on_complete(move, now - began)
+                elif not move.ramped and self.ramp_time > 0:  # Without a ramp the first step may still be on the bus worker
+                    self.dispatch(move, self.step, move, min(1.0, elapsed / self.ramp_time))
+
+            # Writes to boards on different buses went out in parallel; wait for this tick's to land
+            for write in self.writes:
+                write.result()
+            if queues or active:
+                time.sleep(TICK)
+
+    def dispatch(self, move, function, *args):
+        '''Runs a board write on the board's bus worker when it has one, otherwise inline'''
+        worker = getattr(move.gate.board, 'bus_worker', None)
+        if worker is None:
+            function(*args)
+        else:
+            self.writes.append(worker.submit(function, *args))
+
+    def step(self, move, fraction):
+        '''Writes the PWM for the given fraction of the move along the profile'''
+        if self.ramp_time <= 0 or move.start_angle is None:
+            move.gate.move_to(move.angle)
+            move.ramped = True
+            return
+        angle = move.start_angle + (move.angle - move.start_angle) * self.profile(fraction)
+        move.gate.move_to(angle)
+        move.ramped = fraction >= 1.0
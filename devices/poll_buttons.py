@@ -1,26 +1,50 @@
+import logging
 import threading
 import time
+from utils.log_manager import Rate_Limiter
+from utils.metrics import registry
+from utils.watchdog import watchdog
+
+logger = logging.getLogger(__name__)
+
+button_presses = registry.counter('hokori_button_presses_total', 'Button presses seen by the poller', ('button',))
+button_errors = registry.counter('hokori_button_poll_errors_total', 'Failed button reads', ('button',))
+poll_cycle_latency = registry.histogram('hokori_button_poll_cycle_seconds', 'Time taken to read every button once')
 
 class Poll_Buttons:
-    def __init__(self, buttons, rgbled_styles, debounce_time=0.5):
+    def __init__(self, buttons, rgbled_styles, debounce_time=0.5, name='buttons'):
         self.buttons = buttons
+        self.name = name
         self.rgbled_styles = rgbled_styles
         self.debounce_time = debounce_time  # Debounce time is now configurable
         self.stop_event = threading.Event()  # Create the stop event
         self.thread = None  # Store the thread reference
+        self.error_limiter = Rate_Limiter(interval=10.0)  # One error line per button every 10 seconds at most
+        self.heartbeat = None
 
     def poll_buttons(self):
         while not self.stop_event.is_set():
+            self.heartbeat.beat()
+            start = time.perf_counter()
             for button in self.buttons:
+                if not button.health.available:  # Board offline; the health monitor will bring it back
+                    continue
                 try:
-                    if not button.button.value:  # Button press detected
+                    pressed = not button.button.value
+                    button.health.record_success()
+                    if pressed:  # Button press detected
+                        button_presses.labels(button.label).inc()
                         button.toggle()  # No need to pass self.rgbled_styles here
                         time.sleep(self.debounce_time)  # Debounce delay
                 except Exception as e:
-                    print(f"Error polling button {button}: {e}")
+                    button.health.record_failure(e)
+                    button_errors.labels(button.label).inc()
+                    self.error_limiter.log(logger, logging.ERROR, button.label, "💢 🖲 Error polling button %s: %s", button.label, e)
+            poll_cycle_latency.observe(time.perf_counter() - start)
             time.sleep(0.1)  # Small delay to avoid busy-waiting
 
     def start_polling(self):
+        self.heartbeat = watchdog.loop(self.name, deadline=3.0)  # A cycle is 0.1 s plus half a second per press
         self.thread = threading.Thread(target=self.poll_buttons, daemon=True)
         self.thread.start()
 
@@ -28,3 +52,4 @@ class Poll_Buttons:
         self.stop_event.set()
         if self.thread is not None:
             self.thread.join()
+            self.heartbeat.close()
@@ -1,5 +1,6 @@
 import logging
 from digitalio import Direction, Pull
+from boards.board_health import monitor
 
 logger = logging.getLogger(__name__)
 
@@ -9,6 +10,9 @@ class RGBLED_Button:
         self.state = config.get('initial_state', False)  # Allow setting initial state from config
         self.status_callback = status_callback
         self.rgbled_styles = rgbled_styles  # Store the passed styles
+        self.health = monitor.board(config['connection']['board'])
+        led_board = config.get('led', {}).get('connection', {}).get('board')
+        self.led_health = monitor.board(led_board) if led_board else None
 
         # Use button_pins if provided; otherwise, fall back to the config
         if button_pins is not None:
@@ -35,16 +39,30 @@ class RGBLED_Button:
         if self.leds:
             initial_color = self.rgbled_styles["RGBLED_on_color"] if self.state else self.rgbled_styles["RGBLED_off_color"]
             self.set_led_color(initial_color)
-            logger.debug(f"      🚥 🖲 Button {self.label} initialized at pin {pin} with LEDs at pins {led_pins} (set to {'ON' if self.state else 'OFF'})")
+            logger.debug("      🚥 🖲 Button %s initialized at pin %s with LEDs at pins %s (set to %s)", self.label, pin, led_pins, 'ON' if self.state else 'OFF')
         else:
-            logger.debug(f"      🚥 🖲 Button {self.label} initialized at pin {pin} without valid LEDs configuration.")
+            logger.debug("      🚥 🖲 Button %s initialized at pin %s without valid LEDs configuration.", self.label, pin)
 
 
     def set_led_color(self, color):
-        if self.leds:
+        if not self.leds or (self.led_health is not None and not self.led_health.available):
+            return
+        try:
             self.leds[0].duty_cycle = 0xFFFF - color["red"]
             self.leds[1].duty_cycle = 0xFFFF - color["green"]
             self.leds[2].duty_cycle = 0xFFFF - color["blue"]
+            if self.led_health is not None:
+                self.led_health.record_success()
+        except OSError as e:
+            # A dead LED board should not stop the button from toggling the tool
+            if self.led_health is not None:
+                self.led_health.record_failure(e)
+            logger.debug("💢 🖲 Failed to set LED for %s: %s", self.label, e)
+
+    def refresh_led(self):
+        """Re-apply the color for the current state, e.g. after the styles were reloaded."""
+        color = self.rgbled_styles["RGBLED_on_color"] if self.state else self.rgbled_styles["RGBLED_off_color"]
+        self.set_led_color(color)
 
     def toggle(self):
         self.state = not self.state  # Toggle the state
@@ -58,5 +76,4 @@ class RGBLED_Button:
             new_status = 'on' if self.state else 'off'
             self.status_callback(new_status)
         
-        state_str = "ON" if self.state else "OFF"
-        logger.debug(f"      🚥 🖲 Button {self.label} toggled to {state_str}")
+        logger.debug("      🚥 🖲 Button %s toggled to %s", self.label, "ON" if self.state else "OFF")
@@ -0,0 +1,428 @@
+import hashlib
+import hmac
+import logging
+import os
+import socket
+import struct
+import threading
+import time
+from .tool_state import AIR_STATES, DEFAULT_SPIN_DOWN_TIME
+from boards.board_health import monitor
+from boards.servo_calibration import MIN_PULSE, MAX_PULSE, effective_frequency, get_calibration
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = '127.0.0.1'  # Set "satellites": {"host": ...} to the address of the interface the nodes are on
+DEFAULT_PORT = 5151
+CHALLENGE_SIZE = 16  # Random bytes a node signs with the shared secret to be let in
+HEARTBEAT_INTERVAL = 5.0  # Seconds between heartbeats from a node
+NODE_TIMEOUT = 15.0  # A node that has been silent this long is treated as gone
+RECONNECT_BACKOFF = (0.5, 30.0)  # Node reconnect delay range in seconds
+
+# Message types. Every frame is a 2 byte length, a 1 byte type and a compact payload;
+# strings are a 1 byte length followed by UTF-8.
+MSG_HELLO = 1  # node -> master: node id
+MSG_TOOL_STATUS = 2  # node -> master: tool id, status
+MSG_SET_PWM = 3  # master -> node: board id, channel, 16-bit duty cycle
+MSG_HEARTBEAT = 4  # node -> master: nothing
+MSG_TOOL_EVENT = 5  # master -> node: tool id, state machine event (manual on / spindown from a GUI)
+MSG_CHALLENGE = 6  # master -> node, first on every connection: CHALLENGE_SIZE random bytes
+
+FRAME_HEADER = struct.Struct('!HB')
+PWM_VALUES = struct.Struct('!BH')
+
+
+def pack_str(text):
+    data = text.encode('utf-8')
+    return bytes([len(data)]) + data
+
+
+def unpack_str(payload, offset=0):
+    length = payload[offset]
+    start = offset + 1
+    return payload[start:start + length].decode('utf-8'), start + length
+
+
+def encode(msg_type, payload=b''):
+    return FRAME_HEADER.pack(len(payload), msg_type) + payload
+
+
+def sign_hello(secret, challenge, node_id):
+    '''What a node appends to its hello: an HMAC of the master's challenge and its id under the shared secret'''
+    return hmac.new(secret.encode('utf-8'), challenge + node_id.encode('utf-8'), hashlib.sha256).digest()
+
+
+def wired_boards(tool_config):
+    '''Ids of every board a tool config is wired to'''
+    board_ids = [section.get('connection', {}).get('board') for section in tool_config.values() if isinstance(section, dict)]
+    board_ids.append(tool_config.get('button', {}).get('led', {}).get('connection', {}).get('board'))
+    return [board_id for board_id in board_ids if board_id]
+
+
+def tool_node(tool_config, board_nodes):
+    '''The satellite a tool lives on, or None when any of its boards hang off the master'''
+    nodes = {board_nodes.get(board_id) for board_id in wired_boards(tool_config)}
+    if len(nodes) == 1:
+        return nodes.pop()
+    if len(nodes) > 1 and None not in nodes:
+        logger.error(f"💢 Tool {tool_config['label']} is wired to boards on more than one satellite: {', '.join(sorted(nodes))}")
+    return None
+
+
+def recv_exact(sock, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("connection closed")
+        data.extend(chunk)
+    return bytes(data)
+
+
+def read_frame(sock):
+    '''Blocks until a whole frame has arrived; returns (type, payload)'''
+    length, msg_type = FRAME_HEADER.unpack(recv_exact(sock, FRAME_HEADER.size))
+    return msg_type, recv_exact(sock, length) if length else b''
+
+
+class Remote_Tool:
+    '''Stands in for a Tool whose button and sensor live on a satellite node.
+
+    It looks like a Tool to the main loop, Gate_Manager and Dust_Collector; its status
+    is whatever the node last reported.
+    '''
+    def __init__(self, tool_config, node_id, server=None):
+        self.config = tool_config
+        self.node_id = node_id
+        self.server = server
+        self.label = tool_config['label']
+        self.id = tool_config['id']
+        self.status = 'off'
+        self.status_changed = False
+        self.status_listeners = []
+        self.onset_listeners = []  # Onsets are handled on the node
+        self.preferences = tool_config.get('preferences', {})
+        self.gate_prefs = self.preferences.get('gate_prefs', [])
+        self.spin_down_time = self.preferences.get('spin_down_time', DEFAULT_SPIN_DOWN_TIME)
+        self.last_used = self.preferences.get('last_used', 0)
+        self.volt = tool_config.get('volt', {})
+        self.keyboard_key = tool_config.get('keyboard_key', None)
+        self.physical_location = tool_config.get('physical_location', '')
+        self.button = None
+        self.voltage_sensor = None
+        self.gpio_pin = None
+
+    def update_status_from_node(self, new_status):
+        if new_status != self.status:
+            self.status = new_status
+            self.status_changed = True
+            if self.status == 'spindown':
+                self.last_used = time.time()
+            logger.info(f"🔵 🛰 Tool {self.label} on {self.node_id} status changed to {self.status}")
+            for callback in self.status_listeners:
+                try:
+                    callback(self, self.status)
+                except Exception as e:
+                    logger.error(f"💢 Status listener failed for tool {self.label}: {e}")
+
+    def add_status_listener(self, callback):
+        self.status_listeners.append(callback)
+
+    def add_onset_listener(self, callback):
+        self.onset_listeners.append(callback)
+
+    def node_disconnected(self):
+        '''Nothing is known about the tool while its node is away, so stop holding gates and air for it'''
+        if self.status != 'off':
+            logger.warning(f"🌟 🛰 Tool {self.label} switched off: satellite {self.node_id} is gone")
+            self.update_status_from_node('off')
+
+    def wants_air(self):
+        return self.status in AIR_STATES
+
+    def apply_config(self, tool_config):
+        if tool_config.get('button') != self.config.get('button') or tool_config.get('volt') != self.config.get('volt'):
+            return False
+        self.config = tool_config
+        self.label = tool_config['label']
+        self.preferences = tool_config.get('preferences', {})
+        self.gate_prefs = self.preferences.get('gate_prefs', [])
+        self.spin_down_time = self.preferences.get('spin_down_time', DEFAULT_SPIN_DOWN_TIME)
+        return True
+
+    def toggle_button(self):
+        # The button lives on the node; a key press on the master switches the tool by hand instead
+        if self.status in ('on', 'override', 'starting'):
+            return self.spindown()
+        return self.turn_on()
+
+    def send_event(self, event):
+        try:
+            self.server.send(self.node_id, encode(MSG_TOOL_EVENT, pack_str(self.id) + pack_str(event)))
+            return True
+        except (OSError, AttributeError) as e:
+            logger.error(f"💢 🛰 Could not send {event} to tool {self.label} on {self.node_id}: {e}")
+            return False
+
+    def turn_on(self):
+        return self.send_event('override')
+
+    def spindown(self):
+        return self.send_event('spindown')
+
+    def reset_status_changed(self):
+        self.status_changed = False
+
+    def cleanup(self):
+        pass
+
+
+class Remote_Board:
+    '''Stands in for a PCA9685 on a satellite node; PWM writes are forwarded to the node'''
+    def __init__(self, server, node_id, board_config):
+        self.server = server
+        self.node_id = node_id
+        self.board_id = board_config['id']
+        self.power_rail = board_config.get('power_rail', board_config['id'])
+        self.frequency = effective_frequency(board_config.get('frequency', 50))
+        self.prefix = pack_str(self.board_id)
+
+    def servo_calibration(self, min_pulse=MIN_PULSE, max_pulse=MAX_PULSE):
+        return get_calibration(self.frequency, min_pulse, max_pulse)
+
+    def set_pwm_value(self, channel, value):
+        """Raises ConnectionError (an OSError) while the node is away, like a failed I2C write."""
+        self.server.send(self.node_id, encode(MSG_SET_PWM, self.prefix + PWM_VALUES.pack(channel, value)))
+
+    def set_servo_angle(self, channel, angle):
+        self.set_pwm_value(channel, self.servo_calibration().duty_cycle(angle))
+
+
+class Satellite_Server:
+    '''Master side: accepts node connections, feeds their events into Remote_Tools and sends commands back'''
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, secret=''):
+        self.host = host
+        self.port = port
+        self.secret = secret
+        self.remote_tools = {}
+        self.connections = {}
+        self.send_locks = {}  # One per connection, so a stalled node only holds up its own sends
+        self.last_seen = {}
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.sock = None
+
+    def remote_tool(self, tool_config, node_id):
+        tool = Remote_Tool(tool_config, node_id, self)
+        self.remote_tools[tool.id] = tool
+        return tool
+
+    def remote_board(self, node_id, board_config):
+        return Remote_Board(self, node_id, board_config)
+
+    def is_connected(self, node_id):
+        return node_id in self.connections and time.monotonic() - self.last_seen.get(node_id, 0) < NODE_TIMEOUT
+
+    def start(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((self.host, self.port))
+        self.sock.listen()
+        self.sock.settimeout(0.5)
+        self.port = self.sock.getsockname()[1]
+        threading.Thread(target=self.accept_loop, daemon=True).start()
+        logger.info(f"     🔮 🛰 Listening for satellite nodes on {self.host}:{self.port}")
+        if not self.secret:
+            logger.warning("🌟 🛰 No satellites secret is set; any host that can reach this port can join as a node")
+
+    def accept_loop(self):
+        while not self.stop_event.is_set():
+            try:
+                conn, address = self.sock.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            threading.Thread(target=self.serve_node, args=(conn, address), daemon=True).start()
+
+    def serve_node(self, conn, address):
+        node_id = None
+        try:
+            conn.settimeout(NODE_TIMEOUT)
+            challenge = os.urandom(CHALLENGE_SIZE)
+            conn.sendall(encode(MSG_CHALLENGE, challenge))
+            msg_type, payload = read_frame(conn)
+            if msg_type != MSG_HELLO:
+                raise ConnectionError("expected hello")
+            claimed, offset = unpack_str(payload)
+            if not hmac.compare_digest(payload[offset:], sign_hello(self.secret, challenge, claimed)):
+                logger.warning(f"🌟 🛰 Refused {address[0]} claiming to be satellite {claimed}: wrong shared secret")
+                raise ConnectionError("wrong shared secret")
+            node_id = claimed
+            with self.lock:
+                old = self.connections.get(node_id)
+                self.connections[node_id] = conn
+                self.send_locks[conn] = threading.Lock()
+            if old is not None:
+                old.close()
+            self.last_seen[node_id] = time.monotonic()
+            logger.info(f"     🔮 🛰 Satellite {node_id} connected from {address[0]}")
+            while not self.stop_event.is_set():
+                msg_type, payload = read_frame(conn)
+                self.last_seen[node_id] = time.monotonic()
+                if msg_type == MSG_TOOL_STATUS:
+                    tool_id, offset = unpack_str(payload)
+                    status, _ = unpack_str(payload, offset)
+                    tool = self.remote_tools.get(tool_id)
+                    if tool is not None:
+                        tool.update_status_from_node(status)
+        except (OSError, ConnectionError, struct.error, IndexError) as e:
+            if node_id is not None:
+                logger.warning(f"🌟 🛰 Satellite {node_id} disconnected: {e}")
+        finally:
+            with self.lock:
+                current = node_id is not None and self.connections.get(node_id) is conn
+                if current:
+                    del self.connections[node_id]
+                self.send_locks.pop(conn, None)
+            conn.close()
+            if current:  # Not when a reconnect has already replaced this connection
+                for tool in list(self.remote_tools.values()):
+                    if tool.node_id == node_id:
+                        tool.node_disconnected()
+
+    def send(self, node_id, frame):
+        '''Blocks for at most NODE_TIMEOUT (the connection's socket timeout) on a stalled node'''
+        with self.lock:
+            conn = self.connections.get(node_id)
+            send_lock = self.send_locks.get(conn)
+        if conn is None or send_lock is None:
+            raise ConnectionError(f"satellite {node_id} is not connected")
+        with send_lock:
+            conn.sendall(frame)
+
+    def stop(self):
+        self.stop_event.set()
+        if self.sock is not None:
+            self.sock.close()
+        with self.lock:
+            for conn in self.connections.values():
+                conn.close()
+            self.connections.clear()
+            self.send_locks.clear()
+
+
+class Satellite_Node:
+    '''Node side: reports local tool status changes to the master and applies its PWM commands.
+
+    `tools` are ordinary Tool objects (or anything with id, status and add_status_listener)
+    and `boards` maps board ids to objects with set_pwm_value, so simulated devices work
+    just as well as real ones for a loopback test.
+    '''
+    def __init__(self, node_id, master_host, master_port=DEFAULT_PORT, tools=(), boards=None, secret=''):
+        self.node_id = node_id
+        self.master = (master_host, master_port)
+        self.secret = secret
+        self.tools = list(tools)
+        self.boards = boards or {}
+        self.sock = None
+        self.send_lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.heartbeat_thread = threading.Thread(target=self.send_heartbeats, daemon=True)
+        for tool in self.tools:
+            tool.add_status_listener(self.tool_changed)
+
+    def start(self):
+        self.thread.start()
+        self.heartbeat_thread.start()
+
+    def send_heartbeats(self):
+        '''On a timer of its own, so steady PWM traffic from the master never starves the heartbeat'''
+        while not self.stop_event.wait(HEARTBEAT_INTERVAL):
+            self.send(encode(MSG_HEARTBEAT))
+
+    def tool_changed(self, tool, status):
+        self.send(encode(MSG_TOOL_STATUS, pack_str(tool.id) + pack_str(status)))
+
+    def send(self, frame):
+        with self.send_lock:
+            if self.sock is None:
+                return  # Status is resent in full on reconnect
+            try:
+                self.sock.sendall(frame)
+            except OSError as e:
+                logger.warning(f"🌟 🛰 Lost master connection: {e}")
+
+    def run(self):
+        delay = RECONNECT_BACKOFF[0]
+        while not self.stop_event.is_set():
+            try:
+                sock = socket.create_connection(self.master, timeout=5)
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                sock.settimeout(HEARTBEAT_INTERVAL)
+                msg_type, challenge = read_frame(sock)
+                if msg_type != MSG_CHALLENGE:
+                    raise ConnectionError("expected a challenge")
+                with self.send_lock:
+                    self.sock = sock
+                    sock.sendall(encode(MSG_HELLO, pack_str(self.node_id) + sign_hello(self.secret, challenge, self.node_id)))
+                logger.info(f"     🔮 🛰 Connected to master at {self.master[0]}:{self.master[1]}")
+                delay = RECONNECT_BACKOFF[0]
+                for tool in self.tools:  # Resync after every (re)connect
+                    self.tool_changed(tool, tool.status)
+                self.receive(sock)
+            except (OSError, ConnectionError, struct.error, IndexError) as e:
+                if self.stop_event.is_set():
+                    break
+                logger.warning(f"🌟 🛰 Master connection failed: {e}; retrying in {delay:.1f}s")
+            finally:
+                with self.send_lock:
+                    if self.sock is not None:
+                        self.sock.close()
+                    self.sock = None
+            self.stop_event.wait(delay)
+            delay = min(delay * 2, RECONNECT_BACKOFF[1])
+
+    def receive(self, sock):
+        while not self.stop_event.is_set():
+            try:
+                msg_type, payload = read_frame(sock)
+            except socket.timeout:
+                continue  # The master has been quiet; only here so stop() is noticed
+            if msg_type == MSG_SET_PWM:
+                board_id, offset = unpack_str(payload)
+                channel, value = PWM_VALUES.unpack_from(payload, offset)
+                board = self.boards.get(board_id)
+                if board is None:
+                    logger.error(f"💢 🛰 Master sent PWM for unknown board {board_id}")
+                else:
+                    self.set_pwm_value(board_id, board, channel, value)
+            elif msg_type == MSG_TOOL_EVENT:
+                tool_id, offset = unpack_str(payload)
+                event, _ = unpack_str(payload, offset)
+                for tool in self.tools:
+                    if tool.id == tool_id and hasattr(tool, 'fire'):
+                        tool.fire(event)
+
+    def set_pwm_value(self, board_id, board, channel, value):
+        '''A failed write is the board's fault, not the link's: it goes to the board's
+        circuit breaker and the connection to the master stays up'''
+        health = monitor.board(board_id)
+        if not health.available:
+            return
+        try:
+            board.set_pwm_value(channel, value)
+            health.record_success()
+        except OSError as e:
+            logger.error(f"💢 🛰 PWM write to board {board_id} channel {channel} failed: {e}")
+            health.record_failure(e)
+
+    def stop(self):
+        self.stop_event.set()
+        with self.send_lock:
+            if self.sock is not None:
+                self.sock.close()
+        self.thread.join(timeout=5)
+        self.heartbeat_thread.join(timeout=5)
@@ -2,19 +2,37 @@ import logging
 import threading
 import time
 import RPi.GPIO as GPIO
-from .rgbled_button import RGBLED_Button
-from .voltage_sensor import Voltage_Sensor
+from .tool_state import STATES, AIR_STATES, TRANSITIONS, TIMEOUT_EVENTS, DEFAULT_SPIN_DOWN_TIME
+from utils.metrics import registry
 
 logger = logging.getLogger(__name__)
 
+PREDICTION_TIMEOUT = 3.0  # Seconds an early start holds the gates open before the sensor has to confirm it
+
+tool_predictions = registry.counter('hokori_tool_predictions_total', 'Gates pre-staged from an early start signal', ('tool',))
+tool_mispredictions = registry.counter('hokori_tool_mispredictions_total', 'Pre-staged starts rolled back because the tool never came on', ('tool',))
+
+# Config sections that describe wiring; changing these means the tool has to be rebuilt
+HARDWARE_SECTIONS = ('button', 'relay')
+
 class Tool:
     def __init__(self, tool_config, mcp, pca, ads, gpio, styles, i2c, boards):
+        self.config = tool_config
         self.label = tool_config['label']
         self.id = tool_config['id']
-        self.status = tool_config.get('status', 'off')
+        self.status = tool_config.get('status', 'off') if tool_config.get('status') in STATES else 'off'
+        self.status_since = time.monotonic()  # When the current state was entered
         self.status_changed = False
+        self.status_listeners = []  # Callables notified with (tool, status) on every real status change
+        self.onset_listeners = []  # Callables notified with (tool) when an early start signal is seen
+        self.state_lock = threading.RLock()
+        self.state_timer = None  # Ends 'starting' and 'spindown' when their time is up
+        self.predictions = tool_predictions.labels(self.id)
+        self.mispredictions = tool_mispredictions.labels(self.id)
         self.preferences = tool_config.get('preferences', {})
         self.gate_prefs = self.preferences.get('gate_prefs', [])
+        self.spin_down_time = self.preferences.get('spin_down_time', DEFAULT_SPIN_DOWN_TIME)
+        self.last_used = self.preferences.get('last_used', 0)  # Wall-clock time the tool was last put down
         self.volt = tool_config.get('volt', {})
         self.keyboard_key = tool_config.get('keyboard_key', None)
         self.physical_location = tool_config.get('physical_location', '')
@@ -26,6 +44,7 @@ class Tool:
                 #logger.debug(f"🌑 Initializing button for tool {self.label} with config: {tool_config['button']}")
                 button_pins = tool_config['button']['connection']['pins']
                 led_pins = tool_config['button']['led']['connection']['pins'] if 'led' in tool_config['button'] else []
+                from .rgbled_button import RGBLED_Button  # Drivers load only for tools that have the hardware
                 self.button = RGBLED_Button(tool_config['button'], mcp, pca, styles['RGBLED_button_styles'], self.update_status_from_button)
             else:
                 self.button = None
@@ -39,7 +58,8 @@ class Tool:
         try:
             if ads and 'volt' in tool_config:
                 #logger.debug(f"🌑 Initializing voltage sensor for tool {self.label} with config: {tool_config['volt']}")
-                self.voltage_sensor = Voltage_Sensor(tool_config['volt'], ads, self.update_status_from_voltage)
+                from .voltage_sensor import Voltage_Sensor
+                self.voltage_sensor = Voltage_Sensor(tool_config['volt'], ads, self.update_status_from_voltage, self.predict)
             else:
                 self.voltage_sensor = None
                 #logger.warning(f"🌟 No voltage sensor configuration found for tool {self.label}")
@@ -69,6 +89,30 @@ class Tool:
 
         
 
+    def apply_config(self, tool_config):
+        """Apply an edited config in place. Returns False if the wiring changed and the tool must be rebuilt."""
+        if any(tool_config.get(section) != self.config.get(section) for section in HARDWARE_SECTIONS):
+            return False
+        new_volt = dict(tool_config.get('volt', {}))
+        old_volt = dict(self.volt)
+        new_deviation = new_volt.pop('deviation', None)
+        old_deviation = old_volt.pop('deviation', None)
+        if new_volt != old_volt:
+            return False
+
+        self.config = tool_config
+        self.label = tool_config['label']
+        self.preferences = tool_config.get('preferences', {})
+        self.gate_prefs = self.preferences.get('gate_prefs', [])
+        self.spin_down_time = self.preferences.get('spin_down_time', DEFAULT_SPIN_DOWN_TIME)
+        self.volt = tool_config.get('volt', {})
+        self.keyboard_key = tool_config.get('keyboard_key', None)
+        self.physical_location = tool_config.get('physical_location', '')
+        if self.voltage_sensor is not None and new_deviation != old_deviation and new_deviation is not None:
+            self.voltage_sensor.set_deviation(float(new_deviation))
+        logger.info(f"🔵 Tool {self.label} settings reloaded")
+        return True
+
     def run_relay(self):
         """Threaded function to manage the dust collector based on tool status."""
         while True:
@@ -77,61 +121,134 @@ class Tool:
 
     def manage_collector(self):
         """Manage the dust collector relay based on the tool's status."""
-        if self.status == 'on':
-            self.turn_on()
+        if self.wants_air():
+            self.relay_on()
         else:
-            self.turn_off()
+            self.relay_off()
 
-    def turn_on(self):
+    def relay_on(self):
         if self.relay_status != 'on':
             self.relay_status = 'on'
-            #logger.info(f"🔵 Tool {self.label} turned on.")
             if self.gpio_pin is not None:
                 GPIO.output(self.gpio_pin, GPIO.HIGH)
 
-    def turn_off(self):
+    def relay_off(self):
         if self.relay_status != 'off':
             self.relay_status = 'off'
-            #logger.info(f"🔵 Tool {self.label} turned off.")
             if self.gpio_pin is not None:
                 GPIO.output(self.gpio_pin, GPIO.LOW)
 
     def toggle_button(self):
-        """Toggle the button state."""
+        """Toggle the button state. Tools without a button keep a virtual one, so keypads can still switch them."""
         if self.button:
             self.button.toggle()
+        else:
+            self.update_status_from_button('off' if self.button_status == 'on' else 'on')
 
     def update_status_from_button(self, new_status):
         self.button_status = new_status
         self.update_status()
-        
 
     def update_status_from_voltage(self, new_status):
+        if new_status == 'fault':
+            self.fire('fault')
+            return
         self.voltage_status = new_status
+        if self.status == 'fault':
+            self.fire('clear')
         self.update_status()
 
     def update_status(self):
-        """Combine button and voltage sensor statuses to determine tool status."""
-        new_status = 'on' if self.button_status == 'on' or self.voltage_status == 'on' else 'off'
-        if new_status != self.status:
+        """Feed the combined button and voltage sensor inputs into the state machine."""
+        self.fire('inputs_on' if self.button_status == 'on' or self.voltage_status == 'on' else 'inputs_off')
+
+    # State machine
+
+    def fire(self, event):
+        """Apply an event through the transition table. Returns True if the state changed."""
+        with self.state_lock:
+            new_status = TRANSITIONS.get((self.status, event))
+            if new_status is None or new_status == self.status:
+                return False
+            old_status = self.status
             self.status = new_status
+            self.status_since = time.monotonic()
             self.status_changed = True
-            if self.status == 'on':
-                icon = "💫"
-            else:
-                icon = "💤"        
-            logger.info(f"🔵 {icon} Tool {self.label} status changed to {self.status} {icon}")
-        else:
-            self.status_changed = False
+            if self.state_timer is not None:
+                self.state_timer.cancel()
+                self.state_timer = None
+            if new_status == 'spindown':
+                self.last_used = time.time()
+            if event == 'onset_lapsed':
+                self.mispredictions.inc()
+            icon = "💫" if new_status in AIR_STATES else "💤"
+            logger.info(f"🔵 {icon} Tool {self.label} {old_status} -> {self.status} ({event}) {icon}")
+            self.notify_status_listeners()
+
+            delay = {'starting': PREDICTION_TIMEOUT, 'spindown': self.spin_down_time}.get(new_status)
+            if delay is not None:
+                if delay <= 0:
+                    self.fire(TIMEOUT_EVENTS[new_status])
+                else:
+                    self.state_timer = threading.Timer(delay, self.state_timed_out, args=(self.status_since,))
+                    self.state_timer.daemon = True
+                    self.state_timer.start()
+            return True
+
+    def state_timed_out(self, since):
+        with self.state_lock:
+            if self.status_since == since:  # Still in the state the timer was started for
+                self.fire(TIMEOUT_EVENTS[self.status])
+
+    def predict(self):
+        """Early evidence that the tool is starting; gates and collector get a head start until it lapses."""
+        if self.fire('onset'):
+            self.predictions.inc()
+            for callback in self.onset_listeners:
+                try:
+                    callback(self)
+                except Exception as e:
+                    logger.error(f"💢 Onset listener failed for tool {self.label}: {e}")
+
+    def turn_on(self):
+        """Switch the tool on by hand; it stays on regardless of its inputs until spindown() is called."""
+        return self.fire('override')
+
+    def spindown(self):
+        """Put the tool down by hand; air keeps flowing for spin_down_time."""
+        return self.fire('spindown')
+
+    def fault(self):
+        return self.fire('fault')
+
+    def wants_air(self):
+        """True while the gates should be open and the collector running for this tool."""
+        return self.status in AIR_STATES
+
+    def add_status_listener(self, callback):
+        """Register a callable to be notified with (tool, status) when the status changes."""
+        self.status_listeners.append(callback)
+
+    def add_onset_listener(self, callback):
+        """Register a callable to be notified with (tool) when the tool looks like it is starting."""
+        self.onset_listeners.append(callback)
 
+    def notify_status_listeners(self):
+        for callback in self.status_listeners:
+            try:
+                callback(self, self.status)
+            except Exception as e:
+                logger.error(f"💢 Status listener failed for tool {self.label}: {e}")
 
     def reset_status_changed(self):
         self.status_changed = False
 
     def cleanup(self):
         """Cleanup GPIO resources."""
+        if self.state_timer is not None:
+            self.state_timer.cancel()
         if self.relay_status == 'on':
-            self.turn_off()
+            self.relay_off()
         if self.gpio_pin is not None:
             GPIO.cleanup(self.gpio_pin)
-        logger.debug(f"🌑 Cleaned up GPIO for tool {self.label}")
+        logger.debug("🌑 Cleaned up GPIO for tool %s", self.label)
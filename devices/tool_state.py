@@ -0,0 +1,38 @@
+'''Tool states and the transition table that drives them.
+
+Kept free of hardware imports so remote tools and the GUIs can share it.
+
+    off       idle
+    starting  early evidence (a current onset); gates are staged, lapses back to off
+    on        button or voltage sensor says the tool is running
+    spindown  inputs went quiet; air keeps flowing for the tool's spin_down_time
+    override  switched on by hand from a GUI; ignores the inputs until spun down
+    fault     the tool's sensor board is offline; cleared when it answers again
+'''
+
+STATES = ('off', 'starting', 'on', 'spindown', 'override', 'fault')
+AIR_STATES = frozenset(('starting', 'on', 'spindown', 'override'))  # Gates open and collector running
+RUNNING_STATES = frozenset(('on', 'override'))  # The tool itself is in use
+
+# (state, event) -> next state; anything not listed is ignored
+TRANSITIONS = {
+    ('off', 'onset'): 'starting',
+    ('off', 'inputs_on'): 'on',
+    ('starting', 'inputs_on'): 'on',
+    ('starting', 'onset_lapsed'): 'off',
+    ('starting', 'spindown'): 'off',
+    ('on', 'inputs_off'): 'spindown',
+    ('on', 'spindown'): 'spindown',
+    ('spindown', 'inputs_on'): 'on',
+    ('spindown', 'spun_down'): 'off',
+    ('override', 'spindown'): 'spindown',
+    ('fault', 'clear'): 'off',
+}
+for state in ('off', 'starting', 'on', 'spindown'):
+    TRANSITIONS[(state, 'override')] = 'override'
+for state in ('off', 'starting', 'on', 'spindown', 'override'):
+    TRANSITIONS[(state, 'fault')] = 'fault'
+
+# States that end on their own, and the event fired when their time is up
+TIMEOUT_EVENTS = {'starting': 'onset_lapsed', 'spindown': 'spun_down'}
+DEFAULT_SPIN_DOWN_TIME = 30  # Seconds of air after a tool stops when its preferences set no spin_down_time
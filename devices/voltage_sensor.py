@@ -1,28 +1,85 @@
 import time
 import threading
 import logging
-import board
-import busio
 import adafruit_ads1x15.ads1115 as ADS
+from adafruit_ads1x15.ads1x15 import Mode, Comp_Mode, Comp_Polarity, Comp_Latch
 from adafruit_ads1x15.analog_in import AnalogIn
 import statistics
+from .mains_detector import Mains_Detector, mains_energy, MAINS_FREQUENCY, DATA_RATE, BURST_SAMPLES, ON_RATIO
+from utils.log_manager import Rate_Limiter
+from utils.metrics import registry
+from boards.board_health import monitor
+from utils.watchdog import watchdog
 
 # Constants
 NUMBER_OF_OFF_READINGS = 50
 NUMBER_OF_READINGS = 30
 ACTIVATION_TRIGGER_PERCENT = 50
 THRESHOLD_DEVIATION = 1.03
+ONSET_WINDOW = 3  # Consecutive readings that must move steadily away from the off average
+ONSET_FRACTION = 0.5  # ...and end at least this far towards the trigger threshold
+OFF_BURSTS = 5  # Bursts sampled for the off baseline in mains mode
+BURST_INTERVAL = 0.15  # Pause between bursts in mains mode; the bus is free for other boards meanwhile
 ADS_PIN_NUMBERS = {0: ADS.P0, 1: ADS.P1, 2: ADS.P2, 3: ADS.P3}
 
+COMPARATOR_QUEUE = 2  # Out-of-window conversions in a row before the ADS1115 asserts ALERT
+ALERT_WAIT_MS = 1000  # Longest single wait for the ALERT edge, so stop() is noticed
+FULL_SCALE = {2 / 3: 6.144, 1: 4.096, 2: 2.048, 4: 1.024, 8: 0.512, 16: 0.256}  # Volts at each ADS1115 gain
+
+# One burst at a time per ADS1115, so sensors sharing a chip do not keep switching its multiplexer mid-burst
+ads_locks = {}
+ads_in_use = set()  # id(ads) of every chip a sensor has claimed
+# The comparator watches a single input, so a chip in comparator mode belongs to one sensor: id(ads) -> label
+comparator_owners = {}
+
 logger = logging.getLogger(__name__)
+read_error_limiter = Rate_Limiter(interval=10.0)
+read_latency = registry.histogram('hokori_sensor_read_seconds', 'Time taken by a single ADS1115 voltage read', ('sensor',))
+i2c_errors = registry.counter('hokori_i2c_errors_total', 'Failed I2C transactions', ('board',))
+sensor_triggers = registry.counter('hokori_sensor_triggers_total', 'Times a voltage sensor switched a tool on', ('sensor',))
+sensor_onsets = registry.counter('hokori_sensor_onsets_total', 'Rising edges seen before a voltage sensor triggered', ('sensor',))
+sensor_alerts = registry.counter('hokori_sensor_alerts_total', 'ADS1115 comparator ALERTs that woke a voltage sensor', ('sensor',))
+
+def read_burst(ads, chan, count=BURST_SAMPLES):
+    '''Reads `count` evenly paced raw samples from one ADS1115 input at DATA_RATE; returns (samples, sample rate).
+
+    Holds the chip's ads_locks lock throughout and puts the chip back in its previous mode
+    and data rate afterwards, even when the burst fails. I2C errors are left to the caller.
+    '''
+    with ads_locks.setdefault(id(ads), threading.Lock()):
+        mode, data_rate = ads.mode, ads.data_rate
+        try:
+            ads.mode = Mode.CONTINUOUS  # No per-sample conversion wait; each read is one register fetch
+            ads.data_rate = DATA_RATE
+            # Those setters leave the chip's pointer on CONFIG; forget the last pin so the first
+            # read selects the input and points back at CONVERSION before the fast reads start
+            ads._last_pin_read = None
+            samples = []
+            interval = 1.0 / DATA_RATE
+            start = next_sample = time.perf_counter()
+            for _ in range(count):
+                samples.append(chan.value)
+                next_sample += interval
+                delay = next_sample - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            return samples, count / (time.perf_counter() - start)
+        finally:
+            ads.mode = mode  # Single-shot readers of this chip expect it back as it was
+            ads.data_rate = data_rate
 
 class Voltage_Sensor:
-    def __init__(self, volt_config, ads, status_callback):
+    def __init__(self, volt_config, ads, status_callback, onset_callback=None):
         self.label = volt_config.get('label', 'unknown')
         self.board_name = volt_config['connection']['board']
         self.ads = ads
         self.pin_number = int(ADS_PIN_NUMBERS[volt_config['connection']['pins'][0]])
         self.threshold_deviation = float(volt_config.get('deviation', THRESHOLD_DEVIATION))
+        self.mode = volt_config.get('mode', 'threshold')  # 'mains' detects mains-frequency energy in fast bursts
+        self.alert_pin = volt_config.get('alert_pin')  # BCM pin wired to ALERT/RDY, for 'comparator' mode
+        self.mains_frequency = float(volt_config.get('mains_frequency', MAINS_FREQUENCY))
+        self.on_ratio = float(volt_config.get('on_ratio', ON_RATIO))
+        self.detector = None
         self.number_of_off_readings = NUMBER_OF_OFF_READINGS
         self.activation_trigger_number = ACTIVATION_TRIGGER_PERCENT * NUMBER_OF_READINGS / 100
         self.min_threshold = None
@@ -33,65 +90,255 @@ class Voltage_Sensor:
         self.lock = threading.Lock()
         self._stop_thread = threading.Event()  # Using Event to stop thread
         self.status_callback = status_callback
+        self.onset_callback = onset_callback  # Called once per rising edge, before the full trigger window agrees
+        self.onset_armed = True
         self.status = "off"
+        self.read_latency = read_latency.labels(self.label)
+        self.i2c_errors = i2c_errors.labels(self.board_name)
+        self.triggers = sensor_triggers.labels(self.label)
+        self.onsets = sensor_onsets.labels(self.label)
+        self.alerts = sensor_alerts.labels(self.label)
+        self.health = monitor.board(self.board_name)
+        self.heartbeat = None
 
         try:
+            owner = comparator_owners.get(id(self.ads))
+            if owner is not None:
+                raise ValueError(f"{self.board_name} is in comparator mode for {owner} and cannot be shared")
             self.chan = AnalogIn(self.ads, self.pin_number)
+            shared = id(self.ads) in ads_in_use
+            ads_in_use.add(id(self.ads))
             self.board_exists = True
-            logger.debug(f"      🚥 ⚡︎ Adding Voltage Sensor - {self.label} on {self.board_name} on pin {self.pin_number}")
-            self.gather_off_readings()
-            self.set_trigger_thresholds()
-            self.thread = threading.Thread(target=self.monitor_appliance)
+            logger.debug("      🚥 ⚡︎ Adding Voltage Sensor - %s on %s on pin %s", self.label, self.board_name, self.pin_number)
+            if self.mode == 'mains':
+                self.gather_off_energy()
+                self.thread = threading.Thread(target=self.monitor_mains)
+            elif self.mode == 'comparator' and self.alert_pin is not None and not shared:
+                self.gather_off_readings()
+                self.set_trigger_thresholds()
+                self.setup_comparator()
+                self.thread = threading.Thread(target=self.monitor_comparator)
+            else:
+                if self.mode == 'comparator':
+                    logger.warning(f"🌟 ⚡︎ {self.label} needs an alert_pin and an ADS1115 of its own for comparator mode; polling instead")
+                    self.mode = 'threshold'
+                self.gather_off_readings()
+                self.set_trigger_thresholds()
+                self.thread = threading.Thread(target=self.monitor_appliance)
+            self.heartbeat = watchdog.loop(f"sensor {self.label}")
             self.thread.start()
         except Exception as e:
             logger.error(f"💢 ⚡︎ Failed to initialize Voltage Sensor for {self.label}: {e}")
             self.board_exists = False
 
     def get_reading(self):
-        if self.board_exists:
-            try:
-                return self.chan.voltage
-            except Exception as e:
-                logger.error(f"💢 ⚡️ Error reading voltage: {self.label} on {self.board_name} at {self.pin_number} {e}")
-                return None
+        if self.board_exists and self.health.available:  # Skip the bus entirely while the board is offline
+            with ads_locks.setdefault(id(self.ads), threading.Lock()):  # Not in the middle of another sensor's burst
+                start = time.perf_counter()
+                try:
+                    reading = self.chan.voltage
+                    self.read_latency.observe(time.perf_counter() - start)
+                    self.health.record_success()
+                    return reading
+                except Exception as e:
+                    self.i2c_errors.inc()
+                    self.health.record_failure(e)
+                    read_error_limiter.log(logger, logging.ERROR, self.label, "💢 ⚡️ Error reading voltage: %s on %s at %s %s",
+                                           self.label, self.board_name, self.pin_number, e)
+                    return None
         return None
 
+    def setup_comparator(self):
+        """Leave the ADS1115 converting this input continuously with its window comparator driving ALERT."""
+        import RPi.GPIO as GPIO
+        comparator_owners[id(self.ads)] = self.label
+        self.ads.mode = Mode.CONTINUOUS
+        self.ads.data_rate = DATA_RATE
+        self.ads.comparator_mode = Comp_Mode.WINDOW
+        self.ads.comparator_polarity = Comp_Polarity.ACTIVE_LOW
+        self.ads.comparator_latch = Comp_Latch.LATCHING  # Held until the conversion register is read
+        self.program_thresholds()
+        self.ads.comparator_queue_length = COMPARATOR_QUEUE
+        self.chan.value  # Selects this input; conversions (and comparisons) run on their own from here
+        GPIO.setmode(GPIO.BCM)
+        GPIO.setup(self.alert_pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)  # ALERT is open drain
+        logger.debug("      🚥 ⚡︎ %s waiting on ALERT at GPIO %s", self.label, self.alert_pin)
+
+    def program_thresholds(self):
+        """Copy the calibrated trigger window into the comparator's threshold registers."""
+        volts_per_count = FULL_SCALE[self.ads.gain] / 32767
+        self.ads.comparator_low_threshold = int(self.min_threshold / volts_per_count)
+        self.ads.comparator_high_threshold = int(self.max_threshold / volts_per_count)
+
+    def get_burst(self, count=BURST_SAMPLES):
+        """Read a burst of evenly paced raw samples at the ADS1115's top rate; returns (samples, sample rate)."""
+        if not (self.board_exists and self.health.available):
+            return None, None
+        try:
+            samples, rate = read_burst(self.ads, self.chan, count)
+            self.read_latency.observe(count / rate)
+            self.health.record_success()
+            return samples, rate
+        except Exception as e:
+            self.i2c_errors.inc()
+            self.health.record_failure(e)
+            read_error_limiter.log(logger, logging.ERROR, self.label, "💢 ⚡️ Error reading burst: %s on %s at %s %s",
+                                   self.label, self.board_name, self.pin_number, e)
+            return None, None
+
+    def gather_off_energy(self):
+        energies = []
+        for _ in range(OFF_BURSTS):
+            samples, rate = self.get_burst()
+            if samples is not None:
+                energies.append(mains_energy(samples, rate, self.mains_frequency))
+        if not energies:
+            raise ValueError(f"no bursts could be read from {self.board_name} for the off baseline")
+        self.off_energy = statistics.median(energies)
+        self.detector = Mains_Detector(self.off_energy, on_ratio=self.on_ratio, off_ratio=max(1.0, self.on_ratio / 2))
+        logger.debug("      🚥 ⚡︎ Off mains energy for %s: %.3f at %g Hz", self.label, self.off_energy, self.mains_frequency)
+
     def gather_off_readings(self):
         off_readings = []
         for _ in range(self.number_of_off_readings):
             reading = self.get_reading()
             if reading is not None:
                 off_readings.append(reading)
+        if not off_readings:
+            raise ValueError(f"no readings could be taken from {self.board_name} for the off baseline")
         self.off_average = statistics.mean(off_readings)
-        logger.debug(f"      🚥 ⚡︎ Off readings for {self.label}: Mean of sampled cycles: {self.off_average}")
+        logger.debug("      🚥 ⚡︎ Off readings for %s: Mean of sampled cycles: %s", self.label, self.off_average)
 
     def set_trigger_thresholds(self):
         self.min_threshold = self.off_average / self.threshold_deviation
         self.max_threshold = self.off_average * self.threshold_deviation
-        logger.debug(f"      🚥 ⚡︎ Thresholds set: Min: {self.min_threshold}, Max: {self.max_threshold}")
+        logger.debug("      🚥 ⚡︎ Thresholds set: Min: %s, Max: %s", self.min_threshold, self.max_threshold)
+
+    def set_deviation(self, deviation):
+        """Change the trigger sensitivity without re-sampling the off baseline."""
+        self.threshold_deviation = deviation
+        if self.min_threshold is not None:
+            self.set_trigger_thresholds()
+            if self.mode == 'comparator':
+                self.program_thresholds()
+
+    def check_onset(self, current_readings):
+        """Fire the onset callback on a steady rise away from the off average, well before a full trigger."""
+        band = self.max_threshold - self.off_average
+        deviation = abs(current_readings[-1] - self.off_average)
+        if not self.onset_armed:
+            if self.status == "off" and deviation < band * ONSET_FRACTION / 2:
+                self.onset_armed = True  # Back at rest; ready for the next start
+            return
+        recent = [abs(reading - self.off_average) for reading in current_readings[-ONSET_WINDOW:]]
+        if len(recent) == ONSET_WINDOW and all(a < b for a, b in zip(recent, recent[1:])) and deviation > band * ONSET_FRACTION:
+            self.onset_armed = False
+            self.onsets.inc()
+            logger.debug("      🚥 ⚡︎ %s onset at %s", self.label, current_readings[-1])
+            self.onset_callback()
 
     def monitor_appliance(self):
         current_readings = []
         while not self._stop_thread.is_set():
-            reading = self.get_reading()
-            triggers = 0
-            if reading is not None:
-                current_readings.append(reading)
-            if len(current_readings) > self.number_of_off_readings:
-                current_readings.pop(0)
-            for reading in current_readings:
-                if min(current_readings) < self.min_threshold or max(current_readings) > self.max_threshold:
-                    triggers += 1
-            if triggers >= self.activation_trigger_number:
-                if self.status != "on":
-                    self.status = "on"
-                    self.status_callback("on")
-                    logger.debug(f"      🚥 ⚡︎ {self.label} is ON {min(current_readings)} - max: {max(current_readings)}")
-            else:
-                if self.status != "off":
-                    self.status = "off"
-                    self.status_callback("off")
-                    logger.debug(f"      🚥 ⚡︎ {self.label} is OFF {min(current_readings)} - max: {max(current_readings)}")
+            self.threshold_step(current_readings)
+            time.sleep(0.1)
+
+    def threshold_step(self, current_readings):
+        """Take one reading into the window and update the on/off decision."""
+        self.heartbeat.beat()
+        reading = self.get_reading()
+        triggers = 0
+        if reading is None and not self.health.available:
+            if self.status != "fault":
+                self.status = "fault"  # Cleared by the next on/off decision once the board answers again
+                self.status_callback("fault")
+            return
+        if reading is not None:
+            current_readings.append(reading)
+            if self.onset_callback is not None and self.status == "off":
+                self.check_onset(current_readings)
+        if len(current_readings) > self.number_of_off_readings:
+            current_readings.pop(0)
+        for reading in current_readings:
+            if min(current_readings) < self.min_threshold or max(current_readings) > self.max_threshold:
+                triggers += 1
+        if triggers >= self.activation_trigger_number:
+            if self.status != "on":
+                self.status = "on"
+                self.onset_armed = False
+                self.triggers.inc()
+                self.status_callback("on")
+                logger.debug("      🚥 ⚡︎ %s is ON %s - max: %s", self.label, min(current_readings), max(current_readings))
+        else:
+            if self.status != "off":
+                self.status = "off"
+                self.status_callback("off")
+                logger.debug("      🚥 ⚡︎ %s is OFF %s - max: %s", self.label, min(current_readings) if current_readings else None,
+                             max(current_readings) if current_readings else None)
+
+    def monitor_mains(self):
+        """Decide on/off from the mains-frequency energy of each burst."""
+        while not self._stop_thread.is_set():
+            self.heartbeat.beat()
+            samples, rate = self.get_burst()
+            if samples is None:
+                if not self.health.available and self.status != "fault":
+                    self.status = "fault"
+                    self.status_callback("fault")
+                self._stop_thread.wait(BURST_INTERVAL)
+                continue
+            energy = mains_energy(samples, rate, self.mains_frequency)
+            status = self.detector.update(energy)
+            if status == "off" and self.status == "off" and self.onset_armed and self.onset_callback is not None \
+                    and self.detector.is_high(energy):
+                self.onset_armed = False  # First loud burst; the detector still wants another before it says on
+                self.onsets.inc()
+                self.onset_callback()
+            elif status == "off" and not self.detector.is_high(energy):
+                self.onset_armed = True
+            if status != self.status:
+                self.status = status
+                if status == "on":
+                    self.triggers.inc()
+                else:
+                    self.onset_armed = True
+                logger.debug("      🚥 ⚡︎ %s is %s - mains energy %.3f (off %.3f)", self.label, status.upper(), energy, self.off_energy)
+                self.status_callback(status)
+            self._stop_thread.wait(BURST_INTERVAL)
+
+    def monitor_comparator(self):
+        """Sleep on the ALERT edge with the bus idle; sample in detail only while something is happening."""
+        import RPi.GPIO as GPIO
+        armed = False
+        while not self._stop_thread.is_set():
+            self.heartbeat.beat()
+            if not armed:
+                try:
+                    self.ads.get_last_result()  # Reading a conversion releases the latched ALERT
+                    self.health.record_success()
+                    armed = True
+                except Exception as e:
+                    self.i2c_errors.inc()
+                    self.health.record_failure(e)
+                    self._stop_thread.wait(0.5)
+                    continue
+            if GPIO.wait_for_edge(self.alert_pin, GPIO.FALLING, timeout=ALERT_WAIT_MS) is None \
+                    and GPIO.input(self.alert_pin) == GPIO.HIGH:
+                continue
+            armed = False
+            self.alerts.inc()
+            if self.onset_callback is not None and self.status == "off":
+                self.onsets.inc()
+                self.onset_callback()
+            self.follow_activation()
+
+    def follow_activation(self):
+        """Run the polling detector after an ALERT until the input has been quiet for a full window."""
+        current_readings = []
+        quiet = 0
+        while not self._stop_thread.is_set() and quiet < NUMBER_OF_READINGS:
+            self.threshold_step(current_readings)
+            quiet = quiet + 1 if self.status == "off" else 0
             time.sleep(0.1)
 
     def stop(self):
@@ -99,6 +346,17 @@ class Voltage_Sensor:
         self.thread.join(timeout=5)  # Wait for the thread to finish with a timeout
         if self.thread.is_alive():
             logger.warning(f"Thread for voltage sensor {self.label} did not stop within the timeout period.")
+        if self.heartbeat is not None:
+            self.heartbeat.close()
+        if self.mode == 'comparator':
+            import RPi.GPIO as GPIO
+            try:
+                self.ads.comparator_queue_length = 0  # Comparator off, ALERT released
+                self.ads.mode = Mode.SINGLE
+            except OSError as e:
+                logger.warning(f"🌟 ⚡︎ Could not switch off the comparator for {self.label}: {e}")
+            comparator_owners.pop(id(self.ads), None)
+            GPIO.cleanup(self.alert_pin)
 
 # Main loop for testing
 if __name__ == "__main__":
@@ -115,6 +373,8 @@ if __name__ == "__main__":
         "multiplier": "9"
     }
 
+    import board
+    import busio
     i2c = busio.I2C(board.SCL, board.SDA)
     ads = ADS.ADS1115(i2c, address=0x48)
 
@@ -1,14 +1,17 @@
 import json
 import os
+import sys
 import time
 import logging
+import threading
 import curses
 from pathlib import Path
-from datetime import datetime
 
 import board
 import busio
 from adafruit_pca9685 import PCA9685 as Adafruit_PCA9685
+from utils.persistence import Debounced_Writer, Snapshot_Store
+from boards.servo_calibration import MIN_PULSE, MAX_PULSE, SERVO_FREQUENCY, effective_frequency, get_calibration
 
 # Set up logging
 logging.basicConfig(level=logging.DEBUG)
@@ -20,6 +23,9 @@ CONFIG_FILE = os.path.join(BASE_DIR, 'config.json')
 GATES_FILE = os.path.join(BASE_DIR, 'gates.json')
 BACKUP_DIR = os.path.join(BASE_DIR, '_BU')
 
+DRAG_RATE = 50  # PWM updates per second while a gate is being dragged; one per 50 Hz servo frame
+DRAG_RELEASE_TIME = 1.0  # Seconds the target has to stay put before the servo signal is cut
+
 # Load the configuration files
 def load_config():
     with open(CONFIG_FILE, 'r') as config_file:
@@ -35,13 +41,22 @@ def load_gates():
 def initialize_boards(config):
     i2c = busio.I2C(board.SCL, board.SDA)
     boards = {}
+    sense_boards = {sense['board'] for sense in config.get('motion', {}).get('current_sense', {}).values()}
 
     for board_config in config.get('boards', []):
         board_id = board_config['id']
-        if board_config.get('purpose') == 'Servo Control':
+        if board_id in sense_boards:
+            # ADS1115s measuring servo supply current, for --auto calibration
+            from adafruit_ads1x15.ads1115 import ADS1115 as Adafruit_ADS1115
+            try:
+                boards[board_id] = Adafruit_ADS1115(i2c, address=int(board_config['i2c_address'], 16))
+                logger.info(f"Initialized ADS1115 {board_config['label']} at address {board_config['i2c_address']}")
+            except Exception as e:
+                logger.error(f"Failed to initialize ADS1115 {board_id}: {e}")
+        elif board_config.get('purpose') == 'Servo Control':
             try:
                 boards[board_id] = Adafruit_PCA9685(i2c, address=int(board_config['i2c_address'], 16))
-                boards[board_id].frequency = 50  # 50 Hz is standard for servos
+                boards[board_id].frequency = SERVO_FREQUENCY  # 50 Hz is standard for servos
                 logger.info(f"Initialized PCA9685 {board_config['label']} at address {board_config['i2c_address']}")
             except Exception as e:
                 logger.error(f"Failed to initialize PCA9685 {board_id}: {e}")
@@ -65,15 +80,12 @@ class Gate:
         self.max_angle = gate_info['max']
         self.status = gate_info['status']
         self.previous_status = gate_info['status']
+        # Same lookup table the runtime Gate_Manager uses
+        self.calibration = get_calibration(effective_frequency(SERVO_FREQUENCY),
+                                           gate_info.get('min_pulse', MIN_PULSE), gate_info.get('max_pulse', MAX_PULSE))
 
     def angle_to_pwm(self, angle):
-        min_pulse = 1000  # Minimum pulse width (in microseconds)
-        max_pulse = 2000  # Maximum pulse width (in microseconds)
-        pulse_range = max_pulse - min_pulse
-        angle_range = 180  # Full range of servo angles (typically 0-180 degrees)
-
-        pulse_width = min_pulse + (pulse_range * angle / angle_range)
-        return int((pulse_width * 65535) / (1000000 / self.board.frequency))
+        return self.calibration.duty_cycle(angle)
 
     def set_angle(self, angle):
         pwm_value = self.angle_to_pwm(angle)
@@ -95,13 +107,79 @@ class Gate:
             self.status = new_status
             logger.info(f"Gate {self.name} {new_status}.")
 
+class Servo_Actuator:
+    '''Streams the latest target angle of one gate to its servo from a background thread.
+
+    Key presses only replace the target, so a held arrow key costs one PWM write per
+    tick however fast it repeats, and the UI never waits on the servo. The signal is
+    cut once the target has been still for release_time, or when another gate is dragged.
+    '''
+    def __init__(self, rate=DRAG_RATE, release_time=DRAG_RELEASE_TIME):
+        self.period = 1.0 / rate
+        self.release_time = release_time
+        self.target = None  # (gate, angle) still to be reached or held
+        self.moved_at = 0.0
+        self.written = None  # (gate, duty cycle) on the wire
+        self.lock = threading.Lock()
+        self.wake_event = threading.Event()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def move(self, gate, angle):
+        with self.lock:
+            self.target = (gate, angle)
+            self.moved_at = time.monotonic()
+        self.wake_event.set()
+
+    def run(self):
+        while not self.stop_event.is_set():
+            self.wake_event.wait()
+            with self.lock:
+                target, moved_at = self.target, self.moved_at
+            if target is None:
+                self.wake_event.clear()
+                continue
+            gate, angle = target
+            duty = gate.angle_to_pwm(angle)
+            if self.written is not None and self.written[0] is not gate:
+                self.release()
+            if self.written != (gate, duty):
+                gate.board.channels[gate.pin].duty_cycle = duty
+                self.written = (gate, duty)
+            elif time.monotonic() - moved_at >= self.release_time:
+                self.release()
+                with self.lock:
+                    if self.target == target:  # Nothing new arrived while releasing
+                        self.target = None
+                        self.wake_event.clear()
+                continue
+            self.stop_event.wait(self.period)
+
+    def release(self):
+        if self.written is not None:
+            gate = self.written[0]
+            gate.board.channels[gate.pin].duty_cycle = 0
+            self.written = None
+
+    def stop(self):
+        self.stop_event.set()
+        self.wake_event.set()
+        self.thread.join(timeout=1)
+        self.release()
+
 # GateManager class
 class GateManager:
-    def __init__(self, boards, gates_file=GATES_FILE, backup_dir=BACKUP_DIR):
+    def __init__(self, boards, gates_file=GATES_FILE, backup_dir=BACKUP_DIR, motion_config=None):
+        motion_config = motion_config or {}
         self.boards = boards  # Store the boards dictionary
         self.gates_file = gates_file
         self.backup_dir = backup_dir
+        # Rapid min/max edits collapse into one atomic write and one deduplicated backup
+        self.writer = Debounced_Writer(gates_file, Snapshot_Store(backup_dir, 'gates'))
         self.gates = {}
+        self.actuator = Servo_Actuator(float(motion_config.get('drag_rate', DRAG_RATE)),
+                                       float(motion_config.get('drag_release_time', DRAG_RELEASE_TIME)))
         self.gates_dict = load_gates()
         if self.gates_dict:
             self.build_gates()
@@ -124,33 +202,23 @@ class GateManager:
             gate.close()
     # end def
 
-    def backup_gates(self):
-        '''Backs up the gates configuration to a timestamped file in the backup directory'''
-        timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-        backup_file = os.path.join(self.backup_dir, f'gates_backup_{timestamp}.json')
-        try:
-            with open(backup_file, 'w') as f:
-                json.dump(self.gates_dict, f, indent=4)
-            logger.info(f"Gates configuration backed up to {backup_file}")
-        except Exception as e:
-            logger.error(f"Failed to backup gates configuration: {e}")
-
     def save_gates(self):
-        '''Saves the updated gate angles to the gates.json file'''
+        '''Queues the updated gate angles to be written to the gates.json file'''
         for gate_name, gate in self.gates.items():
             self.gates_dict[gate_name]['min'] = gate.min_angle
             self.gates_dict[gate_name]['max'] = gate.max_angle
 
-        self.backup_gates()  # Backup before saving
-        with open(self.gates_file, 'w') as gates_file:
-            json.dump({"gates": self.gates_dict}, gates_file, indent=4)
-        logger.info(f"Gates configuration saved to {self.gates_file}")
+        self.writer.schedule({"gates": self.gates_dict})
+
+    def flush(self):
+        '''Writes any queued changes immediately'''
+        self.writer.flush()
 
     def set_gate_angle(self, stdscr, gate_key, side):
         """ CURSES function so needs wrapping, create interface to adjust the gate"""
         my_gate = self.gates[gate_key]
         pin = my_gate.pin
-        key = None
+        keys = []
         adjustment = 0
         flagged = True
         angle = my_gate.min_angle if side == 'min' else my_gate.max_angle
@@ -170,18 +238,19 @@ class GateManager:
         cent_x = int(width // 2)
 
         while True:
-            if key == "KEY_DOWN":
-                adjustment = -1
-            elif key == "KEY_LEFT":
-                adjustment = -10
-            elif key == "KEY_UP":
-                adjustment = 1
-            elif key == "KEY_RIGHT":
-                adjustment = 10
-            elif key == "q":
-                return -1
-            elif key == "s":
-                return int(angle)
+            action = None
+            for key in keys:
+                if key == "KEY_DOWN":
+                    adjustment -= 1
+                elif key == "KEY_LEFT":
+                    adjustment -= 10
+                elif key == "KEY_UP":
+                    adjustment += 1
+                elif key == "KEY_RIGHT":
+                    adjustment += 10
+                elif key in ("q", "s"):
+                    action = key  # Acted on once the adjustments before it in this batch are applied
+                    break
             if adjustment != 0 or flagged:
                 flagged = False
                 angle += adjustment
@@ -191,7 +260,11 @@ class GateManager:
                 elif angle < 0: 
                     angle = 0
                 
-                my_gate.set_angle(angle)
+                self.actuator.move(my_gate, angle)  # Returns at once; the actuator thread drives the servo
+            if action == "q":
+                return -1
+            if action == "s":
+                return int(angle)
 
             # UI strings and positioning
             title = f"Set {side} for gate {my_gate.name} on pin {my_gate.pin}"[:width-1]
@@ -212,8 +285,16 @@ class GateManager:
             # Refresh the screen
             stdscr.refresh()
 
-            # Wait for next input
-            key = stdscr.getkey()
+            # Wait for next input, then take every key already queued so a held key is one redraw
+            keys = [stdscr.getkey()]
+            stdscr.nodelay(True)
+            try:
+                while True:
+                    keys.append(stdscr.getkey())
+            except curses.error:
+                pass
+            finally:
+                stdscr.nodelay(False)
 
     def set_min(self, gate_key):
         gate_min = curses.wrapper(self.set_gate_angle, gate_key, 'min')
@@ -231,17 +312,68 @@ class GateManager:
             return True
         return False
 
+def auto_calibrate(config, boards, gate_manager):
+    '''Finds every gate's endstops from servo stall current and saves them in one atomic write'''
+    from devices.endstop_calibration import Current_Sense, Endstop_Calibrator
+    motion_config = config.get('motion', {})
+    sensors = {}
+    for rail, sense in motion_config.get('current_sense', {}).items():
+        if sense['board'] in boards:
+            sensors[rail] = Current_Sense(boards[sense['board']], sense['pin'], sense.get('volts_per_amp', 0.185))
+    board_rails = {board_config['id']: board_config.get('power_rail', board_config['id']) for board_config in config.get('boards', [])}
+    gates_by_rail = {}
+    for name, gate in gate_manager.gates.items():
+        rail = board_rails[gate_manager.gates_dict[name]['io_location']['board']]
+        gates_by_rail.setdefault(rail, []).append(gate)
+
+    results = Endstop_Calibrator(sensors, motion_config).run(gates_by_rail)
+    apply_endstops(gate_manager, results)
+    return results
+
+def apply_endstops(gate_manager, results):
+    '''Stores each gate's (stop towards 0, stop towards 180) as its min and max and saves them in one write.
+
+    A gate set up with min above max (MiterSaw_Left closes at 160 and opens at 40) keeps
+    that orientation: its min takes the high stop and its max the low one.
+    '''
+    for name, (low, high) in results.items():
+        gate = gate_manager.gates[name]
+        reversed_gate = gate.min_angle > gate.max_angle
+        hand_low, hand_high = sorted((gate.min_angle, gate.max_angle))
+        low = hand_low if low is None else low  # No stop on that side; keep the hand-set angle
+        high = hand_high if high is None else high
+        if high - low < 10:
+            logger.warning(f"Gate {name}: endstops {low} and {high} are too close to trust; keeping {gate.min_angle}-{gate.max_angle}")
+            continue
+        gate.min_angle, gate.max_angle = (high, low) if reversed_gate else (low, high)
+    gate_manager.save_gates()
+    gate_manager.flush()
+
 # Main execution
 if __name__ == "__main__":
+    # python gate_setter.py          set each gate's min and max by eye
+    # python gate_setter.py --auto   find them from servo stall current (needs "current_sense" in config.json's "motion")
     config = load_config()
     boards = initialize_boards(config)
-    gate_manager = GateManager(boards)
-
-    for gate_name in gate_manager.gates:
-        logger.info(f"Testing gate {gate_name}")
-        if not gate_manager.set_min(gate_name):
-            break
-        if not gate_manager.set_max(gate_name):
-            break
+    gate_manager = GateManager(boards, motion_config=config.get('motion', {}))
+
+    if '--auto' in sys.argv:
+        try:
+            auto_calibrate(config, boards, gate_manager)
+        finally:
+            gate_manager.actuator.stop()
+        logger.info("Automatic calibration finished.")
+        sys.exit(0)
+
+    try:
+        for gate_name in gate_manager.gates:
+            logger.info(f"Testing gate {gate_name}")
+            if not gate_manager.set_min(gate_name):
+                break
+            if not gate_manager.set_max(gate_name):
+                break
+    finally:
+        gate_manager.actuator.stop()
+        gate_manager.flush()
 
     logger.info("All gates have been set.")
\ No newline at end of file
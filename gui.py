@@ -1,12 +1,136 @@
+from PySide6.QtCore import QAbstractListModel, QModelIndex, QObject, Qt, QTimer, Signal
 from PySide6.QtWidgets import QApplication, QMainWindow, QListView, QVBoxLayout, QWidget, QLabel, QPushButton, QFormLayout, QLineEdit, QComboBox, QSpinBox
 
+FLUSH_INTERVAL_MS = 50  # Changes arriving within this window are coalesced into one dataChanged per row range
+
+
+class Device_List_Model(QAbstractListModel):
+    '''List model over tools, gates or collectors that keeps its own status snapshot.
+
+    Status updates are queued by key and flushed on a timer so a burst of changes
+    turns into a handful of dataChanged signals covering only the rows that differ.
+    '''
+    DeviceRole = Qt.UserRole + 1
+    StatusRole = Qt.UserRole + 2
+
+    def __init__(self, devices=(), key_attr='id', label_attr='label', parent=None):
+        super().__init__(parent)
+        self.key_attr = key_attr
+        self.label_attr = label_attr
+        self.devices = []
+        self.keys = []
+        self.labels = []
+        self.statuses = []
+        self.rows = {}
+        self.pending = {}
+        self.flush_timer = QTimer(self)
+        self.flush_timer.setSingleShot(True)
+        self.flush_timer.setInterval(FLUSH_INTERVAL_MS)
+        self.flush_timer.timeout.connect(self.flush)
+        self.set_devices(devices)
+
+    def set_devices(self, devices):
+        self.beginResetModel()
+        self.devices = list(devices)
+        self.keys = [getattr(device, self.key_attr) for device in self.devices]
+        self.labels = [getattr(device, self.label_attr, key) for device, key in zip(self.devices, self.keys)]
+        self.statuses = [getattr(device, 'status', 'unknown') for device in self.devices]
+        self.rows = {key: row for row, key in enumerate(self.keys)}
+        self.pending = {}
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.devices)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = index.row()
+        if role == Qt.DisplayRole:
+            return f"{self.labels[row]}: {self.statuses[row]}"
+        if role == self.StatusRole:
+            return self.statuses[row]
+        if role == self.DeviceRole:
+            return self.devices[row]
+        return None
+
+    def device_at(self, index):
+        return self.devices[index.row()] if index.isValid() else None
+
+    def queue_status(self, key, status):
+        '''Records the latest status for a device and schedules a flush'''
+        if key not in self.rows:
+            return
+        self.pending[key] = status
+        if not self.flush_timer.isActive():
+            self.flush_timer.start()
+
+    def flush(self):
+        '''Applies queued statuses and emits dataChanged for each contiguous run of changed rows'''
+        changed_rows = []
+        for key, status in self.pending.items():
+            row = self.rows[key]
+            if self.statuses[row] != status:
+                self.statuses[row] = status
+                changed_rows.append(row)
+        self.pending = {}
+        if not changed_rows:
+            return
+
+        changed_rows.sort()
+        start = end = changed_rows[0]
+        for row in changed_rows[1:]:
+            if row == end + 1:
+                end = row
+                continue
+            self.emit_rows_changed(start, end)
+            start = end = row
+        self.emit_rows_changed(start, end)
+
+    def emit_rows_changed(self, first, last):
+        self.dataChanged.emit(self.index(first), self.index(last), [Qt.DisplayRole, self.StatusRole])
+
+
+class State_Bridge(QObject):
+    '''Carries status changes from device threads into the GUI thread.
+
+    Device listeners call the bridge from any thread; the signal is delivered
+    through a queued connection so the models are only touched on the GUI thread.
+    '''
+    tool_changed = Signal(str, str)
+    gate_changed = Signal(str, str)
+    collector_changed = Signal(str, str)
+
+    def attach(self, tools=(), gate_manager=None, collectors=()):
+        for tool in tools:
+            tool.add_status_listener(lambda tool, status: self.tool_changed.emit(tool.id, status))
+        if gate_manager is not None:
+            for gate in gate_manager.gates.values():
+                gate.add_status_listener(lambda gate, status: self.gate_changed.emit(gate.name, status))
+        for collector in collectors:
+            collector.add_status_listener(lambda collector, status: self.collector_changed.emit(collector.label, status))
+
+
 class HokoriMainWindow(QMainWindow):
-    def __init__(self):
+    def __init__(self, tools=(), gate_manager=None, collectors=()):
         super().__init__()
+        self.gate_manager = gate_manager
 
         self.setWindowTitle('Hokori Shop Manager')
         self.setGeometry(100, 100, 800, 600)
 
+        # Models fed from the live device objects
+        self.tools_model = Device_List_Model(tools, key_attr='id', label_attr='label', parent=self)
+        gates = gate_manager.gates.values() if gate_manager is not None else ()
+        self.gates_model = Device_List_Model(gates, key_attr='name', label_attr='name', parent=self)
+        self.collectors_model = Device_List_Model(collectors, key_attr='label', label_attr='label', parent=self)
+
+        self.bridge = State_Bridge(self)
+        self.bridge.tool_changed.connect(self.tools_model.queue_status)
+        self.bridge.gate_changed.connect(self.gates_model.queue_status)
+        self.bridge.collector_changed.connect(self.collectors_model.queue_status)
+        self.bridge.attach(tools, gate_manager, collectors)
+
         # Main layout
         self.main_widget = QWidget()
         self.main_layout = QVBoxLayout(self.main_widget)
@@ -14,21 +138,27 @@ class HokoriMainWindow(QMainWindow):
         # Gates Panel
         self.gates_label = QLabel("Gates")
         self.gates_view = QListView()  # Or QTreeView if hierarchical structure is needed
+        self.gates_view.setModel(self.gates_model)
+        self.gates_view.setUniformItemSizes(True)
         self.main_layout.addWidget(self.gates_label)
         self.main_layout.addWidget(self.gates_view)
 
         # Tools Panel
         self.tools_label = QLabel("Tools")
         self.tools_view = QListView()
+        self.tools_view.setModel(self.tools_model)
+        self.tools_view.setUniformItemSizes(True)
         self.main_layout.addWidget(self.tools_label)
         self.main_layout.addWidget(self.tools_view)
 
         # Dust Collector Panel
         self.collector_label = QLabel("Dust Collector")
-        self.collector_status = QLabel("Status: OFF")  # Update this dynamically
+        self.collectors_view = QListView()
+        self.collectors_view.setModel(self.collectors_model)
+        self.collectors_view.setUniformItemSizes(True)
         self.collector_button = QPushButton("Toggle Dust Collector")
         self.main_layout.addWidget(self.collector_label)
-        self.main_layout.addWidget(self.collector_status)
+        self.main_layout.addWidget(self.collectors_view)
         self.main_layout.addWidget(self.collector_button)
 
         # Detailed Configuration Panel
@@ -40,34 +170,60 @@ class HokoriMainWindow(QMainWindow):
         # Example Fields for Editing
         self.gate_minimum = QSpinBox()
         self.gate_maximum = QSpinBox()
+        self.gate_minimum.setRange(0, 180)
+        self.gate_maximum.setRange(0, 180)
         self.detail_layout.addRow("Gate Minimum", self.gate_minimum)
         self.detail_layout.addRow("Gate Maximum", self.gate_maximum)
 
-        self.tool_gate_prefs = QComboBox()  # This would be populated with actual gate options
+        self.tool_gate_prefs = QComboBox()
         self.detail_layout.addRow("Tool Gate Preferences", self.tool_gate_prefs)
 
         self.main_widget.setLayout(self.main_layout)
         self.setCentralWidget(self.main_widget)
 
-        # Connect signals (placeholders for now)
+        # Connect signals
         self.gates_view.clicked.connect(self.edit_gate)
         self.tools_view.clicked.connect(self.edit_tool)
         self.collector_button.clicked.connect(self.toggle_collector)
 
     def edit_gate(self, index):
-        # Load gate details into the form for editing
-        pass
+        '''Load gate details into the form for editing'''
+        gate = self.gates_model.device_at(index)
+        if gate is None:
+            return
+        self.gate_minimum.setValue(int(gate.min_angle))
+        self.gate_maximum.setValue(int(gate.max_angle))
 
     def edit_tool(self, index):
-        # Load tool details into the form for editing
-        pass
+        '''Load tool details into the form for editing'''
+        tool = self.tools_model.device_at(index)
+        if tool is None:
+            return
+        self.tool_gate_prefs.clear()
+        self.tool_gate_prefs.addItems(tool.gate_prefs)
 
     def toggle_collector(self):
-        # Logic to toggle the dust collector status
-        pass
+        '''Hold the selected dust collector (or the first one) on by hand, or hand it back to its tools.
 
-if __name__ == '__main__':
-    app = QApplication([])
-    window = HokoriMainWindow()
+        The collector's own loop follows the tools every second, so a plain turn_on() or
+        turn_off() would be undone straight away; the manual hold is something it respects.
+        '''
+        index = self.collectors_view.currentIndex()
+        collector = self.collectors_model.device_at(index)
+        if collector is None and self.collectors_model.devices:
+            collector = self.collectors_model.devices[0]
+        if collector is None:
+            return
+        collector.set_manual(not collector.manual_on)
+
+
+def run_gui(tools=(), gate_manager=None, collectors=()):
+    '''Entry point for the 'qt' UI backend; blocks until the window is closed'''
+    app = QApplication.instance() or QApplication([])
+    window = HokoriMainWindow(tools, gate_manager, collectors)
     window.show()
     app.exec_()
+
+
+if __name__ == '__main__':
+    run_gui()
@@ -1,24 +1,33 @@
 # Importing necessary modules
+from utils.startup_profile import startup_profile  # First, so it can time the imports below
 import os
 import json
 import time
 import logging
-import board
 import sys
-import busio
+import queue
 from devices.poll_buttons import Poll_Buttons
 from devices.tool import Tool
 from devices.gate_manager import Gate_Manager
 from devices.dust_collector import Dust_Collector
+from devices.satellite import Satellite_Server, tool_node, wired_boards, DEFAULT_HOST as SATELLITE_HOST, DEFAULT_PORT as SATELLITE_PORT
 from utils.style_manager import Style_Manager
-from boards.mcp23017 import MCP23017
-from boards.pca9685 import PCA9685
-from adafruit_ads1x15.ads1115 import ADS1115 as Adafruit_ADS1115
+from utils.log_manager import setup_logging, stop_logging
+from utils.metrics import Metrics_Server, Snapshot_Writer
+from utils.config_watcher import Config_Watcher
+from utils.usage_stats import Usage_Stats
+from utils.watchdog import watchdog
+from boards import registry as board_registry
+from boards.board_health import monitor, probe_address
+from boards.discovery import scan_bus, reconcile, boards_on_bus, load_cache, save_cache
+from boards.bus_manager import Bus_Manager, DEFAULT_BUS
+from utils import ui_backends
 import random
 
-# Configuring logging
-logging.basicConfig(level=logging.DEBUG)
+# Configuring logging (queued, so the control loops never block on log writes)
+setup_logging(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
+startup_profile.mark('imports')
 
 # Configuration flag to control gate-related functionality
 USE_GATES = True
@@ -26,9 +35,18 @@ USE_VOLT_SENSORS = True
 USE_BUTTONS = True
 USE_COLLECTORS = True
 USE_GUI = False
+GUI_BACKEND = 'pygame'  # 'pygame' or 'qt' (utils.ui_backends.UI_BACKENDS); only imported when USE_GUI is set
+USE_METRICS = True
+USE_HOT_RELOAD = True
+USE_SATELLITES = True
+USE_USAGE_STATS = True
+USE_PANELS = True
+USE_KEYS = True
+USE_WATCHDOG = True
 
 # Load the configuration file
-config_path = os.path.join(os.path.dirname(__file__), 'config.json')
+base_dir = os.path.dirname(os.path.abspath(__file__))
+config_path = os.path.join(base_dir, 'config.json')
 if not os.path.exists(config_path):
     logger.error(f"💢 Configuration file not found at {config_path}. Exiting.")
     sys.exit(1)
@@ -40,39 +58,153 @@ with open(config_path, 'r') as config_file:
 style_manager = Style_Manager()
 styles = style_manager.get_styles()
 
-# Initialize I2C bus
-i2c = busio.I2C(board.SCL, board.SDA)
+startup_profile.mark('config')
+
+# Initialize the I2C buses (the Pi's own bus plus any extra buses or mux channels in config.json)
+bus_manager = Bus_Manager(config.get('buses', []))
+i2c = bus_manager.get(DEFAULT_BUS)
+board_buses = {board_config['id']: board_config.get('bus', DEFAULT_BUS) for board_config in config.get('boards', [])}
+
+# Boards with a "node" are wired to a satellite controller (see satellite.py) instead of this Pi
+board_nodes = {board_config['id']: board_config['node'] for board_config in config.get('boards', []) if board_config.get('node')}
+local_board_configs = [board_config for board_config in config.get('boards', []) if board_config['id'] not in board_nodes]
+satellite_server = None
+if USE_SATELLITES and board_nodes:
+    satellite_config = config.get('satellites', {})
+    satellite_server = Satellite_Server(satellite_config.get('host', SATELLITE_HOST), satellite_config.get('port', SATELLITE_PORT),
+                                        satellite_config.get('secret', ''))
+    satellite_server.start()
+
+# Work for the main loop (config reloads, re-attached boards) is queued here as callables,
+# so it always runs on the main thread between polls
+main_queue = queue.SimpleQueue()
+
+def create_board(board_config):
+    '''Initializes a single board from its config entry'''
+    board_type = board_config['type']
+    board_id = board_config['id']
+    bus_id = board_config.get('bus', DEFAULT_BUS)
+    bus = bus_manager.get(bus_id)
+    if board_type == 'Raspberry Pi GPIO':
+        return "Raspberry Pi GPIO"  # Placeholder to represent GPIO
+    board = board_registry.create(board_type, bus, board_config)  # Imports the driver on first use
+    if board is None:
+        logger.error(f"💢 Unknown board type {board_type} for board {board_id}")
+        return None
+    board.bus_worker = bus_manager.worker(bus_id)  # Writes to this board are serialized on its bus's worker
+    return board
+
+def reattach_board(board_config):
+    '''Runs on the main loop once an offline board answers again, whether it failed at startup or tripped later.
+
+    A board that browned out has lost its setup (PCA9685 prescale and MODE1, MCP23017
+    IODIR and pull-ups) even though it ACKs, so it is always initialized afresh.
+    '''
+    board_id = board_config['id']
+    try:
+        board = create_board(board_config)
+    except Exception as e:
+        logger.error(f"💢 Board {board_config.get('label', board_id)} answered but failed to initialize: {e}")
+        monitor.board(board_id).trip(e)
+        return
+    boards[board_id] = board
+    logger.info(f"     🔮 Re-attached board {board_config.get('label', board_id)}")
+    if 'i2c_address' in board_config:
+        bus_devices.setdefault(board_buses[board_id], {})[int(board_config['i2c_address'], 16)] = board_config['type']
+        save_cache(bus_devices)
+
+    # Rebuild only the devices wired to this board
+    for tool_config in config.get('tools', []):
+        if board_id in wired_boards(tool_config):
+            replace_device(tool_config)
+    assign_buttons()
+    if USE_GATES:
+        gate_manager.attach_board(board_id, board)
+        gate_manager.set_gates(tools)
+
+# Discover what is on each bus; the cached scan from the last run is used when there is one
+bus_devices = load_cache()
+if bus_devices is None or set(bus_devices) != set(bus_manager.bus_ids()):
+    bus_devices = {bus_id: scan_bus(bus_manager.get(bus_id)) for bus_id in bus_manager.bus_ids()}
+    save_cache(bus_devices)
+for bus_id, found in bus_devices.items():
+    bus_report = reconcile(found, boards_on_bus(local_board_configs, bus_id))
+    for board_id, address in bus_report['missing']:
+        logger.warning(f"🌟 Board {board_id} at {address} was not found on the last scan of bus {bus_id}")
+    for board_id, address, expected, found_type in bus_report['wrong_type']:
+        logger.warning(f"🌟 Board {board_id} at {address} looks like a {found_type}, config says {expected}")
+    for address, board_ids in bus_report['duplicate']:
+        logger.error(f"💢 Address {address} on bus {bus_id} is configured for more than one board: {', '.join(board_ids)}")
+
+startup_profile.mark('buses')
 
 # Initialize boards
 boards = {}  # Change from list to dictionary
 for board_config in config.get('boards', []):
-    board_type = board_config['type']
+    if board_config['id'] in board_nodes:
+        # Servo boards on a satellite are driven from here over the network; everything else stays on the node
+        node_id = board_nodes[board_config['id']]
+        if satellite_server is not None and board_config['type'] == 'PCA9685':
+            boards[board_config['id']] = satellite_server.remote_board(node_id, board_config)
+            monitor.watch(board_config['id'], lambda node_id=node_id: satellite_server.is_connected(node_id))
+        continue
     board_id = board_config['id']
-
+    address = board_config.get('i2c_address')
+    bus_id = board_buses[board_id]
+    probe = (lambda address=int(address, 16), bus_id=bus_id: probe_address(bus_manager.get(bus_id), address)) if address else None
+    on_recover = lambda board_id, board_config=board_config: main_queue.put(lambda: reattach_board(board_config))
     try:
-        if board_type == 'MCP23017':
-            boards[board_id] = MCP23017(i2c, board_config)
-        elif board_type == 'PCA9685':
-            boards[board_id] = PCA9685(i2c, board_config)
-        elif board_type == 'ADS1115':
-            boards[board_id] = Adafruit_ADS1115(i2c, address=int(board_config['i2c_address'], 16))
-            logger.info(f"     🔮 Initialized ADS1115 at address {board_config['i2c_address']} and board ID {board_id}")
-        elif board_type == 'Raspberry Pi GPIO':
-            boards[board_id] = "Raspberry Pi GPIO"  # Placeholder to represent GPIO
-        else:
-            logger.error(f"💢 Unknown board type {board_type} for board {board_id}")
+        if address and int(address, 16) not in bus_devices.get(bus_id, {}):
+            # Known to be absent; skip the slow failing init and let the health monitor pick it up
+            raise OSError(f"no device at {address} on the last bus scan")
+        board = create_board(board_config)
+        if board is not None:
+            boards[board_id] = board
+            monitor.watch(board_id, probe, on_recover=on_recover)
     except Exception as e:
-      logger.error(f"💢 Failed to initialize board {board_config.get('label', 'unknown')}: {e}")
+        logger.error(f"💢 Failed to initialize board {board_config.get('label', 'unknown')}: {e}")
+        if probe is not None:
+            # Keep probing in the background and attach it when it shows up
+            monitor.watch(board_id, probe, offline=True, on_recover=on_recover)
+monitor.start()
+startup_profile.mark('boards')
+
+# Aggregate current sensors that tell which tools are running without a sensor per tool
+panel_monitors = {}
+if USE_PANELS and config.get('panels'):
+    from devices.disaggregator import Panel_Monitor
+    for panel_config in config['panels']:
+        panel_ads = boards.get(panel_config['connection']['board'])
+        if panel_ads is None:
+            logger.error(f"💢 Panel sensor {panel_config['id']} is on board {panel_config['connection']['board']}, which is not available")
+            continue
+        try:
+            panel_monitors[panel_config['id']] = Panel_Monitor(panel_config, panel_ads)
+        except Exception as e:
+            logger.error(f"💢 Failed to initialize panel sensor {panel_config['id']}: {e}")
 
 # Initialize tools
 tools = []
 collectors = []
 
-# Initialize tools and dust collectors
-for tool_config in config.get('tools', []):
+# Tool on-time, collector runtime and gate actuations, kept in memory and written to stats/usage.json
+usage_stats = Usage_Stats() if USE_USAGE_STATS else None
+
+def is_collector(tool_config):
+    return 'relay' in tool_config and tool_config['relay'].get('type') == 'collector_relay'
+
+def build_device(tool_config):
+    '''Builds a Tool or Dust_Collector from its config entry; returns None if it could not be built'''
+    node_id = tool_node(tool_config, board_nodes)
+    if node_id is not None:
+        if satellite_server is None:
+            logger.warning(f"🌟 Tool {tool_config['label']} lives on satellite {node_id} but satellites are disabled.")
+            return None
+        return satellite_server.remote_tool(tool_config, node_id)
     try:
         mcp = boards.get(tool_config['button']['connection']['board'], None) if 'button' in tool_config and 'connection' in tool_config['button'] else None
         pca_led = boards.get(tool_config['button']['led']['connection']['board'], None) if 'button' in tool_config and 'led' in tool_config['button'] and 'connection' in tool_config['button']['led'] else None
+        ads = None
         if USE_VOLT_SENSORS:
             ads = boards.get(tool_config['volt']['connection']['board'], None) if 'volt' in tool_config and 'connection' in tool_config['volt'] else None
         else:
@@ -80,33 +212,200 @@ for tool_config in config.get('tools', []):
         gpio = boards.get(tool_config['relay']['connection']['board'], None) if 'relay' in tool_config and 'connection' in tool_config['relay'] else None
 
         # Determine if this is a dust collector or a regular tool
-        if 'relay' in tool_config and tool_config['relay'].get('type') == 'collector_relay':
-            collector = Dust_Collector(tool_config, tools)
-            collectors.append(collector)
-        else:
-            # Initialize the tool with the appropriate configurations
-            tool = Tool(tool_config, mcp, pca_led, ads, gpio, styles, i2c, boards)
-            
-            if tool.button or tool.voltage_sensor or tool.gpio_pin:
-                tools.append(tool)
-            else:
-                logger.error(f"💢 Tool {tool.label} skipped due to invalid configuration.")
+        if is_collector(tool_config):
+            return Dust_Collector(tool_config, tools)
+
+        # Initialize the tool with the appropriate configurations
+        tool = Tool(tool_config, mcp, pca_led, ads, gpio, styles, i2c, boards)
+        if tool.button or tool.voltage_sensor or tool.gpio_pin or tool_config.get('panel') in panel_monitors:
+            return tool
+        logger.error(f"💢 Tool {tool.label} skipped due to invalid configuration.")
     except Exception as e:
         logger.error(f"💢 Failed to initialize tool {tool_config['label']}: {e}")
+    return None
+
+def replace_device(tool_config):
+    '''Stops the live device with this config's id, if any, and builds a fresh one in its place'''
+    for device in tools + collectors:
+        if device.id == tool_config.get('id'):
+            stop_device(device)
+            (collectors if isinstance(device, Dust_Collector) else tools).remove(device)
+    add_device(build_device(tool_config))
 
+def add_device(device):
+    '''Adds a freshly built device to the live lists and starts counting its usage'''
+    if isinstance(device, Dust_Collector):
+        collectors.append(device)
+        if usage_stats is not None:
+            usage_stats.attach_collector(device)
+    elif device is not None:
+        tools.append(device)
+        device.add_status_listener(lambda tool, status: main_queue.put(lambda: None))  # Wake the main loop straight away
+        device.add_onset_listener(lambda tool: main_queue.put(lambda: prestage(tool)))
+        if usage_stats is not None:
+            usage_stats.attach_tool(device)
+        panel_monitor = panel_monitors.get(device.config.get('panel'))
+        if panel_monitor is not None and isinstance(device, Tool):
+            if device.button or device.voltage_sensor:
+                panel_monitor.attach_teacher(device)  # Its own inputs teach the panel its signature
+            else:
+                panel_monitor.attach_inferred(device)
+
+def prestage(tool):
+    '''Opens a starting tool's gates and starts the collector ahead of full detection.
+
+    If the start is never confirmed the tool lapses back to off on its own, and that
+    status change closes the gates again through the main loop.
+    '''
+    if USE_GATES:
+        gate_manager.set_gates(tools)
+    for collector in collectors:
+        collector.wake()
+
+def stop_device(device):
+    '''Releases the threads and pins held by a tool or dust collector'''
+    if usage_stats is not None:
+        usage_stats.detach(device)
+    if isinstance(device, Dust_Collector):
+        device.cleanup()
+        return
+    if device.voltage_sensor is not None:
+        device.voltage_sensor.stop()
+    if device.gpio_pin is not None:
+        device.cleanup()
+
+# Initialize tools and dust collectors
+for tool_config in config.get('tools', []):
+    add_device(build_device(tool_config))
+
+
+for panel_monitor in panel_monitors.values():
+    panel_monitor.start()
+
+startup_profile.mark('tools')
 
 # Initialize Gate Manager if gates are in use
 if USE_GATES:
-    gate_manager = Gate_Manager(boards)  # Pass the boards dictionary to the Gate_Manager
+    gate_manager = Gate_Manager(boards, motion_config=config.get('motion', {}))  # Pass the boards dictionary to the Gate_Manager
+    if usage_stats is not None:
+        gate_manager.add_move_listener(usage_stats.gate_moved)
+
+if usage_stats is not None:
+    usage_stats.start()
+
+# Initialize polling for buttons, one poller per physical bus so a slow bus never delays another
+pollers = {}
+
+# Keypads, foot pedals and remotes toggle tools by their "keyboard_key", alongside the buttons;
+# opt-in, so nothing is started until config.json's "inputs" lists some devices
+key_input = None
+if USE_KEYS and config.get('inputs', {}).get('devices'):
+    from devices.key_input import Key_Input
+    key_input = Key_Input(config.get('inputs', {}))
+
+def assign_buttons():
+    '''Distributes the current buttons between the per-bus pollers, starting pollers for new buses'''
+    by_bus = {}
+    for tool in tools:
+        if tool.button is not None:
+            by_bus.setdefault(bus_manager.root(board_buses[tool.button.health.board_id]), []).append(tool.button)
+    for bus_id, bus_buttons in by_bus.items():
+        if bus_id not in pollers:
+            pollers[bus_id] = Poll_Buttons([], styles['RGBLED_button_styles'], name=f"buttons {bus_id}")
+            pollers[bus_id].start_polling()
+    for bus_id, bus_poller in pollers.items():
+        bus_poller.buttons[:] = by_bus.get(bus_id, [])
+    if key_input is not None:
+        key_input.set_tools(tools)
+
+def all_buttons():
+    return [button for bus_poller in pollers.values() for button in bus_poller.buttons]
+
+assign_buttons()
+if key_input is not None:
+    key_input.start()
+
+# Hot reload: the watcher thread only queues the handlers, the main loop runs them
+def reload_config():
+    '''Diffs config.json against the live tools and collectors and rebuilds only what changed'''
+    global config
+    try:
+        with open(config_path, 'r') as config_file:
+            new_config = json.load(config_file)
+    except (OSError, json.JSONDecodeError) as e:
+        logger.error(f"💢 Ignoring config.json change: {e}")
+        return
+    if new_config.get('boards') != config.get('boards'):
+        logger.warning("🌟 Board changes in config.json take effect after a restart.")
 
-# Extract all buttons for polling
-# Initialize polling for buttons
-buttons = [tool.button for tool in tools if tool.button is not None]
-poller = Poll_Buttons(buttons, styles['RGBLED_button_styles'])
-poller.start_polling()
+    live = {device.id: device for device in tools + collectors}
+    new_ids = []
+    for tool_config in new_config.get('tools', []):
+        device_id = tool_config.get('id')
+        new_ids.append(device_id)
+        device = live.get(device_id)
+        if device is not None and device.config == tool_config:
+            continue
+        if device is not None and isinstance(device, Dust_Collector) == is_collector(tool_config) and device.apply_config(tool_config):
+            continue
+        if device is not None:
+            logger.info(f"🔵 Rebuilding {device.label}")
+        replace_device(tool_config)
+    for device_id, device in live.items():
+        if device_id not in new_ids:
+            logger.info(f"🔵 Removing {device.label}")
+            stop_device(device)
+            (collectors if isinstance(device, Dust_Collector) else tools).remove(device)
+
+    assign_buttons()
+    config = new_config
+    if USE_GATES:
+        gate_manager.set_gates(tools)
+
+def reload_gates():
+    if USE_GATES and gate_manager.reload_gates():
+        gate_manager.set_gates(tools)
+
+def reload_styles():
+    if style_manager.reload():
+        for button in all_buttons():
+            button.refresh_led()
+
+reload_handlers = {
+    'config.json': reload_config,
+    'gates.json': reload_gates,
+    'styles.json': reload_styles,
+}
+
+if USE_HOT_RELOAD:
+    config_watcher = Config_Watcher(base_dir, list(reload_handlers), lambda name: main_queue.put(reload_handlers[name]))
+    config_watcher.start()
+
+# Expose metrics over HTTP and as a periodic snapshot file
+if USE_METRICS:
+    try:
+        metrics_server = Metrics_Server()
+        metrics_server.start()
+    except OSError as e:
+        metrics_server = None
+        logger.error(f"💢 Failed to start metrics server: {e}")
+    snapshot_writer = Snapshot_Writer()
+    snapshot_writer.start()
+
+if USE_GUI:
+    ui_backends.start(GUI_BACKEND, tools, gate_manager if USE_GATES else None, collectors)
+
+# Loops that miss their deadline get every thread's stack sampled into cache/stalls.json
+main_heartbeat = watchdog.loop('main', deadline=5.0)
+if USE_WATCHDOG:
+    watchdog.start()
+
+startup_profile.mark('services')
+startup_profile.finish()
 
 try:
     while True:
+        main_heartbeat.beat()
         tool_states_changed = any(tool.status_changed for tool in tools)
         if tool_states_changed:
             logger.debug("Detected a tool status change.")
@@ -116,7 +415,17 @@ try:
                 logger.debug(f"🌑 Tool {tool.label} status: {tool.status}")
                 tool.reset_status_changed()
 
-        time.sleep(1)
+        # Wait for the next poll, waking straight away for config reloads and re-attached boards
+        try:
+            job = main_queue.get(timeout=1)
+        except queue.Empty:
+            job = None
+        if job is not None:
+            try:
+                job()
+            except Exception as e:  # A bad reload or re-attach must not take the whole controller down
+                logger.exception(f"💢 Main loop job {getattr(job, '__name__', job)} failed: {e}")
+            continue
         print(f'running at {time.time()}', end='\r')
 except KeyboardInterrupt:
     logger.info("Program interrupted by user")
@@ -144,9 +453,32 @@ except KeyboardInterrupt:
                 logger.error(f"Error while cleaning up GPIO for tool {tool.label}: {e}")
 
     try:
-        logger.info("Stopping poller")
-        poller.stop()
+        logger.info("Stopping pollers")
+        for bus_poller in pollers.values():
+            bus_poller.stop()
     except Exception as e:
         logger.error(f"Error while stopping poller: {e}")
+    bus_manager.shutdown()
+    if key_input is not None:
+        key_input.stop()
         
+    if USE_HOT_RELOAD:
+        config_watcher.stop()
+    monitor.stop()
+    if USE_WATCHDOG:
+        watchdog.stop()
+    if satellite_server is not None:
+        satellite_server.stop()
+
+    if usage_stats is not None:
+        usage_stats.stop()
+    for panel_monitor in panel_monitors.values():
+        panel_monitor.stop()
+
+    if USE_METRICS:
+        snapshot_writer.stop()
+        if metrics_server is not None:
+            metrics_server.stop()
+
     logger.info("All threads and resources cleaned up gracefully.")
+    stop_logging()
@@ -1,6 +1,9 @@
-import pygame
-from pygame.locals import *
 import time
+import logging
+from abc import ABC, abstractmethod
+import pygame
+
+logger = logging.getLogger(__name__)
 
 # Define constants
 FONT_NAME = 'meslolgsnf'
@@ -21,69 +24,143 @@ SPINDOWN_COLOR_HOVER = (255, 152, 1)
 TEXT_COLOR = (22, 23, 29)
 BACKGROUND_COLOR = (22, 23, 29)
 BUTTON_RADIUS = 7
+BUTTON_PADDING = 4
 FONT_SIZE_TOOL = 14
 FONT_SIZE_GATE = 16
 
-
-class PG_GUI:
-
-    '''intitalizes pygame canvas'''
-    num_of_buttons = len(tm.tools)
-    num_of_gates = len(gm.gates)
-    pygame.init()
-    screen_width = 720
-    screen_height = 500
-    screen = pygame.display.set_mode((screen_width, screen_height))
-    pygame.display.set_caption('R.U.D.I the ShopBot')
-
-    gates_width = 60
-    terminal_height = 40
-    num_of_tool_buttons_x = 3
-    button_panel_width = screen_width-gates_width
-    button_width = ((screen_width-gates_width)/num_of_tool_buttons_x)
-    button_height = (screen_height-terminal_height) / \
-                     (num_of_buttons/num_of_tool_buttons_x)
-    gate_width = gate_height = (screen_height-terminal_height)/num_of_gates
-
-    bg = '#16171d'
-    clicked = False
-
-class ButtonBase:
-    def __init__(self, x, y, name, width, height, screen):
+SCREEN_WIDTH = 720
+SCREEN_HEIGHT = 500
+GATES_WIDTH = 60
+TERMINAL_HEIGHT = 40
+NUM_OF_TOOL_BUTTONS_X = 3
+
+IDLE_TIMEOUT_MS = 100  # How long to wait for an event before re-checking device state
+MAX_CACHED_LABELS = 256  # Upper bound on cached label surfaces
+
+
+class Label_Cache:
+    '''Caches fonts, single glyphs and whole label surfaces so text is only rasterised once'''
+    def __init__(self, font_name=FONT_NAME, max_labels=MAX_CACHED_LABELS):
+        self.font_name = font_name
+        self.max_labels = max_labels
+        self.fonts = {}
+        self.labels = {}
+        self.glyphs = {}
+
+    def get_font(self, size):
+        font = self.fonts.get(size)
+        if font is None:
+            font = pygame.font.SysFont(self.font_name, size, bold=True)
+            self.fonts[size] = font
+        return font
+
+    def label(self, text, size, color=TEXT_COLOR):
+        '''Returns the rendered surface for a static label such as a tool or gate name'''
+        key = (text, size, color)
+        surface = self.labels.get(key)
+        if surface is None:
+            if len(self.labels) >= self.max_labels:
+                self.labels.pop(next(iter(self.labels)))  # Drop the oldest entry
+            surface = self.get_font(size).render(text, True, color)
+            self.labels[key] = surface
+        return surface
+
+    def glyph(self, char, size, color=TEXT_COLOR):
+        key = (char, size, color)
+        surface = self.glyphs.get(key)
+        if surface is None:
+            surface = self.get_font(size).render(char, True, color)
+            self.glyphs[key] = surface
+        return surface
+
+    def dynamic(self, text, size, color=TEXT_COLOR):
+        '''Composes frequently changing text (countdowns) from cached glyphs instead of re-rendering it'''
+        glyphs = [self.glyph(char, size, color) for char in text]
+        width = sum(glyph.get_width() for glyph in glyphs)
+        height = max((glyph.get_height() for glyph in glyphs), default=0)
+        surface = pygame.Surface((width, height), pygame.SRCALPHA)
+        x = 0
+        for glyph in glyphs:
+            surface.blit(glyph, (x, 0))
+            x += glyph.get_width()
+        return surface
+
+
+class ButtonBase(ABC):
+    font_size = FONT_SIZE_GATE
+
+    def __init__(self, x, y, name, label, width, height, screen, cache):
         self.x = x
         self.y = y
         self.name = name
+        self.label = label
         self.width = width
         self.height = height
         self.screen = screen
-        self.button_rect = pygame.Rect(x, y, width, height)
-        self.font_size = FONT_SIZE_TOOL if 'Tool' in self.__class__.__name__ else FONT_SIZE_GATE
-        self.font = pygame.font.SysFont(FONT_NAME, self.font_size, bold=True)
-
-    def draw_text(self, text, y_offset):
-        text_img = self.font.render(text, True, TEXT_COLOR)
+        self.cache = cache
+        self.rect = pygame.Rect(x, y, width, height)
+        self.button_rect = self.rect.inflate(-BUTTON_PADDING * 2, -BUTTON_PADDING * 2)
+        self.last_state = None
+
+    def invalidate(self):
+        '''Forces the next update to redraw this button'''
+        self.last_state = None
+
+    def update(self, state):
+        '''Redraws the button only if its visual state changed; returns the dirty rect or None'''
+        if state == self.last_state:
+            return None
+        self.last_state = state
+        self.screen.fill(BACKGROUND_COLOR, self.rect)
+        self.draw(*state)
+        return self.rect
+
+    def blit_centered(self, text_img, y_offset):
         text_len = text_img.get_width()
         self.screen.blit(text_img, (self.x + int(self.width / 2) - int(text_len / 2), self.y + y_offset))
 
+    @abstractmethod
+    def draw(self, *state):
+        '''Paints the button for the state tuple that update() was given'''
+
+
 class ToolButton(ButtonBase):
-    def draw(self, tool, hover):
-        if tool.status == 'on':
+    font_size = FONT_SIZE_TOOL
+
+    def state(self, tool, hover, now):
+        '''Builds the tuple that fully describes how this button looks right now'''
+        if tool.status == 'spindown':
+            spin_down_time = getattr(tool, 'spin_down_time', 0)
+            last_used = getattr(tool, 'last_used', now)
+            info = str(max(0.0, round(spin_down_time - (now - last_used), 1)))
+        else:
+            info = tool.status
+        return (tool.status, hover, info)
+
+    def draw(self, status, hover, info):
+        if status in ('on', 'override', 'starting'):
             color = ON_COLOR_HOVER if hover else ON_COLOR
-        elif tool.status == 'off':
+        elif status == 'off':
             color = OFF_COLOR_HOVER if hover else OFF_COLOR
-        elif tool.status == 'spindown':
+        elif status == 'spindown':
             color = SPINDOWN_COLOR_HOVER if hover else SPINDOWN_COLOR
+        else:
+            color = ERROR_COLOR_HOVER if hover else ERROR_COLOR
         pygame.draw.rect(self.screen, color, self.button_rect, border_radius=BUTTON_RADIUS)
-        self.draw_text(self.name, 5)
-        if tool.status == 'spindown':
-            info = str(round(tool.spin_down_time - (time.time() - tool.last_used), 1))
-        elif tool.status == 'on':
-            info = 'on'
+        self.blit_centered(self.cache.label(self.label, self.font_size), 5)
+        if status == 'spindown':
+            info_img = self.cache.dynamic(info, self.font_size)
         else:
-            info = 'off'
-        self.draw_text(info, self.font_size + 10)
+            info_img = self.cache.label(info, self.font_size)
+        self.blit_centered(info_img, self.font_size + 10)
+
 
 class GateButton(ButtonBase):
+    font_size = FONT_SIZE_GATE
+
+    def state(self, gate, hover, now):
+        return (gate.status, hover)
+
     def draw(self, status, hover):
         if status == 'open':
             color = ORANGE_HOVER if hover else ORANGE
@@ -92,240 +169,118 @@ class GateButton(ButtonBase):
         else:
             color = ERROR_COLOR_HOVER if hover else ERROR_COLOR
         pygame.draw.rect(self.screen, color, self.button_rect, border_radius=BUTTON_RADIUS)
-        self.draw_text(self.name, (self.height - self.font_size) // 2)
+        self.blit_centered(self.cache.label(self.label, self.font_size), (self.height - self.font_size) // 2)
 
-def create_buttons(tm, gm, screen):
-    num_of_tool_buttons_x = 3
+
+def create_buttons(tools, gate_manager, screen, cache):
     screen_width = screen.get_width()
     screen_height = screen.get_height()
-    gates_width = 60
-    terminal_height = 40
-    button_panel_width = screen_width - gates_width
-    button_width = (screen_width - gates_width) // num_of_tool_buttons_x
-    button_height = (screen_height - terminal_height) // (len(tm.tools) // num_of_tool_buttons_x)
-    gate_width = gate_height = (screen_height - terminal_height) // len(gm.gates)
-
-    gui_buttons = {
-        tool.name: ToolButton(
-            x=(index % num_of_tool_buttons_x) * button_width,
-            y=(index // num_of_tool_buttons_x) * button_height,
-            name=tool.name,
+    rows_of_tools = max(1, -(-len(tools) // NUM_OF_TOOL_BUTTONS_X))
+    button_width = (screen_width - GATES_WIDTH) // NUM_OF_TOOL_BUTTONS_X
+    button_height = (screen_height - TERMINAL_HEIGHT) // rows_of_tools
+    gate_height = (screen_height - TERMINAL_HEIGHT) // max(1, len(gate_manager.gates))
+
+    tool_buttons = {
+        tool.id: ToolButton(
+            x=(index % NUM_OF_TOOL_BUTTONS_X) * button_width,
+            y=(index // NUM_OF_TOOL_BUTTONS_X) * button_height,
+            name=tool.id,
+            label=tool.label,
             width=button_width,
             height=button_height,
-            screen=screen
+            screen=screen,
+            cache=cache
         )
-        for index, tool in enumerate(tm.tools.values())
+        for index, tool in enumerate(tools)
     }
 
     gate_buttons = {
-        gate.name: GateButton(
-            x=(index % num_of_tool_buttons_x) * gate_width + (screen_width - gates_width),
-            y=(index // num_of_tool_buttons_x) * gate_height,
-            name=gate.name,
-            width=gate_width,
+        name: GateButton(
+            x=screen_width - GATES_WIDTH,
+            y=index * gate_height,
+            name=name,
+            label=name,
+            width=GATES_WIDTH,
             height=gate_height,
-            screen=screen
+            screen=screen,
+            cache=cache
         )
-        for index, gate in enumerate(gm.gates.values())
+        for index, name in enumerate(gate_manager.gates)
     }
 
-    return gui_buttons, gate_buttons
+    return tool_buttons, gate_buttons
+
 
-def init_pygame(tm, gm):
+def init_pygame(tools, gate_manager):
     pygame.init()
-    screen_width = 720
-    screen_height = 500
-    screen = pygame.display.set_mode((screen_width, screen_height))
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
     pygame.display.set_caption('R.U.D.I the ShopBot')
-    gui_buttons, gate_buttons = create_buttons(tm, gm, screen)
-    return screen, gui_buttons, gate_buttons
-
-def draw_gui(screen, gui_buttons, gate_buttons, gm, tm):
-    screen.fill(BACKGROUND_COLOR)
-    for button in gui_buttons.values():
-        hover = button.button_rect.collidepoint(pygame.mouse.get_pos())
-        button.draw(tm.tools[button.name], hover)
+    pygame.event.set_allowed(None)
+    pygame.event.set_allowed([pygame.QUIT, pygame.MOUSEBUTTONDOWN, pygame.MOUSEMOTION, pygame.KEYDOWN,
+                              pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED])
+    cache = Label_Cache()
+    tool_buttons, gate_buttons = create_buttons(tools, gate_manager, screen, cache)
+    return screen, tool_buttons, gate_buttons
+
+
+def draw_gui(screen, tool_buttons, gate_buttons, tools_by_id, gate_manager, full_redraw=False):
+    '''Redraws only the buttons whose state changed and returns the list of dirty rects'''
+    if full_redraw:
+        screen.fill(BACKGROUND_COLOR)
+        for button in (*tool_buttons.values(), *gate_buttons.values()):
+            button.invalidate()
+
+    mouse_pos = pygame.mouse.get_pos()
+    now = time.time()
+    dirty_rects = []
+    for button in tool_buttons.values():
+        hover = button.rect.collidepoint(mouse_pos)
+        rect = button.update(button.state(tools_by_id[button.name], hover, now))
+        if rect is not None:
+            dirty_rects.append(rect)
     for gate_button in gate_buttons.values():
-        hover = gate_button.button_rect.collidepoint(pygame.mouse.get_pos())
-        gate_button.draw(gm.gates[gate_button.name].status, hover)
-    pygame.display.update()
-
-def handle_events(gui_buttons, gate_buttons, tm, gm):
+        hover = gate_button.rect.collidepoint(mouse_pos)
+        rect = gate_button.update(gate_button.state(gate_manager.gates[gate_button.name], hover, now))
+        if rect is not None:
+            dirty_rects.append(rect)
+
+    if full_redraw:
+        return [screen.get_rect()]
+    return dirty_rects
+
+
+def handle_event(event, tool_buttons, gate_buttons, tools_by_id, gate_manager):
+    '''Handles a single pygame event; returns (run, full_redraw)'''
+    if event.type == pygame.QUIT:
+        return False, False
+    if event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+        return True, True
+    if event.type == pygame.MOUSEBUTTONDOWN:
+        for button in tool_buttons.values():
+            if button.rect.collidepoint(event.pos):
+                tools_by_id[button.name].toggle_button()
+        for gate_button in gate_buttons.values():
+            if gate_button.rect.collidepoint(event.pos):
+                pass  # Handle gate button click if needed
+    return True, False
+
+
+def run_gui(tools, gate_manager):
+    '''Event driven GUI loop; sleeps in pygame.event.wait and only pushes dirty rects to the display'''
+    screen, tool_buttons, gate_buttons = init_pygame(tools, gate_manager)
+    tools_by_id = {tool.id: tool for tool in tools}
+    full_redraw = True
     run = True
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            run = False
-        elif event.type == pygame.KEYDOWN:
-            pass  # keyboard_manager(event.key) can be handled if needed
-        elif event.type == pygame.MOUSEBUTTONDOWN:
-            for button in gui_buttons.values():
-                if button.button_rect.collidepoint(event.pos):
-                    selected_tool = tm.tools[button.name]
-                    if selected_tool.status == 'on':
-                        selected_tool.override = False
-                        selected_tool.spindown()
-                    else:
-                        selected_tool.override = True
-                        selected_tool.turn_on()
-            for gate_button in gate_buttons.values():
-                if gate_button.button_rect.collidepoint(event.pos):
-                    pass  # Handle gate button click if needed
-    return run
-
-
-class Button_PG_gate():
-    padding = 4
-    radius = 7
-    off_col = '#19d1e5'
-    off_col_h = '#29e1e6'
-    on_col = '#81f900'
-    on_col_h = '#82f102'
-    error_col = '#ff3f4f'
-    error_col_h = '#ff4050'
-    text_col = '#16171d'
-    width = gate_width
-    height = gate_height
-    font_size = 16
-    font = pygame.font.SysFont('meslolgsnf', font_size, bold=True)
-
-    def __init__(self, x, y, name):
-        self.x = x
-        self.y = y
-        self.name = name
-        self.button_rect = Rect(self.x+self.padding, self.y+self.padding,
-                                self.width-(self.padding*2), self.height-(self.padding*2))
-
-    def open(self):
-        pygame.draw.rect(screen, self.on_col, self.button_rect,
-                         border_radius=self.radius)
-
-    def open_h(self):
-        pygame.draw.rect(screen, self.on_col_h,
-                         self.button_rect, border_radius=self.radius)
-
-    def closed(self):
-        pygame.draw.rect(screen, self.off_col, self.button_rect,
-                         border_radius=self.radius)
-
-    def closed_h(self):
-        pygame.draw.rect(screen, self.off_col_h,
-                         self.button_rect, border_radius=self.radius)
-
-    def error(self):
-        pygame.draw.rect(screen, self.error_col, self.button_rect,
-                         border_radius=self.radius)
-
-    def error_h(self):
-        pygame.draw.rect(screen, self.error_col_h,
-                         self.button_rect, border_radius=self.radius)
-
-    def draw_button(self):
-        global clicked
-        action = False
-        selected_gate = gm.gates[self.name] #select the gate associated with the button
-
-        # get mouse position
-        pos = pygame.mouse.get_pos()
-
-        # create pygame Rect object for the button
-
-        # check mouseover and clicked conditions
-        if self.button_rect.collidepoint(pos):  # mouse if over the button
-            # mouse is pressed but not released
-            if pygame.mouse.get_pressed()[0] == 1:
-                clicked = True
-                if selected_gate.status == 1:
-                    self.closed_h()
-                elif selected_gate.status == 0:
-                    self.open_h()
-                elif selected_gate.status == -1:
-                    self.error_h()
-            # mouse was just released
-            elif pygame.mouse.get_pressed()[0] == 0 and clicked == True:
-                if selected_gate.status == 1:
-                    # open the info window HERE
-                    info_window.status = True 
-                    info_window.gate = self
-                    pass
-
-                clicked = False
-                action = True
-            else:  # mouse is just over without click
-                if selected_gate.status == 1:
-                    self.open_h()
-                elif selected_gate.status == 0:
-                    self.closed_h()
-                elif selected_gate.status == -1:
-                    self.error_h()
-
-        else:  # mouse is not over button
-            if selected_gate.status == 1:
-                self.closed()
-            elif selected_gate.status == 0:
-                self.open()
-            elif selected_gate.status == -1:
-                self.error()
-
-        # add text to button
-        text_img = self.font.render(self.name, True, self.text_col)
-        text_len = text_img.get_width()
-
-        screen.blit(text_img, (self.x + int(self.width / 2) -
-                    int(text_len / 2), self.y + ((self.font_size/2) + 2)))
-
-
-        return action
-
-
-
-
-
-class Error(): # also know as Uniblab
-    def __init__(self, name, time_stamp, error):
-        self.object =  name
-        self.time_stamp = time_stamp
-        self.error = error
-
-
-def create_tool_gui_buttons():
-    x = 0
-    y = 0
-    gui_buttons = {}
-    for tool in tm.tools:
-        current_tool = tm.tools[tool]
-        gui_buttons[current_tool.name] = Button_PG_tool(x,y,current_tool.name)
-        x = x + button_width
-        if x >= button_panel_width:
-            x = 0
-            y = y + button_height
-
-    return gui_buttons
-
-
-def create_gate_gui_buttons():
-    x = 0 + (screen_width - gates_width) + (gates_width/2)-(gate_width/2)
-    y = 0
-    gate_buttons = {}
-    for gate in gm.gates:
-        gate_buttons[gate] = Button_PG_gate(x,y,gate)
-        x = x + gate_width
-        if x >= button_panel_width:
-            x = 0 + (screen_width - gates_width) + (gates_width/2)-(gate_width/2)
-            y = y + gate_height
-
-    return gate_buttons
-
-'''this runs pygame and draws all the buttons on every cycle'''
-            screen.fill(bg)
-            for button in gui_buttons:
-                if gui_buttons[button].draw_button():
-                    pass
-            for gate in gate_buttons: 
-                if gate_buttons[gate].draw_button():
-                    pass
-            for event in pygame.event.get():
-                if event.type == pygame.KEYDOWN:
-                    keyboard_manager(event.key)
-                elif event.type == pygame.QUIT:
-                    run = False        
-            pygame.display.update()
\ No newline at end of file
+    while run:
+        dirty_rects = draw_gui(screen, tool_buttons, gate_buttons, tools_by_id, gate_manager, full_redraw)
+        full_redraw = False
+        if dirty_rects:
+            pygame.display.update(dirty_rects)
+
+        event = pygame.event.wait(IDLE_TIMEOUT_MS)
+        while event.type != pygame.NOEVENT and run:
+            run, redraw = handle_event(event, tool_buttons, gate_buttons, tools_by_id, gate_manager)
+            full_redraw = full_redraw or redraw
+            event = pygame.event.poll()
+
+    pygame.quit()
@@ -0,0 +1,92 @@
+# Runs on a satellite Pi: drives the buttons, voltage sensors and servo boards for one
+# location and talks to main.py over the network instead of over a long I2C run.
+#
+#   python satellite.py <node id> <master host>
+#
+# The node uses the same config.json as the master; boards with "node": "<node id>" are
+# initialized here and every tool wired only to those boards runs here. The master listens on
+# "satellites": {"host": ...}, which has to be an address the nodes can reach, and only lets in
+# nodes that know the same "secret".
+import os
+import sys
+import json
+import time
+import logging
+from devices.poll_buttons import Poll_Buttons
+from devices.tool import Tool
+from devices.satellite import Satellite_Node, tool_node, DEFAULT_PORT
+from utils.style_manager import Style_Manager
+from utils.log_manager import setup_logging, stop_logging
+from boards import registry as board_registry
+from boards.board_health import monitor, probe_address
+from boards.bus_manager import Bus_Manager, DEFAULT_BUS
+
+setup_logging(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+if len(sys.argv) < 3:
+    print("Usage: python satellite.py <node id> <master host>")
+    sys.exit(1)
+node_id, master_host = sys.argv[1], sys.argv[2]
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+with open(os.path.join(base_dir, 'config.json'), 'r') as config_file:
+    config = json.load(config_file)
+styles = Style_Manager().get_styles()
+
+board_nodes = {board_config['id']: board_config['node'] for board_config in config.get('boards', []) if board_config.get('node')}
+bus_manager = Bus_Manager(config.get('buses', []))
+
+# Initialize this node's boards
+boards = {}
+for board_config in config.get('boards', []):
+    if board_nodes.get(board_config['id']) != node_id:
+        continue
+    bus = bus_manager.get(board_config.get('bus', DEFAULT_BUS))
+    try:
+        board = board_registry.create(board_config['type'], bus, board_config)  # Imports the driver on first use
+        if board is None:
+            logger.error(f"💢 Board type {board_config['type']} is not supported on a satellite")
+            continue
+        boards[board_config['id']] = board
+        monitor.watch(board_config['id'], lambda bus=bus, address=int(board_config['i2c_address'], 16): probe_address(bus, address))
+    except Exception as e:
+        logger.error(f"💢 Failed to initialize board {board_config.get('label', board_config['id'])}: {e}")
+monitor.start()
+
+# Initialize the tools that live on this node
+tools = []
+for tool_config in config.get('tools', []):
+    if tool_node(tool_config, board_nodes) != node_id:
+        continue
+    try:
+        mcp = boards.get(tool_config.get('button', {}).get('connection', {}).get('board'))
+        pca_led = boards.get(tool_config.get('button', {}).get('led', {}).get('connection', {}).get('board'))
+        ads = boards.get(tool_config.get('volt', {}).get('connection', {}).get('board'))
+        tool = Tool(tool_config, mcp, pca_led, ads, None, styles, bus_manager.get(DEFAULT_BUS), boards)
+        if tool.button or tool.voltage_sensor:
+            tools.append(tool)
+    except Exception as e:
+        logger.error(f"💢 Failed to initialize tool {tool_config['label']}: {e}")
+
+poller = Poll_Buttons([tool.button for tool in tools if tool.button is not None], styles['RGBLED_button_styles'])
+poller.start_polling()
+
+satellite_config = config.get('satellites', {})
+node = Satellite_Node(node_id, master_host, satellite_config.get('port', DEFAULT_PORT), tools, boards, satellite_config.get('secret', ''))
+node.start()
+logger.info(f"     🔮 🛰 Satellite {node_id} running {len(tools)} tools on {len(boards)} boards")
+
+try:
+    while True:
+        time.sleep(1)
+except KeyboardInterrupt:
+    logger.info("Program interrupted by user")
+    node.stop()
+    poller.stop()
+    for tool in tools:
+        if tool.voltage_sensor is not None:
+            tool.voltage_sensor.stop()
+    bus_manager.shutdown()
+    monitor.stop()
+    stop_logging()
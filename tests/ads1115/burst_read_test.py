@@ -0,0 +1,47 @@
+# Reads several bursts through voltage_sensor.read_burst from a simulated ADS1115, back to back
+# and with a single-shot reader sharing the chip in between; no hardware needed.
+#
+#   python -m tests.ads1115.burst_read_test
+import logging
+import statistics
+import adafruit_ads1x15.ads1115 as ADS
+from adafruit_ads1x15.ads1x15 import Mode
+from adafruit_ads1x15.analog_in import AnalogIn
+from devices.mains_detector import mains_energy
+from devices.voltage_sensor import read_burst
+from tests.scale.sim_boards import Sim_I2C, Sim_ADS1115
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BURSTS = 4
+
+i2c = Sim_I2C('bus', clock=0)
+chip = i2c.add(0x48, Sim_ADS1115())
+chip.running.add(0)  # Mains hum on AIN0, quiet on AIN1
+ads = ADS.ADS1115(i2c, address=0x48)
+hum, quiet = AnalogIn(ads, ADS.P0), AnalogIn(ads, ADS.P1)
+mode, data_rate = ads.mode, ads.data_rate
+
+
+def check_burst(burst):
+    samples, rate = read_burst(ads, hum)
+    distinct = len(set(samples))
+    logger.info(f"Burst {burst}: {len(samples)} samples at {rate:.0f}/s, {distinct} distinct, spread {statistics.pstdev(samples):.0f}, "
+                f"mains energy {mains_energy(samples, rate):.3f}")
+    assert distinct > len(samples) // 2, f"burst {burst} is flat ({samples[:4]}...); the fast reads are not on the conversion register"
+    assert ads.mode == mode and ads.data_rate == data_rate, "burst left the chip in another mode"
+
+
+# Back to back on one input, as a mains-mode sensor or a panel monitor reads
+for burst in range(BURSTS):
+    check_burst(burst)
+
+# With a single-shot reader of another input on the same chip in between
+for burst in range(BURSTS, 2 * BURSTS):
+    check_burst(burst)
+    volts = quiet.voltage
+    assert abs(volts - chip.offset) < 0.05, f"single-shot read after burst {burst} gave {volts} V"
+
+assert (chip.registers[1] >> 8) & 1 == Mode.SINGLE >> 8, "chip was left converting continuously"
+print("Burst read test passed")
@@ -0,0 +1,103 @@
+# Runs a Panel_Monitor against a simulated ADS1115 carrying two tools' currents: it learns each
+# tool while it has a sensor of its own, then switches them from the panel alone; no hardware needed.
+#
+#   python -m tests.ads1115.panel_monitor_test
+import math
+import os
+import random
+import tempfile
+import time
+import logging
+import adafruit_ads1x15.ads1115 as ADS
+import devices.disaggregator as disaggregator
+from devices.disaggregator import Panel_Monitor
+from tests.scale.sim_boards import Sim_I2C, Sim_ADS1115, ADS_FULL_SCALE, MAINS_FREQUENCY
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Peak volts at the fundamental and its 3rd harmonic; the saw's motor is rich in the 3rd
+LOADS = {'table_saw': (0.5, 0.15), 'shop_vac': (0.35, 0.0)}
+
+
+class Panel_ADS1115(Sim_ADS1115):
+    '''AIN0 carries the sum of whichever loads are running'''
+    def __init__(self):
+        super().__init__()
+        self.loads = set()
+
+    def signal(self, channel):
+        now = time.monotonic()
+        volts = self.offset + random.gauss(0, self.noise)
+        for load in self.loads:
+            fundamental, third = LOADS[load]
+            volts += fundamental * math.sin(2 * math.pi * MAINS_FREQUENCY * now)
+            volts += third * math.sin(2 * math.pi * 3 * MAINS_FREQUENCY * now + 0.5)
+        return max(-32768, min(32767, int(volts / ADS_FULL_SCALE * 32767))) & 0xFFFF
+
+
+class Teacher_Tool:
+    def __init__(self, tool_id):
+        self.id = tool_id
+        self.status_listeners = []
+
+    def add_status_listener(self, callback):
+        self.status_listeners.append(callback)
+
+    def set_status(self, status):
+        for callback in self.status_listeners:
+            callback(self, status)
+
+
+class Inferred_Tool:
+    def __init__(self, tool_id):
+        self.id = tool_id
+        self.status = 'off'
+
+    def update_status_from_voltage(self, status):
+        self.status = status
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.05)
+    return True
+
+
+disaggregator.SIGNATURES_FILE = os.path.join(tempfile.mkdtemp(), 'panel_signatures.json')
+i2c = Sim_I2C('bus', clock=0)
+chip = i2c.add(0x48, Panel_ADS1115())
+panel = Panel_Monitor({'id': 'panel', 'connection': {'board': 'panel_ads', 'pins': [0]}}, ADS.ADS1115(i2c, address=0x48))
+teachers = {tool_id: Teacher_Tool(tool_id) for tool_id in LOADS}
+for teacher in teachers.values():
+    panel.attach_teacher(teacher)
+panel.start()
+time.sleep(1)  # A steady level to step from
+
+# Each tool has its own sensor for now; a start and a stop teach the panel its signature
+for tool_id in LOADS:
+    for status in ('on', 'off'):
+        samples = panel.signatures.get(tool_id, {}).get('samples', 0)
+        teachers[tool_id].set_status(status)
+        (chip.loads.add if status == 'on' else chip.loads.discard)(tool_id)
+        assert wait_for(lambda: panel.signatures.get(tool_id, {}).get('samples', 0) > samples), f"{tool_id} {status} step was not learned"
+    logger.info(f"Learned {tool_id}: {panel.signatures[tool_id]['features']}")
+
+# Sensors removed: the panel alone switches the tools
+inferred = {tool_id: Inferred_Tool(tool_id) for tool_id in LOADS}
+for tool in inferred.values():
+    panel.attach_inferred(tool)
+for tool_id, tool in inferred.items():
+    chip.loads.add(tool_id)
+    assert wait_for(lambda: tool.status == 'on'), f"{tool_id} start was not recognised"
+    assert all(other.status == 'off' for other in inferred.values() if other is not tool), "the wrong tool was switched on"
+    chip.loads.discard(tool_id)
+    assert wait_for(lambda: tool.status == 'off'), f"{tool_id} stop was not recognised"
+    logger.info(f"{tool_id} switched on and off from the panel")
+
+panel.stop()
+assert panel.matched.value == 2 * len(LOADS), f"{panel.matched.value} matched steps"
+print("Panel monitor test passed")
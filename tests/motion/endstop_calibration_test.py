@@ -0,0 +1,77 @@
+# Sweeps simulated servos against fixed stops and stores what was found the way
+# gate_setter.py --auto does; no hardware needed.
+#
+#   python -m tests.motion.endstop_calibration_test
+import logging
+from devices.endstop_calibration import Endstop_Calibrator
+from gate_setter import Gate, apply_endstops
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+STOPS = (35, 165)  # Where every simulated blade meets its mechanical stops
+FREE_CURRENT = 0.2
+STALL_CURRENT = 2.0
+
+
+class Simulated_Channel:
+    def __init__(self):
+        self.duty_cycle = 0
+
+
+class Simulated_Board:
+    def __init__(self):
+        self.channels = [Simulated_Channel() for _ in range(16)]
+
+
+class Simulated_Sense:
+    '''Rail current for one servo: a steady draw while it moves freely, a stall past either stop'''
+    def __init__(self, gate):
+        self.channel = gate.board.channels[gate.pin]
+        self.angles = {gate.angle_to_pwm(angle): angle for angle in range(181)}
+
+    def zero_now(self):
+        pass
+
+    def amps(self):
+        angle = self.angles.get(self.channel.duty_cycle)
+        if angle is None:
+            return 0.0
+        return FREE_CURRENT if STOPS[0] <= angle <= STOPS[1] else STALL_CURRENT
+
+
+class Simulated_Gate_Manager:
+    def __init__(self, gates):
+        self.gates = {gate.name: gate for gate in gates}
+        self.saved = 0
+
+    def save_gates(self):
+        self.saved += 1
+
+    def flush(self):
+        pass
+
+
+board = Simulated_Board()
+gates = [
+    Gate('Normal', {'io_location': {'board': 'servo', 'pin': 0}, 'min': 40, 'max': 160, 'status': 'closed'}, {'servo': board}),
+    Gate('Reversed', {'io_location': {'board': 'servo', 'pin': 1}, 'min': 160, 'max': 40, 'status': 'closed'}, {'servo': board}),
+]
+gate_manager = Simulated_Gate_Manager(gates)
+
+# One rail per gate, so both sweep at once
+sensors = {gate.name: Simulated_Sense(gate) for gate in gates}
+results = Endstop_Calibrator(sensors, {'calibration_step_time': 0.001}).run({gate.name: [gate] for gate in gates})
+for gate in gates:
+    low, high = results[gate.name]
+    assert low is not None and STOPS[0] < low < STOPS[0] + 10, f"{gate.name}: low stop found at {low}"
+    assert high is not None and STOPS[1] - 10 < high < STOPS[1], f"{gate.name}: high stop found at {high}"
+
+apply_endstops(gate_manager, results)
+normal, reversed_gate = gates
+assert (normal.min_angle, normal.max_angle) == results['Normal'], f"Normal gate stored {normal.min_angle}-{normal.max_angle}"
+assert (reversed_gate.min_angle, reversed_gate.max_angle) == results['Reversed'][::-1], \
+    f"Reversed gate lost its orientation: stored {reversed_gate.min_angle}-{reversed_gate.max_angle}"
+assert gate_manager.saved == 1
+logger.info(f"Normal gate: {normal.min_angle}-{normal.max_angle}, reversed gate: {reversed_gate.min_angle}-{reversed_gate.max_angle}")
+print("Endstop calibration test passed")
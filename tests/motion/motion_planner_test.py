@@ -0,0 +1,59 @@
+# Drives Motion_Planner.execute against fake gates whose bus worker is busy; no hardware needed.
+#
+#   python -m tests.motion.motion_planner_test
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from devices.motion_planner import Motion_Planner, Move
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class Simulated_Board:
+    def __init__(self, bus_worker):
+        self.bus_worker = bus_worker
+        self.power_rail = 'rail'
+        self.writes = []
+
+
+class Simulated_Gate:
+    def __init__(self, name, board):
+        self.name = name
+        self.board = board
+        self.angle = 40
+
+    def move_to(self, angle):
+        self.board.writes.append((self.name, angle))
+        self.angle = angle
+
+    def stop_servo(self):
+        self.board.writes.append((self.name, 'stop'))
+
+
+worker = ThreadPoolExecutor(max_workers=1)
+board = Simulated_Board(worker)
+gates = [Simulated_Gate(f"gate{index}", board) for index in range(3)]
+
+# With no ramp the first step is the whole move; while the worker is still busy it has not
+# run when the planner looks at the move again in the same tick
+planner = Motion_Planner({'ramp_time': 0, 'settle_time': 0.1})
+worker.submit(time.sleep, 0.2)
+completed = []
+planner.execute([Move(gate, 140, 'open') for gate in gates], on_complete=lambda move, elapsed: completed.append(move.gate.name))
+assert sorted(completed) == ['gate0', 'gate1', 'gate2'], completed
+for gate in gates:
+    assert gate.angle == 140, (gate.name, gate.angle)
+    assert (gate.name, 'stop') in board.writes, f"{gate.name} was never released"
+logger.info(f"ramp_time 0 with a busy worker: {len(board.writes)} writes, all gates at 140")
+
+# A ramped move still gets intermediate angles
+board.writes.clear()
+planner = Motion_Planner({'ramp_time': 0.1, 'settle_time': 0.05, 'profile': 'linear'})
+planner.execute([Move(gates[0], 40, 'closed')])
+angles = [angle for name, angle in board.writes if angle != 'stop']
+assert angles[-1] == 40 and len(angles) > 2, angles
+logger.info(f"ramped move: {len(angles)} steps")
+
+worker.shutdown()
+print("Motion planner test passed")
@@ -0,0 +1,124 @@
+# Runs a master and two simulated satellite nodes over loopback; no hardware needed.
+#
+#   python -m tests.satellite.satellite_loopback_test
+import time
+import logging
+import devices.satellite as satellite
+from devices.satellite import Satellite_Server, Satellite_Node
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class Simulated_Tool:
+    def __init__(self, tool_id):
+        self.id = tool_id
+        self.status = 'off'
+        self.status_listeners = []
+
+    def add_status_listener(self, callback):
+        self.status_listeners.append(callback)
+
+    def press(self):
+        self.status = 'on' if self.status == 'off' else 'off'
+        for callback in self.status_listeners:
+            callback(self, self.status)
+
+
+class Simulated_Board:
+    def __init__(self):
+        self.writes = []
+
+    def set_pwm_value(self, channel, value):
+        self.writes.append((channel, value))
+
+
+class Failing_Board(Simulated_Board):
+    def set_pwm_value(self, channel, value):
+        self.writes.append((channel, value))
+        raise OSError(121, "Remote I/O error")
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+# Shorter than the shop's, so a silent node is dropped within the test's waits
+satellite.HEARTBEAT_INTERVAL = 0.5
+satellite.NODE_TIMEOUT = 1.5
+
+SECRET = 'sawdust'
+
+server = Satellite_Server(host='127.0.0.1', port=0, secret=SECRET)
+server.start()
+nodes = {}
+for node_id, tool_id, board_id in (('island', 'table_saw', 'island_pwm_servo'), ('everest', 'planer', 'everest_pwm_servo')):
+    remote_tool = server.remote_tool({'id': tool_id, 'label': tool_id}, node_id)
+    remote_board = server.remote_board(node_id, {'id': board_id})
+    tool, board = Simulated_Tool(tool_id), Simulated_Board()
+    node = Satellite_Node(node_id, '127.0.0.1', server.port, [tool], {board_id: board}, secret=SECRET)
+    node.start()
+    nodes[node_id] = (remote_tool, remote_board, tool, board, node)
+
+for node_id, (remote_tool, remote_board, tool, board, node) in nodes.items():
+    assert wait_for(lambda: server.is_connected(node_id)), f"{node_id} never connected"
+
+    start = time.perf_counter()
+    tool.press()
+    assert wait_for(lambda: remote_tool.status == 'on'), f"{node_id} tool status never arrived"
+    logger.info(f"{node_id}: tool event reached the master in {(time.perf_counter() - start) * 1000:.2f} ms")
+
+    start = time.perf_counter()
+    remote_board.set_servo_angle(3, 90)
+    assert wait_for(lambda: len(board.writes) == 1), f"{node_id} PWM command never arrived"
+    logger.info(f"{node_id}: PWM command {board.writes[0]} reached the node in {(time.perf_counter() - start) * 1000:.2f} ms")
+
+# A node with the wrong secret is never let in
+intruder = Satellite_Node('intruder', '127.0.0.1', server.port, [Simulated_Tool('lathe')], secret='guess')
+intruder.start()
+time.sleep(1)
+assert not server.is_connected('intruder'), "node with the wrong secret was accepted"
+intruder.stop()
+logger.info("intruder: refused for the wrong secret")
+
+# Steady master -> node traffic must not starve the node's heartbeats
+remote_tool, remote_board, tool, board, node = nodes['island']
+deadline = time.monotonic() + 2 * satellite.NODE_TIMEOUT
+while time.monotonic() < deadline:
+    remote_board.set_pwm_value(4, 400)
+    time.sleep(0.1)
+assert server.is_connected('island'), "node dropped while the master kept it busy"
+logger.info("island: heartbeats kept flowing under steady PWM traffic")
+
+# A node whose board stops answering keeps its link; the write goes to the board's health instead
+remote_tool, remote_board, tool, board, node = nodes['island']
+node.boards['island_pwm_servo'] = failing = Failing_Board()
+remote_board.set_pwm_value(1, 100)
+assert wait_for(lambda: len(failing.writes) == 1), "PWM command never reached the failing board"
+failing.set_pwm_value = board.set_pwm_value
+remote_board.set_pwm_value(2, 200)
+assert wait_for(lambda: board.writes[-1] == (2, 200)), "link dropped after a failed board write"
+assert server.is_connected('island')
+logger.info("island: failed board write was reported without dropping the link")
+
+# Dropping a node makes its boards fail like an unplugged I2C device, and switches its tools off
+remote_tool, remote_board, _, _, node = nodes['everest']
+assert remote_tool.status == 'on'
+node.stop()
+assert wait_for(lambda: not server.is_connected('everest'))
+assert wait_for(lambda: remote_tool.status == 'off'), "tool of a dropped node kept its last status"
+logger.info("everest: tool switched off when its node went away")
+try:
+    remote_board.set_pwm_value(0, 0)
+    raise AssertionError("write to a disconnected node should fail")
+except OSError as e:
+    logger.info(f"everest: write after disconnect failed as expected: {e}")
+
+nodes['island'][4].stop()
+server.stop()
+print("Loopback test passed")
@@ -0,0 +1,457 @@
+# Synthesizes shops far bigger than config.json and runs the controller's own components
+# against simulated boards, to see which part of the design gives out first. No hardware needed.
+#
+#   python -m tests.scale.scale_test                      default sizes, 20 s of usage each
+#   python -m tests.scale.scale_test 16 64 256 --duration 30
+#   python -m tests.scale.scale_test 128 --write /tmp/shop   also dump the generated config.json and gates.json
+#
+# Each size runs in a child process so thread counts and peak memory are its own.
+import json
+import logging
+import math
+import os
+import queue
+import random
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from tests.scale.sim_boards import BUS_CLOCK, install_gpio
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEFAULT_SIZES = (16, 48, 128)  # Tools per synthetic shop
+DEFAULT_DURATION = 20.0  # Seconds of randomized usage per size
+TOOLS_PER_BUS = 16  # Four ADS1115 addresses per bus give four inputs each
+TOOLS_PER_BRANCH = 4  # Tools sharing a branch gate
+TOOLS_PER_COLLECTOR = 64
+STARTS_PER_TOOL = 0.02  # Tool starts per tool per second (a 50 tool shop starts one a second)
+RUN_TIME = (2.0, 8.0)  # Seconds a started tool runs
+PRESS_TIME = 0.3  # Seconds a simulated button is held down
+MISSED_AFTER = 10.0  # Seconds before a start whose gate never moved counts as missed
+TICK = 0.05
+
+# Where each component counts as broken; the report names the smallest shop that crosses each line
+LIMITS = (
+    ('button_gate_p95', 1.0, 'button press to gate p95 over 1 s'),
+    ('sensor_gate_p95', 3.0, 'sensor start to gate p95 over 3 s'),
+    ('missed', 0, 'starts whose gate never moved'),
+    ('poll_cycle_mean', 0.1, 'button scan longer than its 0.1 s pause'),
+    ('sensor_period_mean', 0.2, 'sensor loops below 5 Hz'),
+    ('set_gates_p95', 2.0, 'set_gates p95 over 2 s'),
+    ('bus_utilisation', 0.7, 'a bus over 70 % busy'),
+    ('cpu_percent', 80.0, 'over 80 % of one core'),
+)
+
+
+def address_pool():
+    '''Free addresses on one bus, PCA9685 range first; ADS1115s take 0x48-0x4B and MCP23017s 0x20-0x27 separately'''
+    return [address for address in range(0x40, 0x80) if not 0x48 <= address <= 0x4B and address != 0x70]  # 0x70 is the PCA9685 all-call
+
+
+def generate(tool_count, tools_per_bus=TOOLS_PER_BUS, collector_count=None):
+    '''Builds (config, gates) dicts in the shape of config.json and gates.json for a shop of tool_count tools.
+
+    Tools are split into zones of tools_per_bus, one I2C bus each. Every tool gets a
+    button with an RGB LED, a voltage sensor while its zone has ADS1115 inputs left,
+    its own gate, a branch gate shared with its neighbours and its zone's main gate.
+    '''
+    if collector_count is None:
+        collector_count = max(1, math.ceil(tool_count / TOOLS_PER_COLLECTOR))
+    config = {'info': [{'name': f"synthetic shop of {tool_count} tools"}], 'motion': {}, 'buses': [], 'boards': [], 'tools': []}
+    gates = {}
+    for zone in range(math.ceil(tool_count / tools_per_bus)):
+        bus_id = f"zone{zone}"
+        config['buses'].append({'id': bus_id, 'type': 'i2c', 'number': zone + 1, 'label': f"Zone {zone} bus"})
+        pool = address_pool()
+        zone_tools = range(zone * tools_per_bus, min(tool_count, (zone + 1) * tools_per_bus))
+        mcp = led = ads = servo = None
+        zone_gate = f"Zone_{zone}"
+        servo_gates = []
+
+        def board(board_type, name, address, purpose, **extra):
+            board_config = {'type': board_type, 'id': f"{bus_id}_{name}", 'label': f"{name} - Zone {zone}", 'location': f"Zone {zone}",
+                            'bus': bus_id, 'i2c_address': hex(address), 'purpose': purpose}
+            board_config.update(extra)
+            config['boards'].append(board_config)
+            return board_config['id']
+
+        def gate(name):
+            nonlocal servo
+            if len(servo_gates) % 16 == 0:
+                servo = board('PCA9685', f"pwm_servo_{len(servo_gates) // 16}", pool.pop(), 'Servo Control', frequency=50)
+            gates[name] = {'physical_location': f"Zone {zone}", 'status': 'closed',
+                           'io_location': {'board': servo, 'pin': len(servo_gates) % 16}, 'min': 40, 'max': 140}
+            servo_gates.append(name)
+
+        gate(zone_gate)
+        for slot, index in enumerate(zone_tools):
+            if slot % 16 == 0:
+                mcp = board('MCP23017', f"gpio_expander_{slot // 16}", 0x20 + slot // 16, 'Button Management')
+            if slot % 5 == 0:
+                led = board('PCA9685', f"pwm_led_{slot // 5}", pool.pop(0), 'LED Control', frequency=1000)
+            if slot % 4 == 0 and slot < 16:
+                ads = board('ADS1115', f"ad_converter_{slot // 4}", 0x48 + slot // 4, 'Voltage Sensing')
+            branch_gate = f"Branch_{zone}_{slot // TOOLS_PER_BRANCH}"
+            if slot % TOOLS_PER_BRANCH == 0:
+                gate(branch_gate)
+            tool_gate = f"Tool_{index:03d}"
+            gate(tool_gate)
+            label = f"Tool {index:03d}"
+            tool_config = {
+                'type': 'tool', 'label': label, 'id': f"tool_{index:03d}", 'status': 'off',
+                'preferences': {'use_collector': True, 'gate_prefs': [tool_gate, branch_gate, zone_gate], 'last_used': 0, 'spin_down_time': 2},
+                'button': {'label': f"{label} Button", 'id': f"tool_{index:03d}_button", 'type': 'RGBLED_Button',
+                           'connection': {'board': mcp, 'pins': [slot % 16]},
+                           'led': {'label': f"{label} LED", 'id': f"tool_{index:03d}_button_LED", 'type': 'RGBLED',
+                                   'connection': {'board': led, 'pins': [3 * (slot % 5) + color for color in range(3)]}}},
+                'volt': {},
+                'keyboard_key': 0,
+                'physical_location': f"Zone {zone}",
+            }
+            if slot < 16:
+                tool_config['volt'] = {'label': f"VS for {label}", 'type': 'ADS1115', 'version': '20 amp',
+                                       'connection': {'board': ads, 'pins': [slot % 4]}, 'deviation': '1.04'}
+            config['tools'].append(tool_config)
+    for index in range(collector_count):
+        config['tools'].append({
+            'type': 'tool', 'label': f"Collector {index}", 'id': f"collector_{index}", 'status': 'off',
+            'preferences': {'spin_up_delay': 10, 'minimum_up_time': 10, 'cool_down_time': 30},
+            'relay': {'label': f"Collector {index} Relay", 'id': f"collector_{index}_relay", 'type': 'collector_relay',
+                      'connection': {'board': 'pi_gpio', 'pins': [21 + index]}},
+        })
+    return config, {'gates': gates}
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def histogram_mean(metric, prefix=''):
+    '''Mean of every observation in a registry histogram, across the children whose label starts with prefix'''
+    total = count = 0.0
+    for key, child in list(metric.children.items()):
+        if key and not key[0].startswith(prefix):
+            continue
+        with child.lock:
+            total += child.sum
+            count += sum(child.counts)
+    return total / count if count else None
+
+
+def thread_group(thread):
+    '''"Thread-12 (monitor_appliance)" -> "monitor_appliance", "bus-zone3_0" -> "bus-zone", "Thread-40" -> "Thread"'''
+    match = re.search(r'\((\w+)\)$', thread.name)
+    return match.group(1) if match else re.sub(r'[-\d_]+$', '', thread.name) or thread.name
+
+
+def thread_cpu():
+    '''CPU seconds used so far by each live thread, from /proc; {native id: (group, seconds)}'''
+    ticks = os.sysconf('SC_CLK_TCK')
+    cpu = {}
+    for thread in threading.enumerate():
+        try:
+            with open(f"/proc/self/task/{thread.native_id}/stat") as stat_file:
+                fields = stat_file.read().rsplit(')', 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        cpu[thread.native_id] = (thread_group(thread), (int(fields[11]) + int(fields[12])) / ticks)  # utime, stime
+    return cpu
+
+
+class Shop:
+    '''One synthetic shop wired the way main.py wires the real one, on simulated buses'''
+    def __init__(self, config, gates, work_dir, clock):
+        from boards import registry as board_registry
+        from boards.bus_manager import Bus_Manager
+        from devices.tool import Tool
+        from devices.gate_manager import Gate_Manager
+        from devices.dust_collector import Dust_Collector
+        from devices.poll_buttons import Poll_Buttons
+        from utils.style_manager import Style_Manager
+        from tests.scale.sim_boards import Sim_I2C, Sim_MCP23017, Sim_PCA9685, Sim_ADS1115
+
+        class Sim_Collector(Dust_Collector):
+            def setup_relay(self, collector_config):
+                self.gpio_pin = None  # The relay drives nothing here
+
+        self.main_queue = queue.SimpleQueue()
+        self.pending = {}  # tool id -> (kind, monotonic time the start was simulated)
+        self.latencies = {'button': [], 'sensor': []}
+        self.starts = 0
+        self.missed = 0
+        self.set_gates_times = []
+        self.pending_lock = threading.Lock()
+        self.bus_manager = Bus_Manager(config['buses'])
+        self.buses = {}
+        for bus_config in config['buses']:
+            self.buses[bus_config['id']] = self.bus_manager.buses[bus_config['id']] = Sim_I2C(bus_config['id'], clock)
+
+        self.chips = {}
+        self.boards = {}
+        for board_config in config['boards']:
+            chip_type = {'MCP23017': Sim_MCP23017, 'ADS1115': Sim_ADS1115}.get(board_config['type'])
+            chip = chip_type() if chip_type is not None else Sim_PCA9685(self.pwm_written)
+            bus = self.buses[board_config['bus']]
+            self.chips[board_config['id']] = bus.add(int(board_config['i2c_address'], 16), chip)
+            board = board_registry.create(board_config['type'], bus, board_config)
+            board.bus_worker = self.bus_manager.worker(board_config['bus'])
+            self.boards[board_config['id']] = board
+
+        gates_file = os.path.join(work_dir, 'gates.json')
+        with open(gates_file, 'w') as f:
+            json.dump(gates, f)
+        self.gate_owner = {}  # (chip, channel) -> id of the tool whose own gate it is
+        for tool_config in config['tools']:
+            for gate_name in tool_config.get('preferences', {}).get('gate_prefs', [])[:1]:
+                location = gates['gates'][gate_name]['io_location']
+                self.gate_owner[(id(self.chips[location['board']]), location['pin'])] = tool_config['id']
+
+        styles = Style_Manager().get_styles()
+        self.tools = []
+        self.collectors = []
+        for tool_config in config['tools']:
+            if 'relay' in tool_config:
+                self.collectors.append(Sim_Collector(tool_config, self.tools))
+                continue
+            button_config = tool_config['button']
+            volt_config = tool_config.get('volt') or {}
+            tool = Tool(tool_config, self.boards[button_config['connection']['board']], self.boards[button_config['led']['connection']['board']],
+                        self.boards.get(volt_config.get('connection', {}).get('board')), None, styles,
+                        self.buses[config['buses'][0]['id']], self.boards)
+            tool.add_status_listener(lambda tool, status: self.main_queue.put(lambda: None))
+            tool.add_onset_listener(lambda tool: self.main_queue.put(self.prestage))
+            self.tools.append(tool)
+        self.gate_manager = Gate_Manager(self.boards, gates_file=gates_file, backup_dir=work_dir, motion_config=config.get('motion', {}))
+
+        self.pollers = {}  # One per physical bus, as main.py's assign_buttons() does
+        board_buses = {board_config['id']: board_config['bus'] for board_config in config['boards']}
+        for tool in self.tools:
+            bus_id = self.bus_manager.root(board_buses[tool.button.health.board_id])
+            if bus_id not in self.pollers:
+                self.pollers[bus_id] = Poll_Buttons([], styles['RGBLED_button_styles'], name=f"buttons {bus_id}")
+            self.pollers[bus_id].buttons.append(tool.button)
+        for poller in self.pollers.values():
+            poller.start_polling()
+
+    def pwm_written(self, chip, channel, on, off):
+        if off & 0x1000:  # Fully off: a servo being released, not moved
+            return
+        tool_id = self.gate_owner.get((id(chip), channel))
+        with self.pending_lock:
+            started = self.pending.pop(tool_id, None)
+        if started is not None:
+            self.latencies[started[0]].append(time.monotonic() - started[1])
+
+    def set_gates(self):
+        start = time.perf_counter()
+        self.gate_manager.set_gates(self.tools)
+        self.set_gates_times.append(time.perf_counter() - start)
+
+    def prestage(self):
+        self.set_gates()
+        for collector in self.collectors:
+            collector.wake()
+
+    def run_main_loop(self, until):
+        '''main.py's loop: set the gates on any status change, and run queued work as it arrives'''
+        while time.monotonic() < until:
+            if any(tool.status_changed for tool in self.tools):
+                self.set_gates()
+                for tool in self.tools:
+                    tool.reset_status_changed()
+            try:
+                self.main_queue.get(timeout=min(1.0, max(0.0, until - time.monotonic())))()
+            except queue.Empty:
+                pass
+
+    def drive(self, duration, seed):
+        '''Starts random idle tools by button or by current draw, and stops them after a random run'''
+        rng = random.Random(seed)
+        rate = STARTS_PER_TOOL * len(self.tools) * TICK
+        stops = []  # (monotonic time, callable)
+        until = time.monotonic() + duration
+        while time.monotonic() < until:
+            now = time.monotonic()
+            for stop in [stop for stop in stops if stop[0] <= now]:
+                stops.remove(stop)
+                stop[1]()
+            with self.pending_lock:
+                for tool_id, (kind, started) in list(self.pending.items()):
+                    if now - started > MISSED_AFTER:
+                        del self.pending[tool_id]
+                        self.missed += 1
+            starts = sum(1 for _ in range(10) if rng.random() < rate / 10)  # Poisson-ish arrivals per tick
+            for _ in range(starts):
+                idle = [tool for tool in self.tools if tool.status == 'off' and tool.id not in self.pending
+                        and self.gate_manager.gates[tool.gate_prefs[0]].status == 'closed']
+                if not idle:
+                    break
+                tool = rng.choice(idle)
+                self.starts += 1
+                run_time = rng.uniform(*RUN_TIME)
+                if tool.voltage_sensor is not None and rng.random() < 0.5:
+                    chip = self.chips[tool.volt['connection']['board']]
+                    channel = tool.volt['connection']['pins'][0]
+                    with self.pending_lock:
+                        self.pending[tool.id] = ('sensor', now)
+                    chip.running.add(channel)
+                    stops.append((now + run_time, lambda chip=chip, channel=channel: chip.running.discard(channel)))
+                else:
+                    connection = tool.config['button']['connection']
+                    chip = self.chips[connection['board']]
+                    pin = connection['pins'][0]
+                    with self.pending_lock:
+                        self.pending[tool.id] = ('button', now)
+                    chip.press(pin, PRESS_TIME)
+                    stops.append((now + run_time, lambda chip=chip, pin=pin: chip.press(pin, PRESS_TIME)))
+            time.sleep(TICK)
+
+
+def run_shop(tool_count, duration, clock=BUS_CLOCK, seed=1):
+    '''Builds and drives one shop in this process; returns its measurements as a dict'''
+    from utils.metrics import registry
+    config, gates = generate(tool_count)
+    started = time.perf_counter()
+    with tempfile.TemporaryDirectory() as work_dir:
+        shop = Shop(config, gates, work_dir, clock)
+        startup = time.perf_counter() - started
+
+        cpu_before = thread_cpu()
+        process_before = time.process_time()
+        wall_before = time.monotonic()
+        busy_before = {bus_id: bus.busy for bus_id, bus in shop.buses.items()}
+        driver = threading.Thread(target=shop.drive, args=(duration, seed), name='usage-driver', daemon=True)
+        driver.start()
+        shop.run_main_loop(wall_before + duration)
+        driver.join()
+        wall = time.monotonic() - wall_before
+        cpu_percent = (time.process_time() - process_before) / wall * 100
+        cpu_after = thread_cpu()
+        threads = threading.enumerate()
+
+    cpu_by_group = {}
+    for native_id, (group, seconds) in cpu_after.items():
+        cpu_by_group[group] = cpu_by_group.get(group, 0.0) + seconds - cpu_before.get(native_id, (group, 0.0))[1]
+    thread_groups = {}
+    for thread in threads:
+        thread_groups[thread_group(thread)] = thread_groups.get(thread_group(thread), 0) + 1
+    metrics = registry.metrics
+    return {
+        'tools': len(shop.tools),
+        'sensors': sum(1 for tool in shop.tools if tool.voltage_sensor is not None),
+        'gates': len(gates['gates']),
+        'boards': len(config['boards']),
+        'buses': len(config['buses']),
+        'collectors': len(shop.collectors),
+        'startup': startup,
+        'threads': len(threads),
+        'thread_groups': thread_groups,
+        'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'cpu_percent': cpu_percent,
+        'cpu_by_group': {group: seconds / wall * 100 for group, seconds in cpu_by_group.items()},
+        'starts': shop.starts,
+        'missed': shop.missed,
+        'button_gate_p50': percentile(shop.latencies['button'], 0.5),
+        'button_gate_p95': percentile(shop.latencies['button'], 0.95),
+        'sensor_gate_p50': percentile(shop.latencies['sensor'], 0.5),
+        'sensor_gate_p95': percentile(shop.latencies['sensor'], 0.95),
+        'set_gates_p95': percentile(shop.set_gates_times, 0.95),
+        'poll_cycle_mean': histogram_mean(metrics['hokori_button_poll_cycle_seconds']),
+        'sensor_read_mean': histogram_mean(metrics['hokori_sensor_read_seconds']),
+        'sensor_period_mean': histogram_mean(metrics['hokori_loop_seconds'], 'sensor '),
+        'bus_utilisation': max((bus.busy - busy_before[bus_id]) / wall for bus_id, bus in shop.buses.items()),
+    }
+
+
+def format_value(value, scale=1.0, digits=0):
+    return '-' if value is None else f"{value * scale:.{digits}f}"
+
+
+def report(results):
+    columns = (
+        ('tools', 'tools', 1, 0), ('sensors', 'sensors', 1, 0), ('gates', 'gates', 1, 0), ('buses', 'buses', 1, 0),
+        ('startup s', 'startup', 1, 1), ('threads', 'threads', 1, 0), ('RSS MB', 'rss_mb', 1, 0), ('CPU %', 'cpu_percent', 1, 0),
+        ('btn p50 ms', 'button_gate_p50', 1000, 0), ('btn p95 ms', 'button_gate_p95', 1000, 0),
+        ('vs p50 ms', 'sensor_gate_p50', 1000, 0), ('vs p95 ms', 'sensor_gate_p95', 1000, 0),
+        ('starts', 'starts', 1, 0), ('missed', 'missed', 1, 0),
+        ('scan ms', 'poll_cycle_mean', 1000, 1), ('read ms', 'sensor_read_mean', 1000, 1), ('vs loop ms', 'sensor_period_mean', 1000, 0),
+        ('gates p95 s', 'set_gates_p95', 1, 2), ('bus %', 'bus_utilisation', 100, 0),
+    )
+    widths = [max(len(title), 7) for title, _, _, _ in columns]
+    print('  '.join(title.rjust(width) for (title, _, _, _), width in zip(columns, widths)))
+    for result in results:
+        print('  '.join(format_value(result[key], scale, digits).rjust(width) for (_, key, scale, digits), width in zip(columns, widths)))
+
+    largest = results[-1]
+    print(f"\nThreads in the {largest['tools']} tool shop: " +
+          ', '.join(f"{group} {count}" for group, count in sorted(largest['thread_groups'].items(), key=lambda item: -item[1])))
+    print(f"CPU by thread group (% of one core): " +
+          ', '.join(f"{group} {percent:.1f}" for group, percent in sorted(largest['cpu_by_group'].items(), key=lambda item: -item[1])[:6]))
+
+    print("\nFirst shop size to cross each limit:")
+    crossed = []
+    for key, limit, description in LIMITS:
+        first = next((result for result in results if result[key] is not None and result[key] > limit), None)
+        if first is not None:
+            crossed.append((first['tools'], description))
+    for tools, description in sorted(crossed, key=lambda item: item[0]):
+        print(f"  {tools:>5} tools: {description}")
+    if not crossed:
+        print("  none; try bigger sizes")
+
+
+def run_child(tool_count, duration, clock):
+    '''Runs one size in a fresh interpreter and returns its measurements'''
+    command = [sys.executable, '-m', 'tests.scale.scale_test', '--child', str(tool_count), '--duration', str(duration), '--clock', str(clock)]
+    completed = subprocess.run(command, cwd=BASE_DIR, stdout=subprocess.PIPE, text=True)
+    lines = completed.stdout.strip().splitlines()
+    if completed.returncode != 0 or not lines:
+        raise RuntimeError(f"The {tool_count} tool run failed with exit code {completed.returncode}")
+    return json.loads(lines[-1])
+
+
+if __name__ == '__main__':
+    arguments = sys.argv[1:]
+    options = {}
+    for flag in ('--duration', '--clock', '--write', '--child'):
+        if flag in arguments:
+            position = arguments.index(flag)
+            options[flag] = arguments[position + 1]
+            del arguments[position:position + 2]
+    duration = float(options.get('--duration', DEFAULT_DURATION))
+    clock = int(options.get('--clock', BUS_CLOCK))
+
+    if '--child' in options:
+        logging.basicConfig(level=logging.WARNING)
+        install_gpio()  # Before anything imports devices.tool
+        try:
+            result = run_shop(int(options['--child']), duration, clock)
+            print(json.dumps(result), flush=True)
+        except Exception:
+            traceback.print_exc()
+            os._exit(1)
+        os._exit(0)  # Sensor, poller and bus worker threads are left running; there is nothing to clean up in a throwaway process
+
+    sizes = [int(argument) for argument in arguments] or list(DEFAULT_SIZES)
+    if '--write' in options:
+        for tool_count in sizes:
+            directory = os.path.join(options['--write'], str(tool_count))
+            os.makedirs(directory, exist_ok=True)
+            config, gates = generate(tool_count)
+            for name, data in (('config.json', config), ('gates.json', gates)):
+                with open(os.path.join(directory, name), 'w') as f:
+                    json.dump(data, f, indent=4)
+            print(f"Wrote {directory}")
+    results = []
+    for tool_count in sorted(sizes):
+        print(f"Running {tool_count} tools for {duration:g} s...", flush=True)
+        results.append(run_child(tool_count, duration, clock))
+    print()
+    report(results)
@@ -0,0 +1,231 @@
+# Register-level stand-ins for the shop's I2C chips, so the real Adafruit drivers and
+# the controller's own code run unchanged against them. Used by scale_test.py.
+# install_gpio() does the same for RPi.GPIO.
+import errno
+import math
+import random
+import sys
+import threading
+import time
+import types
+
+BUS_CLOCK = 100_000  # Hz; the Pi's default I2C speed
+BITS_PER_BYTE = 9  # Eight data bits plus ACK
+ADS_RATES = (8, 16, 32, 64, 128, 250, 475, 860)  # Samples per second for config bits 7:5
+ADS_FULL_SCALE = 4.096  # Volts at the drivers' default gain of 1
+MAINS_FREQUENCY = 60
+
+
+def install_gpio():
+    '''Puts a do-nothing RPi.GPIO in sys.modules, so the tool and collector modules import off the Pi
+    and a simulated shop never drives a real pin on it'''
+    gpio = types.ModuleType('RPi.GPIO')
+    gpio.BCM, gpio.BOARD = 11, 10
+    gpio.OUT, gpio.IN = 0, 1
+    gpio.LOW, gpio.HIGH = 0, 1
+    gpio.PUD_DOWN, gpio.PUD_UP = 21, 22
+    gpio.RISING, gpio.FALLING, gpio.BOTH = 31, 32, 33
+    for name in ('setmode', 'setwarnings', 'setup', 'output', 'cleanup', 'add_event_detect', 'remove_event_detect', 'wait_for_edge'):
+        setattr(gpio, name, lambda *args, **kwargs: None)
+    gpio.input = lambda *args, **kwargs: gpio.HIGH
+    package = types.ModuleType('RPi')
+    package.GPIO = gpio
+    sys.modules['RPi'] = package
+    sys.modules['RPi.GPIO'] = gpio
+
+
+class Sim_I2C:
+    '''A busio.I2C look-alike that routes transactions to simulated chips by address.
+
+    Each transaction sleeps for the time its bytes would take on the wire at
+    BUS_CLOCK (pass clock=0 to skip that) and adds it to `busy`, so bus
+    utilisation can be read off afterwards. Addresses with no chip NAK the way
+    Linux reports it, with EREMOTEIO.
+    '''
+    def __init__(self, name, clock=BUS_CLOCK):
+        self.name = name
+        self.byte_time = BITS_PER_BYTE / clock if clock else 0.0
+        self.chips = {}
+        self.lock = threading.Lock()
+        self.stats_lock = threading.Lock()
+        self.transactions = 0
+        self.busy = 0.0
+
+    def add(self, address, chip):
+        self.chips[address] = chip
+        return chip
+
+    def try_lock(self):
+        return self.lock.acquire(blocking=False)
+
+    def unlock(self):
+        self.lock.release()
+
+    def deinit(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def chip(self, address):
+        chip = self.chips.get(address)
+        if chip is None:
+            self.wire(1)
+            raise OSError(errno.EREMOTEIO, f"No device at {hex(address)} on {self.name}")
+        return chip
+
+    def wire(self, byte_count):
+        '''Holds the caller for the bytes' time on the wire (plus the address byte)'''
+        duration = (byte_count + 1) * self.byte_time
+        with self.stats_lock:
+            self.transactions += 1
+            self.busy += duration
+        if duration:
+            time.sleep(duration)
+
+    def writeto(self, address, buffer, *, start=0, end=None):
+        data = bytes(buffer[start:end])
+        self.chip(address).write(data)
+        self.wire(len(data))
+
+    def readfrom_into(self, address, buffer, *, start=0, end=None):
+        end = len(buffer) if end is None else end
+        buffer[start:end] = self.chip(address).read(end - start)
+        self.wire(end - start)
+
+    def writeto_then_readfrom(self, address, buffer_out, buffer_in, *, out_start=0, out_end=None, in_start=0, in_end=None):
+        chip = self.chip(address)
+        data = bytes(buffer_out[out_start:out_end])
+        chip.write(data)
+        in_end = len(buffer_in) if in_end is None else in_end
+        buffer_in[in_start:in_end] = chip.read(in_end - in_start)
+        self.wire(len(data) + 1 + in_end - in_start)  # Repeated start costs another address byte
+
+    def scan(self):
+        self.wire(len(self.chips))
+        return sorted(self.chips)
+
+
+class Register_Chip:
+    '''256 byte-wide registers behind an auto-incrementing pointer (MCP23017 with BANK=0, PCA9685)'''
+    def __init__(self):
+        self.registers = bytearray(256)
+        self.pointer = 0
+
+    def load(self, register):
+        return self.registers[register]
+
+    def store(self, register, value):
+        self.registers[register] = value
+
+    def write(self, data):
+        if not data:
+            return
+        self.pointer = data[0]
+        for value in data[1:]:
+            self.store(self.pointer, value)
+            self.pointer = (self.pointer + 1) & 0xFF
+
+    def read(self, count):
+        data = bytearray()
+        for _ in range(count):
+            data.append(self.load(self.pointer))
+            self.pointer = (self.pointer + 1) & 0xFF
+        return data
+
+
+class Sim_MCP23017(Register_Chip):
+    '''Sixteen pulled-up buttons; press(pin) holds one low for a while'''
+    GPIOA = 0x12
+    GPIOB = 0x13
+
+    def __init__(self):
+        super().__init__()
+        self.registers[0x00] = self.registers[0x01] = 0xFF  # IODIRA/B: all inputs after reset
+        self.pressed_until = [0.0] * 16
+
+    def press(self, pin, duration=0.3):
+        self.pressed_until[pin] = time.monotonic() + duration
+
+    def load(self, register):
+        if register in (self.GPIOA, self.GPIOB):
+            now = time.monotonic()
+            first = 0 if register == self.GPIOA else 8
+            value = 0xFF
+            for bit in range(8):
+                if self.pressed_until[first + bit] > now:
+                    value &= ~(1 << bit)
+            return value
+        return super().load(register)
+
+
+class Sim_PCA9685(Register_Chip):
+    '''PWM registers; every completed channel write is reported to on_write(chip, channel, on, off)'''
+    MODE1 = 0x00
+    LED0 = 0x06
+    PRESCALE = 0xFE
+
+    def __init__(self, on_write=None):
+        super().__init__()
+        self.registers[self.MODE1] = 0x11
+        self.registers[self.PRESCALE] = 0x1E  # Power-on prescale, 200 Hz
+        self.on_write = on_write
+        self.writes = 0
+
+    def write(self, data):
+        super().write(data)
+        if len(data) < 5 or not self.LED0 <= data[0] < self.LED0 + 64:
+            return
+        channel = (data[0] - self.LED0) // 4
+        base = self.LED0 + channel * 4
+        on = self.registers[base] | self.registers[base + 1] << 8
+        off = self.registers[base + 2] | self.registers[base + 3] << 8
+        self.writes += 1
+        if self.on_write is not None:
+            self.on_write(self, channel, on, off)
+
+
+class Sim_ADS1115:
+    '''Four current-transformer inputs: a quiet offset while idle, mains hum while `running`.
+
+    Single-shot conversions take 1/data rate seconds like the real chip, so the
+    driver's busy-poll of the OS bit costs the same bus traffic it does in the shop.
+    '''
+    def __init__(self, offset=1.65, amplitude=0.4, noise=0.002):
+        self.registers = [0, 0x8583, 0x8000, 0x7FFF]  # Conversion, config, lo/hi thresholds at reset
+        self.pointer = 0
+        self.ready_at = 0.0
+        self.offset = offset
+        self.amplitude = amplitude
+        self.noise = noise
+        self.running = set()  # Input channels whose tool is drawing current
+        self.phase = [random.random() * 2 * math.pi for _ in range(4)]
+
+    def signal(self, channel):
+        volts = self.offset + random.gauss(0, self.noise)
+        if channel in self.running:
+            volts += self.amplitude * math.sin(2 * math.pi * MAINS_FREQUENCY * time.monotonic() + self.phase[channel])
+        return max(-32768, min(32767, int(volts / ADS_FULL_SCALE * 32767))) & 0xFFFF
+
+    def write(self, data):
+        if not data:
+            return
+        self.pointer = data[0] & 0x03
+        if len(data) >= 3:
+            value = data[1] << 8 | data[2]
+            self.registers[self.pointer] = value & 0x7FFF if self.pointer == 1 else value
+            if self.pointer == 1 and value & 0x8000:  # OS bit: start a single-shot conversion
+                self.ready_at = time.monotonic() + 1.0 / ADS_RATES[(value >> 5) & 0x07]
+
+    def read(self, count):
+        if self.pointer == 0:
+            mux = (self.registers[1] >> 12) & 0x07
+            value = self.signal(mux - 4) if mux >= 4 else 0  # Single-ended AINn is mux 4 + n
+        elif self.pointer == 1:
+            value = self.registers[1] | (0x8000 if time.monotonic() >= self.ready_at else 0)
+        else:
+            value = self.registers[self.pointer]
+        return bytes((value >> 8, value & 0xFF))[:count]
@@ -0,0 +1,115 @@
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# inotify constants from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CLOEXEC = 0o2000000
+EVENT_HEADER = struct.Struct('iIII')
+
+DEBOUNCE_TIME = 0.2  # Editors often write a file several times in a row
+POLL_INTERVAL = 1.0  # Used when inotify is not available
+
+
+def load_inotify():
+    '''Returns libc if it exposes inotify (Linux), otherwise None'''
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+        return libc
+    except (OSError, AttributeError, TypeError):
+        return None
+
+
+class Config_Watcher:
+    '''Watches a directory for changes to a set of files and calls callback(filename) once per burst.
+
+    Uses inotify on Linux so an idle watcher costs nothing; elsewhere it falls back
+    to comparing modification times once a second. The directory is watched rather
+    than the files so atomic write-and-rename saves are picked up too.
+    '''
+    def __init__(self, directory, filenames, callback, debounce=DEBOUNCE_TIME):
+        self.directory = directory
+        self.filenames = set(filenames)
+        self.callback = callback
+        self.debounce = debounce
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join(timeout=5)
+
+    def run(self):
+        libc = load_inotify()
+        if libc is not None:
+            fd = libc.inotify_init1(IN_CLOEXEC)
+            if fd >= 0 and libc.inotify_add_watch(fd, os.fsencode(self.directory), IN_CLOSE_WRITE | IN_MOVED_TO) >= 0:
+                logger.debug("      🚥 👀 Watching %s with inotify", self.directory)
+                try:
+                    self.run_inotify(fd)
+                finally:
+                    os.close(fd)
+                return
+            if fd >= 0:
+                os.close(fd)
+        logger.debug("      🚥 👀 Watching %s by polling", self.directory)
+        self.run_polling()
+
+    def run_inotify(self, fd):
+        changed = set()
+        deadline = None
+        while not self.stop_event.is_set():
+            timeout = 0.5 if deadline is None else max(0.0, deadline - time.monotonic())
+            readable, _, _ = select.select([fd], [], [], timeout)
+            if readable:
+                data = os.read(fd, 4096)
+                offset = 0
+                while offset + EVENT_HEADER.size <= len(data):
+                    _, _, _, name_len = EVENT_HEADER.unpack_from(data, offset)
+                    offset += EVENT_HEADER.size
+                    name = data[offset:offset + name_len].rstrip(b'\0').decode(errors='replace')
+                    offset += name_len
+                    if name in self.filenames:
+                        changed.add(name)
+                        deadline = time.monotonic() + self.debounce
+            elif deadline is not None and time.monotonic() >= deadline:
+                self.dispatch(changed)
+                changed = set()
+                deadline = None
+
+    def run_polling(self):
+        mtimes = {name: self.mtime(name) for name in self.filenames}
+        while not self.stop_event.wait(POLL_INTERVAL):
+            changed = set()
+            for name in self.filenames:
+                mtime = self.mtime(name)
+                if mtime != mtimes[name]:
+                    mtimes[name] = mtime
+                    changed.add(name)
+            self.dispatch(changed)
+
+    def mtime(self, name):
+        try:
+            return os.stat(os.path.join(self.directory, name)).st_mtime_ns
+        except OSError:
+            return None
+
+    def dispatch(self, changed):
+        for name in sorted(changed):
+            try:
+                self.callback(name)
+            except Exception as e:
+                logger.error(f"💢 👀 Failed to apply changes from {name}: {e}")
@@ -0,0 +1,137 @@
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LOGS_DIR = os.path.join(BASE_DIR, 'logs')
+LOG_FILE = os.path.join(LOGS_DIR, 'hokori.jsonl')
+MAX_LOG_BYTES = 1024 * 1024  # Rotate the JSON log at 1 MB
+LOG_BACKUP_COUNT = 5
+CONSOLE_FORMAT = '%(asctime)s %(levelname)s %(message)s'
+FILE_LEVEL = logging.INFO  # The SD card only gets INFO and up; debug output stays on the console
+# Loggers whose debug lines come from the per-cycle loops: logger name -> keep one in this many
+SAMPLED_LOGGERS = {
+    'devices.poll_buttons': 10,
+    'devices.voltage_sensor': 10,
+    'devices.rgbled_button': 10,
+}
+
+_listener = None
+
+
+class JSON_Formatter(logging.Formatter):
+    '''Formats records as one JSON object per line'''
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'msg': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class Rate_Limiter:
+    '''Lets a given event key through at most once per interval and counts what it dropped.
+
+    Used for high-frequency events (sensor read errors, button poll errors) so a
+    stuck device logs once every few seconds instead of ten times a second.
+    '''
+    def __init__(self, interval=5.0):
+        self.interval = interval
+        self.last_emit = {}
+        self.suppressed = {}
+        self.lock = threading.Lock()
+
+    def allow(self, key):
+        '''Returns the number of suppressed events since the last emit, or None if this one should be dropped'''
+        now = time.monotonic()
+        with self.lock:
+            last = self.last_emit.get(key)
+            if last is not None and now - last < self.interval:
+                self.suppressed[key] = self.suppressed.get(key, 0) + 1
+                return None
+            self.last_emit[key] = now
+            return self.suppressed.pop(key, 0)
+
+    def log(self, logger, level, key, msg, *args):
+        '''Logs msg % args through logger unless key has fired within the interval'''
+        if not logger.isEnabledFor(level):
+            return
+        suppressed = self.allow(key)
+        if suppressed is None:
+            return
+        if suppressed:
+            msg = msg + ' (%d similar suppressed)'
+            args = args + (suppressed,)
+        logger.log(level, msg, *args)
+
+
+class Sample_Filter(logging.Filter):
+    '''Passes one in every `rate` debug records from a logger; INFO and above always get through'''
+    def __init__(self, rate=10, name=''):
+        super().__init__(name)
+        self.rate = max(1, int(rate))
+        self.count = 0
+        self.lock = threading.Lock()  # Records arrive from every sensor and poller thread
+
+    def filter(self, record):
+        if record.levelno >= logging.INFO or not super().filter(record):
+            return True
+        with self.lock:
+            self.count += 1
+            count = self.count
+        return (count - 1) % self.rate == 0
+
+
+def setup_logging(level=logging.INFO, log_file=LOG_FILE, console=True, max_bytes=MAX_LOG_BYTES, backup_count=LOG_BACKUP_COUNT,
+                  file_level=FILE_LEVEL, sampled=SAMPLED_LOGGERS):
+    '''Routes all logging through a queue so callers never block on console or SD-card writes.
+
+    The root logger only gets a QueueHandler; a QueueListener thread drains it into
+    the console and a rotating JSON lines file, which only takes file_level and up.
+    The loggers in `sampled` keep one debug line in every N.
+    '''
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    handlers = []
+    if console:
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(logging.Formatter(CONSOLE_FORMAT))
+        handlers.append(console_handler)
+    if log_file:
+        os.makedirs(os.path.dirname(log_file), exist_ok=True)
+        file_handler = logging.handlers.RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+        file_handler.setFormatter(JSON_Formatter())
+        file_handler.setLevel(file_level)
+        handlers.append(file_handler)
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(level)
+    for name, rate in sampled.items():
+        logging.getLogger(name).addFilter(Sample_Filter(rate))
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def stop_logging():
+    '''Flushes queued records and stops the background writer'''
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,227 @@
+import bisect
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SNAPSHOT_FILE = os.path.join(BASE_DIR, 'logs', 'metrics.prom')
+DEFAULT_PORT = 9108
+SNAPSHOT_INTERVAL = 60  # Seconds between snapshot file writes
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+logger = logging.getLogger(__name__)
+
+
+class Counter_Value:
+    def __init__(self):
+        self.value = 0.0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1.0):
+        with self.lock:
+            self.value += amount
+
+    def samples(self):
+        return [('', (), self.value)]
+
+
+class Gauge_Value(Counter_Value):
+    def set(self, value):
+        self.value = value
+
+    def dec(self, amount=1.0):
+        self.inc(-amount)
+
+
+class Histogram_Value:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        slot = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[slot] += 1
+            self.sum += value
+
+    def time(self):
+        return Timer(self)
+
+    def samples(self):
+        with self.lock:
+            counts = list(self.counts)
+            total = self.sum
+        samples = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            samples.append(('_bucket', (('le', repr(float(bound))),), cumulative))
+        cumulative += counts[-1]
+        samples.append(('_bucket', (('le', '+Inf'),), cumulative))
+        samples.append(('_sum', (), total))
+        samples.append(('_count', (), cumulative))
+        return samples
+
+
+class Timer:
+    '''Context manager that observes the elapsed monotonic time into a histogram'''
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+class Metric:
+    '''A named metric family; label values select a cached child so hot paths do a single dict lookup'''
+    def __init__(self, kind, name, help_text, labelnames=(), factory=Counter_Value):
+        self.kind = kind
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.factory = factory
+        self.children = {}
+        self.lock = threading.Lock()
+        if not self.labelnames:
+            self.default = self.labels()
+
+    def labels(self, *values):
+        key = tuple(str(value) for value in values)
+        child = self.children.get(key)
+        if child is None:
+            with self.lock:
+                child = self.children.setdefault(key, self.factory())
+        return child
+
+    # Shortcuts for label-less metrics
+    def inc(self, amount=1.0):
+        self.default.inc(amount)
+
+    def set(self, value):
+        self.default.set(value)
+
+    def observe(self, value):
+        self.default.observe(value)
+
+    def time(self):
+        return self.default.time()
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        for key, child in list(self.children.items()):
+            base_labels = tuple(zip(self.labelnames, key))
+            for suffix, extra_labels, value in child.samples():
+                labels = base_labels + extra_labels
+                label_text = '{' + ','.join(f'{k}="{v}"' for k, v in labels) + '}' if labels else ''
+                lines.append(f"{self.name}{suffix}{label_text} {value:g}")
+        return lines
+
+
+class Metrics_Registry:
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def _get_or_create(self, kind, name, help_text, labelnames, factory):
+        metric = self.metrics.get(name)
+        if metric is None:
+            with self.lock:
+                metric = self.metrics.get(name)
+                if metric is None:
+                    metric = Metric(kind, name, help_text, labelnames, factory)
+                    self.metrics[name] = metric
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._get_or_create('counter', name, help_text, labelnames, Counter_Value)
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self._get_or_create('gauge', name, help_text, labelnames, Gauge_Value)
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get_or_create('histogram', name, help_text, labelnames, lambda: Histogram_Value(buckets))
+
+    def render(self):
+        '''Renders every metric in the Prometheus text exposition format'''
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+# Shared registry used by the devices
+registry = Metrics_Registry()
+
+
+class Metrics_Server:
+    '''Serves the registry at /metrics on a background thread'''
+    def __init__(self, port=DEFAULT_PORT, host='0.0.0.0', metrics_registry=registry):
+        metrics = metrics_registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # Keep scrapes out of the application log
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        logger.info("     🔮 📈 Metrics available on port %s at /metrics", self.server.server_address[1])
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class Snapshot_Writer:
+    '''Periodically writes the registry to a file so metrics survive without a scraper'''
+    def __init__(self, path=SNAPSHOT_FILE, interval=SNAPSHOT_INTERVAL, metrics_registry=registry):
+        self.path = path
+        self.interval = interval
+        self.registry = metrics_registry
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.thread.start()
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            self.write()
+
+    def write(self):
+        tmp_path = self.path + '.tmp'
+        try:
+            with open(tmp_path, 'w') as f:
+                f.write(self.registry.render())
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.error("💢 📈 Failed to write metrics snapshot: %s", e)
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join(timeout=5)
+        self.write()
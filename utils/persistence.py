@@ -0,0 +1,141 @@
+import hashlib
+import json
+import logging
+import os
+import stat
+import tempfile
+import threading
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+BACKUP_RETENTION = 20  # Snapshots kept per file
+FLUSH_DELAY = 2.0  # Seconds of quiet before a debounced save is written
+NEW_FILE_MODE = 0o644  # mkstemp creates 0600; files written for the first time get this instead
+
+
+def serialize(data, indent=4):
+    return json.dumps(data, indent=indent) + '\n'
+
+
+def atomic_write_json(path, data, indent=4):
+    '''Writes JSON next to the target and renames it into place so readers never see a half-written file.
+
+    The replacement keeps the target's permissions, so a rewrite never narrows who can read it.
+    '''
+    text = serialize(data, indent)
+    directory = os.path.dirname(os.path.abspath(path))
+    try:
+        mode = stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        mode = NEW_FILE_MODE
+    fd, tmp_path = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.', suffix='.tmp', dir=directory)
+    try:
+        os.fchmod(fd, mode)
+        with os.fdopen(fd, 'w') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    try:
+        dir_fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)  # Make the rename itself durable across a power cut
+        finally:
+            os.close(dir_fd)
+    except OSError:
+        pass
+    return text
+
+
+class Snapshot_Store:
+    '''Content-addressed backups: a snapshot is only written when its content differs from the newest one.
+
+    Files are named <prefix>_<timestamp>_<hash>.json so the hash of each kept snapshot
+    is known from the directory listing alone; only the newest `retention` are kept.
+    Only the newest is compared, so an A -> B -> A revert is snapshotted again and the
+    current content always has the newest snapshot, whatever pruning removes.
+    '''
+    def __init__(self, backup_dir, prefix, retention=BACKUP_RETENTION):
+        self.backup_dir = backup_dir
+        self.prefix = prefix
+        self.retention = retention
+        os.makedirs(self.backup_dir, exist_ok=True)
+
+    def snapshots(self):
+        '''Returns the kept snapshot file names, oldest first'''
+        names = [name for name in os.listdir(self.backup_dir)
+                 if name.startswith(self.prefix + '_') and name.endswith('.json') and name.count('_') >= 2]
+        return sorted(names)
+
+    def save(self, text):
+        '''Stores text unless the newest snapshot is identical; returns the snapshot path or None'''
+        digest = hashlib.sha256(text.encode('utf-8')).hexdigest()[:12]
+        existing = self.snapshots()
+        if existing and existing[-1][:-len('.json')].endswith('_' + digest):
+            return None
+        timestamp = datetime.now().strftime('%Y%m%d%H%M%S%f')
+        path = os.path.join(self.backup_dir, f'{self.prefix}_{timestamp}_{digest}.json')
+        with open(path, 'w') as f:
+            f.write(text)
+        existing.append(os.path.basename(path))
+        self.prune(existing)
+        return path
+
+    def prune(self, names):
+        for name in names[:-self.retention] if self.retention else []:
+            try:
+                os.remove(os.path.join(self.backup_dir, name))
+            except OSError as e:
+                logger.error(f"💢 Failed to prune backup {name}: {e}")
+
+
+class Debounced_Writer:
+    '''Coalesces rapid saves of one JSON file into a single atomic write plus backup snapshot.
+
+    Call schedule() as often as you like; the latest data is written once nothing has
+    been scheduled for `delay` seconds, or immediately on flush().
+    '''
+    def __init__(self, path, snapshot_store=None, delay=FLUSH_DELAY, indent=4):
+        self.path = path
+        self.snapshot_store = snapshot_store
+        self.delay = delay
+        self.indent = indent
+        self.pending = None
+        self.timer = None
+        self.lock = threading.Lock()
+
+    def schedule(self, data):
+        with self.lock:
+            self.pending = data
+            if self.timer is not None:
+                self.timer.cancel()
+            self.timer = threading.Timer(self.delay, self.flush)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def flush(self):
+        '''Writes any pending data now; returns True if something was written'''
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            data, self.pending = self.pending, None
+            if data is None:
+                return False
+            try:
+                text = atomic_write_json(self.path, data, self.indent)
+                logger.info(f"     🔮 Saved {self.path}")
+                if self.snapshot_store is not None:
+                    backup = self.snapshot_store.save(text)
+                    if backup:
+                        logger.info(f"     🔮 Backed up to {backup}")
+            except OSError as e:
+                logger.error(f"💢 Failed to save {self.path}: {e}")
+                self.pending = data  # Keep it so a later flush can retry
+                return False
+            return True
@@ -0,0 +1,84 @@
+import builtins
+import importlib.util
+import logging
+import os
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+PROFILE_IMPORTS_ENV = 'HOKORI_PROFILE_IMPORTS'  # Set to 1 to time every module imported during startup
+TOP_IMPORTS = 15  # Slowest modules listed in the report
+
+
+class Startup_Profile:
+    '''Times the phases of startup, and optionally every import made along the way.
+
+    Phases are marked by the caller and cost one perf_counter each, so they are always on.
+    Import tracing wraps builtins.__import__ on the starting thread until finish() and
+    records, per module actually loaded, its inclusive time and its own time with nested
+    imports taken out; the own time is what points at the module worth deferring.
+    '''
+    def __init__(self, trace_imports=False):
+        self.started = time.perf_counter()
+        self.last = self.started
+        self.phases = []  # (name, seconds)
+        self.imports = {}  # module -> (inclusive seconds, own seconds)
+        self.nested = []  # Time spent in nested imports, one entry per import in progress
+        self.original_import = None
+        self.thread_id = threading.get_ident()
+        if trace_imports:
+            self.trace_imports()
+
+    def trace_imports(self):
+        if self.original_import is None:
+            self.original_import = builtins.__import__
+            builtins.__import__ = self.timed_import
+
+    def timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        module = name
+        if level:
+            try:
+                module = importlib.util.resolve_name('.' * level + name, (globals or {}).get('__package__') or '')
+            except (ImportError, ValueError):
+                pass
+        if module in sys.modules or threading.get_ident() != self.thread_id:
+            return self.original_import(name, globals, locals, fromlist, level)
+        self.nested.append(0.0)
+        start = time.perf_counter()
+        try:
+            return self.original_import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - start
+            nested = self.nested.pop()
+            if self.nested:
+                self.nested[-1] += elapsed
+            self.imports[module] = (elapsed, elapsed - nested)
+
+    def mark(self, phase):
+        '''Ends the current phase of startup under the given name'''
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last))
+        self.last = now
+
+    def report(self):
+        lines = [f"Startup took {self.last - self.started:.3f} s: "
+                 + ', '.join(f"{phase} {seconds:.3f}" for phase, seconds in self.phases)]
+        slowest = sorted(self.imports.items(), key=lambda item: item[1][1], reverse=True)[:TOP_IMPORTS]
+        for module, (inclusive, own) in slowest:
+            lines.append(f"  {own * 1000:7.1f} ms own {inclusive * 1000:7.1f} ms total  {module}")
+        return lines
+
+    def finish(self):
+        '''Stops tracing imports and logs the report'''
+        if self.original_import is not None:
+            builtins.__import__ = self.original_import
+            self.original_import = None
+        lines = self.report()
+        logger.info(f"     🔮 {lines[0]}")
+        for line in lines[1:]:
+            logger.info(line)
+
+
+startup_profile = Startup_Profile(trace_imports=os.environ.get(PROFILE_IMPORTS_ENV) == '1')
@@ -28,6 +28,35 @@ class Style_Manager:
     def get_styles(self):
         return self.styles
 
+    def reload(self):
+        """Re-read the styles file, updating the existing dicts in place so holders of a reference see the change.
+
+        Returns True if anything changed. A missing, half-written or malformed file leaves the
+        current styles alone instead of repainting every LED in the defaults.
+        """
+        try:
+            with open(self.styles_path, 'r') as f:
+                new_styles = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.error(f"💢 Ignoring styles.json change: {e}")
+            return False
+        if not isinstance(new_styles, dict):
+            logger.error(f"💢 Ignoring styles.json change: expected an object, got {type(new_styles).__name__}")
+            return False
+        if new_styles == self.styles:
+            return False
+        for key, value in new_styles.items():
+            current = self.styles.get(key)
+            if isinstance(current, dict) and isinstance(value, dict):
+                current.clear()
+                current.update(value)
+            else:
+                self.styles[key] = value
+        for key in set(self.styles) - set(new_styles):
+            del self.styles[key]
+        logger.info(f"     🔮 Styles reloaded from {self.styles_path}")
+        return True
+
     def default_styles(self):
         return {
             "RGBLED_button_styles": {
@@ -0,0 +1,52 @@
+import importlib.util
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Backend name -> run(tools, gate_manager, collectors). Nothing GUI related is imported
+# until a backend is started, so headless runs never load pygame or Qt.
+UI_BACKENDS = {}
+
+
+def register(name):
+    def decorator(run):
+        UI_BACKENDS[name] = run
+        return run
+    return decorator
+
+
+@register('pygame')
+def run_pygame(tools, gate_manager, collectors):
+    # Loaded by path: the local pygame/ folder would otherwise be shadowed by the pygame package itself
+    spec = importlib.util.spec_from_file_location('pg_gui', os.path.join(BASE_DIR, 'pygame', 'pg_gui.py'))
+    pg_gui = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(pg_gui)
+    pg_gui.run_gui(tools, gate_manager)
+
+
+@register('qt')
+def run_qt(tools, gate_manager, collectors):
+    import gui  # PySide6 window in the project root
+    gui.run_gui(tools, gate_manager, collectors)
+
+
+def start(name, tools, gate_manager, collectors=()):
+    '''Runs a GUI backend on its own thread; returns the thread, or None for an unknown backend'''
+    run = UI_BACKENDS.get(name)
+    if run is None:
+        logger.error(f"💢 Unknown GUI backend {name}; available: {', '.join(sorted(UI_BACKENDS))}")
+        return None
+
+    def target():
+        try:
+            run(tools, gate_manager, collectors)
+        except Exception as e:
+            logger.error(f"💢 GUI backend {name} stopped: {e}")
+
+    thread = threading.Thread(target=target, name=f"gui-{name}", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,204 @@
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from datetime import date, timedelta
+from .persistence import atomic_write_json
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+USAGE_FILE = os.path.join(BASE_DIR, 'stats', 'usage.json')
+FLUSH_INTERVAL = 300  # Seconds between writes to disk
+DAYS_KEPT = 90  # Daily buckets older than this are dropped
+
+
+def empty_usage():
+    return {'since': time.time(), 'tools': {}, 'collectors': {}, 'gates': {}, 'daily': {}}
+
+
+class Usage_Stats:
+    '''Running totals of tool on-time, collector runtime and gate actuations.
+
+    The status listeners only add to a few dict entries under a lock, so the control
+    loops pay next to nothing. Totals live in memory and are written to stats/usage.json
+    every FLUSH_INTERVAL seconds (and on stop); open sessions are checkpointed at each
+    write so a crash loses at most one interval. Per-day buckets make "last N days"
+    reports a small dict walk instead of a log scan.
+    '''
+    def __init__(self, path=USAGE_FILE, interval=FLUSH_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self.data = self.load()
+        self.running = {}  # (section, id) -> monotonic time the open session was last counted up to
+        self.dirty = False
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def load(self):
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            for section in ('tools', 'collectors', 'gates', 'daily'):
+                data.setdefault(section, {})
+            return data
+        except FileNotFoundError:
+            return empty_usage()
+        except (OSError, ValueError) as e:
+            logger.error(f"💢 📊 Failed to read {self.path}, starting fresh totals: {e}")
+            return empty_usage()
+
+    def entry(self, section, key):
+        entry = self.data[section].get(key)
+        if entry is None:
+            if section == 'gates':
+                entry = {'actuations': 0, 'last_moved': 0}
+            else:
+                entry = {'activations': 0, 'on_seconds': 0.0, 'last_used': 0}
+            self.data[section][key] = entry
+        return entry
+
+    def today(self):
+        day = date.today().isoformat()
+        bucket = self.data['daily'].get(day)
+        if bucket is None:
+            bucket = self.data['daily'][day] = {'tools': {}, 'collectors': {}}
+        return bucket
+
+    def add_time(self, section, key, now):
+        '''Adds the time since the session was last counted to the totals and today's bucket'''
+        started = self.running.get((section, key))
+        if started is None:
+            return
+        elapsed = now - started
+        self.running[(section, key)] = now
+        self.entry(section, key)['on_seconds'] += elapsed
+        bucket = self.today()[section]
+        bucket[key] = bucket.get(key, 0.0) + elapsed
+
+    def session_changed(self, section, key, on):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entry(section, key)
+            if on:
+                if (section, key) not in self.running:
+                    entry['activations'] += 1
+                    self.running[(section, key)] = now
+            else:
+                self.add_time(section, key, now)
+                self.running.pop((section, key), None)
+                entry['last_used'] = time.time()
+            self.dirty = True
+
+    # Listeners
+
+    def tool_changed(self, tool, status):
+        self.session_changed('tools', tool.id, status in ('on', 'override'))
+
+    def collector_changed(self, collector, status):
+        self.session_changed('collectors', collector.id, status == 'on')
+
+    def gate_moved(self, gate, status, elapsed):
+        with self.lock:
+            entry = self.entry('gates', gate.name)
+            entry['actuations'] += 1
+            entry['last_moved'] = time.time()
+            self.dirty = True
+
+    def attach_tool(self, tool):
+        '''Starts counting a tool and restores its last_used from the stored totals'''
+        stored = self.data['tools'].get(tool.id, {}).get('last_used', 0)
+        tool.last_used = max(getattr(tool, 'last_used', 0) or 0, stored)
+        tool.add_status_listener(self.tool_changed)
+
+    def attach_collector(self, collector):
+        collector.add_status_listener(self.collector_changed)
+
+    def detach(self, device):
+        '''Closes any open session for a device that is being stopped or rebuilt'''
+        for section in ('tools', 'collectors'):
+            if (section, device.id) in self.running:
+                self.session_changed(section, device.id, False)
+
+    # Persistence
+
+    def start(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.thread.start()
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            now = time.monotonic()
+            for section, key in list(self.running):
+                self.add_time(section, key, now)
+                self.dirty = True
+            if not self.dirty:
+                return
+            oldest = (date.today() - timedelta(days=DAYS_KEPT)).isoformat()
+            for day in [day for day in self.data['daily'] if day < oldest]:
+                del self.data['daily'][day]
+            data = json.loads(json.dumps(self.data))
+            self.dirty = False
+        try:
+            atomic_write_json(self.path, data)
+        except OSError as e:
+            logger.error(f"💢 📊 Failed to write usage stats: {e}")
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join(timeout=5)
+        self.flush()
+
+    # Reports
+
+    def report(self, days=None):
+        with self.lock:
+            return build_report(json.loads(json.dumps(self.data)), days)
+
+
+def build_report(data, days=None):
+    '''Summarises stored usage; with days set, on-time and runtime cover only the last `days` days'''
+    if days is None:
+        span = max(time.time() - data.get('since', time.time()), 1)
+        tool_seconds = {key: entry['on_seconds'] for key, entry in data['tools'].items()}
+        collector_seconds = {key: entry['on_seconds'] for key, entry in data['collectors'].items()}
+    else:
+        span = days * 86400
+        first_day = (date.today() - timedelta(days=days - 1)).isoformat()
+        tool_seconds, collector_seconds = {}, {}
+        for day, bucket in data['daily'].items():
+            if day >= first_day:
+                for key, seconds in bucket.get('tools', {}).items():
+                    tool_seconds[key] = tool_seconds.get(key, 0.0) + seconds
+                for key, seconds in bucket.get('collectors', {}).items():
+                    collector_seconds[key] = collector_seconds.get(key, 0.0) + seconds
+    return {
+        'tools': {key: {'on_hours': round(tool_seconds.get(key, 0.0) / 3600, 2),
+                        'activations': entry['activations'],
+                        'last_used': entry['last_used']}
+                  for key, entry in data['tools'].items()},
+        'collectors': {key: {'runtime_hours': round(collector_seconds.get(key, 0.0) / 3600, 2),
+                             'starts': entry['activations'],
+                             'duty_cycle': round(collector_seconds.get(key, 0.0) / span, 4)}
+                       for key, entry in data['collectors'].items()},
+        'gates': {key: entry['actuations'] for key, entry in data['gates'].items()},
+    }
+
+
+if __name__ == '__main__':
+    # python -m utils.usage_stats [days]
+    try:
+        with open(USAGE_FILE, 'r') as usage_file:
+            usage = json.load(usage_file)
+    except (OSError, ValueError) as e:
+        print(f"No usage stats yet: {e}")
+        sys.exit(1)
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    print(json.dumps(build_report(usage, days), indent=4))
@@ -0,0 +1,192 @@
+import json
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter, deque
+from .metrics import registry
+from .persistence import atomic_write_json
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DUMP_FILE = os.path.join(BASE_DIR, 'cache', 'stalls.json')
+DEFAULT_DEADLINE = 5.0  # Seconds a loop may go between iterations before it counts as stalled
+CHECK_INTERVAL = 0.25
+SAMPLE_COUNT = 20  # Stack samples per capture...
+SAMPLE_INTERVAL = 0.01  # ...this far apart, so a capture covers 200 ms
+STACKS_PER_THREAD = 3  # Most frequent distinct stacks kept for each thread
+STACK_DEPTH = 25
+STALLS_KEPT = 20
+
+loop_latency = registry.histogram('hokori_loop_seconds', 'Time between iterations of a worker loop', ('loop',))
+loop_stalls = registry.counter('hokori_loop_stalls_total', 'Worker loop iterations that overran their deadline', ('loop',))
+
+
+def frame_stack(frame):
+    '''Outermost-first "file:line function" entries for a frame, at most STACK_DEPTH deep'''
+    stack = []
+    while frame is not None and len(stack) < STACK_DEPTH:
+        code = frame.f_code
+        filename = code.co_filename
+        if filename.startswith(BASE_DIR):
+            filename = os.path.relpath(filename, BASE_DIR)
+        stack.append(f"{filename}:{frame.f_lineno} {code.co_name}")
+        frame = frame.f_back
+    stack.reverse()
+    return tuple(stack)
+
+
+class Heartbeat:
+    '''One worker loop's pulse; the loop calls beat() once per iteration'''
+    def __init__(self, watchdog, name, deadline):
+        self.watchdog = watchdog
+        self.name = name
+        self.deadline = deadline
+        self.last = time.monotonic()
+        self.thread_id = None
+        self.stalled = False
+        self.latency = loop_latency.labels(name)
+
+    def beat(self):
+        now = time.monotonic()
+        self.latency.observe(now - self.last)
+        self.last = now
+        self.thread_id = threading.get_ident()
+        self.stalled = False
+
+    def close(self):
+        self.watchdog.remove(self)
+
+
+class Loop_Watchdog:
+    '''Watches worker loops against their deadlines and samples every thread's stack when one overruns.
+
+    A beat is one monotonic read and a histogram observe, so loops can afford it every
+    iteration. When a loop misses its deadline the watchdog thread samples
+    sys._current_frames() SAMPLE_COUNT times and keeps the most frequent stacks of each
+    thread: whichever thread is stuck shows up with the same stack in every sample.
+    Captures go into a ring buffer mirrored to cache/stalls.json. SIGUSR1 (or
+    `python -m utils.watchdog sample`) takes a capture on demand.
+    '''
+    def __init__(self, path=DUMP_FILE):
+        self.path = path
+        self.loops = []
+        self.stalls = deque(maxlen=STALLS_KEPT)
+        self.lock = threading.Lock()
+        self.sample_requested = threading.Event()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='watchdog', daemon=True)
+
+    def loop(self, name, deadline=DEFAULT_DEADLINE):
+        heartbeat = Heartbeat(self, name, deadline)
+        with self.lock:
+            self.loops.append(heartbeat)
+        return heartbeat
+
+    def remove(self, heartbeat):
+        with self.lock:
+            if heartbeat in self.loops:
+                self.loops.remove(heartbeat)
+
+    def start(self):
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGUSR1, lambda signum, frame: self.sample_requested.set())
+        self.write()
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join(timeout=5)
+
+    def run(self):
+        while not self.stop_event.wait(CHECK_INTERVAL):
+            if self.sample_requested.is_set():
+                self.sample_requested.clear()
+                self.capture('requested')
+            now = time.monotonic()
+            with self.lock:
+                overdue = [heartbeat for heartbeat in self.loops if not heartbeat.stalled and now - heartbeat.last > heartbeat.deadline]
+            for heartbeat in overdue:
+                heartbeat.stalled = True  # One capture per stall; the next beat re-arms it
+                loop_stalls.labels(heartbeat.name).inc()
+                logger.warning(f"🌟 🐕 Loop {heartbeat.name} has not come round for {now - heartbeat.last:.1f} s "
+                               f"(deadline {heartbeat.deadline:.1f} s); sampling stacks")
+                self.capture(f"{heartbeat.name} overran its {heartbeat.deadline:.1f} s deadline", heartbeat)
+
+    def capture(self, reason, heartbeat=None):
+        own = threading.get_ident()
+        counts = {}
+        for index in range(SAMPLE_COUNT):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != own:
+                    counts.setdefault(thread_id, Counter())[frame_stack(frame)] += 1
+            if index < SAMPLE_COUNT - 1:
+                time.sleep(SAMPLE_INTERVAL)
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        record = {
+            'time': time.time(),
+            'reason': reason,
+            'loop': heartbeat.name if heartbeat is not None else None,
+            'loop_thread': names.get(heartbeat.thread_id) if heartbeat is not None else None,
+            'samples': SAMPLE_COUNT,
+            'threads': {names.get(thread_id, str(thread_id)): [{'count': count, 'stack': list(stack)}
+                                                               for stack, count in stacks.most_common(STACKS_PER_THREAD)]
+                        for thread_id, stacks in counts.items()},
+        }
+        with self.lock:
+            self.stalls.append(record)
+        self.write()
+
+    def write(self):
+        with self.lock:
+            data = {'pid': os.getpid(), 'stalls': list(self.stalls)}
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            atomic_write_json(self.path, data)
+        except OSError as e:
+            logger.error(f"💢 🐕 Failed to write {self.path}: {e}")
+
+
+watchdog = Loop_Watchdog()
+
+
+def print_stall(record):
+    stamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(record['time']))
+    print(f"{stamp}  {record['reason']}")
+    for thread_name, stacks in record['threads'].items():
+        marker = '  <-- stalled loop' if thread_name == record.get('loop_thread') else ''
+        print(f"  Thread {thread_name}{marker}")
+        for entry in stacks:
+            print(f"    {entry['count']}/{record['samples']} samples:")
+            for line in entry['stack']:
+                print(f"      {line}")
+
+
+if __name__ == '__main__':
+    # python -m utils.watchdog [count]   show the last captures
+    # python -m utils.watchdog sample    take a capture from the running controller now
+    try:
+        with open(DUMP_FILE, 'r') as dump_file:
+            dump = json.load(dump_file)
+    except (OSError, ValueError) as e:
+        print(f"No watchdog dump yet: {e}")
+        sys.exit(1)
+    if len(sys.argv) > 1 and sys.argv[1] == 'sample':
+        last = dump['stalls'][-1]['time'] if dump['stalls'] else 0
+        os.kill(dump['pid'], signal.SIGUSR1)
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            time.sleep(0.2)
+            with open(DUMP_FILE, 'r') as dump_file:
+                latest = json.load(dump_file)
+            if latest['stalls'] and latest['stalls'][-1]['time'] > last:
+                print_stall(latest['stalls'][-1])
+                sys.exit(0)
+        print("The controller did not answer; is it running?")
+        sys.exit(1)
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    for record in dump['stalls'][-count:]:
+        print_stall(record)